@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+import argparse
+import datetime
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from chat_analytics import aggregate, append_rows, load  # noqa: E402
+
+
+def make_rows(n: int, days: int) -> list:
+    rnd = random.Random(0)
+    start = datetime.date(2024, 1, 1)
+    rows = []
+    for i in range(n):
+        messages = int(rnd.paretovariate(1.2) * 4)
+        user = messages // 2 + 1
+        rows.append({
+            'cid': f'thread-{i}',
+            'date': (start + datetime.timedelta(days=rnd.randrange(days))).isoformat(),
+            'created_at_ms': 0,
+            'messages': messages,
+            'user_messages': user,
+            'assistant_messages': messages - user,
+            'user_chars': user * rnd.randrange(50, 400),
+            'assistant_chars': (messages - user) * rnd.randrange(200, 3000),
+            'bytes': messages * 900,
+        })
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Time loading chat_analytics.bin and the daily/weekly reports.')
+    parser.add_argument('--threads', type=int, default=150000)
+    parser.add_argument('--days', type=int, default=600)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        append_rows(tmp, make_rows(args.threads, args.days))
+        size = os.path.getsize(os.path.join(tmp, 'chat_analytics.bin'))
+        print(f"{args.threads} threads over {args.days} days, {size / 1e6:.1f} MB")
+        for use_numpy in (True, False):
+            t0 = time.perf_counter()
+            table = load(tmp, use_numpy)
+            loaded = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            aggregate(table, 'day')
+            aggregate(table, 'week')
+            took = time.perf_counter() - t0
+            print(f"{table.engine:<8}load {loaded * 1000:7.1f} ms   day+week reports {took * 1000:7.1f} ms")
+            if table.engine == 'array':
+                break
+
+
+if __name__ == '__main__':
+    main()
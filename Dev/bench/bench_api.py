@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from chat_api import group_roles, iter_threads  # noqa: E402
+from chat_core import group_messages  # noqa: E402
+from cursor_kv import fetch_bubbles  # noqa: E402
+
+
+def make_db(path: str, threads: int, bubbles: int) -> None:
+    # Real bubbles carry far more than their text (code blocks, tool results,
+    # context), which is what the exporter has to read and throw away.
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE cursorDiskKV (key TEXT PRIMARY KEY, value TEXT)')
+    for t in range(threads):
+        cid = f'bench-{t:04d}'
+        ids = [f'b{i:05d}' for i in range(bubbles)]
+        conn.execute('INSERT INTO cursorDiskKV VALUES (?, ?)', (f'composerData:{cid}', json.dumps({
+            'createdAt': 1735689600000 + t * 60000,
+            'fullConversationHeadersOnly': [{'bubbleId': b, 'type': 1 + i % 2} for i, b in enumerate(ids)],
+        })))
+        conn.executemany('INSERT INTO cursorDiskKV VALUES (?, ?)', [(f'bubbleId:{cid}:{b}', json.dumps({
+            'type': 1 + i % 2,
+            'text': f'Message {i}: ' + 'some prose and code ' * 20,
+            'codeBlocks': [{'content': 'def f(x):\n    return x\n' * 40}],
+            'toolResults': [{'output': 'line of tool output\n' * 80}],
+        })) for i, b in enumerate(ids)])
+    conn.commit()
+    conn.close()
+
+
+def peak(fn) -> int:
+    tracemalloc.start()
+    fn()
+    _, top = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return top
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Compare peak memory of loading threads as lists vs. through chat_api.')
+    parser.add_argument('--threads', type=int, default=20)
+    parser.add_argument('--bubbles', type=int, default=400)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, 'state.vscdb')
+        make_db(db, args.threads, args.bubbles)
+
+        def lists():
+            # the previous writer path: every raw bubble of the thread, then the groups
+            for t in iter_threads(db):
+                group_messages(fetch_bubbles(t.conn, t.cid, t.bubble_ids))
+
+        def generators():
+            for t in iter_threads(db):
+                group_roles(t.messages())
+
+        def stream():
+            # callers that never need a whole thread at once
+            for t in iter_threads(db):
+                for _ in t.messages():
+                    pass
+
+        print(f"{args.threads} threads x {args.bubbles} bubbles, {os.path.getsize(db) / 1e6:.1f} MB DB")
+        base = None
+        for name, fn in [('lists + groups', lists), ('chat_api groups', generators), ('chat_api stream', stream)]:
+            p = peak(fn)
+            base = base or p
+            print(f"{name:<18}{p / 1e6:8.2f} MB peak  {(p - base) / base * 100:+6.0f}%")
+
+
+if __name__ == '__main__':
+    main()
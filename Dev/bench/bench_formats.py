@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from bench_api import make_db  # noqa: E402
+from chat_formats import open_writers  # noqa: E402
+from export_cursor_history import connect_db_readonly, ensure_manifest, export_batch  # noqa: E402
+
+
+def export(db: str, out: str, formats: list) -> float:
+    os.makedirs(out)
+    manifest_path = os.path.join(out, 'export_manifest.json')
+    conn = connect_db_readonly(db)
+    ensure_manifest(manifest_path, conn, order_desc=False)
+    writers = open_writers(formats, out, 'bench')
+    t0 = time.perf_counter()
+    export_batch(conn, out, manifest_path, 0, 10 ** 9, throttle=0, writers=writers)
+    for w in writers:
+        w.close()
+    took = time.perf_counter() - t0
+    conn.close()
+    return took
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Compare one fan-out export with one export per format.')
+    parser.add_argument('--threads', type=int, default=40)
+    parser.add_argument('--bubbles', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, 'state.vscdb')
+        make_db(db, args.threads, args.bubbles)
+        print(f"{args.threads} threads x {args.bubbles} bubbles, {os.path.getsize(db) / 1e6:.1f} MB DB")
+        yaml_only = export(db, os.path.join(tmp, 'a'), [])
+        # what three exporter runs cost: every run reads and decodes all threads again
+        three_runs = yaml_only + export(db, os.path.join(tmp, 'b'), []) + export(db, os.path.join(tmp, 'c'), [])
+        fan_out = export(db, os.path.join(tmp, 'd'), ['ndjson', 'markdown'])
+        print(f"{'yaml only':<24}{yaml_only:8.2f} s")
+        print(f"{'three exporter runs':<24}{three_runs:8.2f} s")
+        print(f"{'yaml+ndjson+markdown':<24}{fan_out:8.2f} s  ({(fan_out - yaml_only) / yaml_only * 100:+.0f}% over yaml only)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import yaml
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from chat_reader import load_chat, read_header  # noqa: E402
+from export_cursor_history import write_yaml  # noqa: E402
+
+
+def make_chat(folder: str, groups: int) -> str:
+    grouped = []
+    for i in range(groups):
+        role = 'user' if i % 2 == 0 else 'assistant'
+        texts = [
+            f"Question {i}: how do I fix this?\n\n```python\ndef f(x):\n    return x * {i}\n```",
+            "Some prose with: colons, # hashes, - dashes and 日本語 text.\n" * 20,
+        ]
+        grouped.append({'role': role, 'texts': texts})
+    write_yaml(folder, 'bench-cid', '2025-01-01_00-00-00', 'bench', grouped)
+    return os.path.join(folder, 'chat.yaml')
+
+
+def timed(fn, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Compare chat_reader against PyYAML on a synthetic chat.yaml.')
+    parser.add_argument('--groups', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as d:
+        path = make_chat(os.path.join(d, 'chat'), args.groups)
+        with open(path, 'r', encoding='utf-8') as f:
+            expected = yaml.safe_load(f)
+        assert load_chat(path) == expected
+        assert load_chat(path, use_mmap=True) == expected
+
+        def pyyaml(loader):
+            def run() -> None:
+                with open(path, 'r', encoding='utf-8') as f:
+                    yaml.load(f, Loader=loader)
+            return run
+
+        rows = [('pyyaml safe_load', timed(pyyaml(yaml.SafeLoader), 1))]
+        if hasattr(yaml, 'CSafeLoader'):
+            rows.append(('pyyaml CSafeLoader', timed(pyyaml(yaml.CSafeLoader), args.repeat)))
+        rows.append(('chat_reader stream', timed(lambda: load_chat(path), args.repeat)))
+        rows.append(('chat_reader mmap', timed(lambda: load_chat(path, use_mmap=True), args.repeat)))
+        rows.append(('chat_reader header', timed(lambda: read_header(path), args.repeat)))
+        base = rows[0][1]
+        print(f"file: {os.path.getsize(path) / 1e6:.1f} MB")
+        for name, t in rows:
+            print(f"{name:<20}{t * 1000:10.2f} ms  {base / t:8.0f}x")
+
+if __name__ == '__main__':
+    main()
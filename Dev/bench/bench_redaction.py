@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from chat_core import render_yaml  # noqa: E402
+from redaction import DEFAULT_RULES, Redactor  # noqa: E402
+
+
+def make_grouped(groups: int):
+    grouped = []
+    for i in range(groups):
+        role = 'user' if i % 2 == 0 else 'assistant'
+        texts = [
+            f"Question {i}: how do I fix this?\n\n```python\ndef f(x):\n    return x * {i}\n```",
+            "Some prose with: colons, # hashes, - dashes and 日本語 text.\n" * 20,
+        ]
+        if i % 50 == 0:
+            texts.append(f"export OPENAI_API_KEY=sk-proj-{'x' * 40}\nAKIAIOSFODNN7EXAMPL{i % 10}")
+        grouped.append({'role': role, 'texts': texts})
+    return grouped
+
+
+def timed(fn, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Measure the cost of export-time redaction on a synthetic thread.')
+    parser.add_argument('--groups', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    grouped = make_grouped(args.groups)
+    size = len(render_yaml('bench-cid', '2025-01-01_00-00-00', 'bench', grouped).encode('utf-8'))
+    rules = [re.compile(p) for p in DEFAULT_RULES.values()]
+
+    def copy():
+        return [{'role': g['role'], 'texts': list(g['texts'])} for g in grouped]
+
+    def render_only():
+        render_yaml('bench-cid', '2025-01-01_00-00-00', 'bench', copy())
+
+    def combined():
+        g = copy()
+        Redactor().redact_thread('bench-cid', g)
+        render_yaml('bench-cid', '2025-01-01_00-00-00', 'bench', g)
+
+    def per_rule():
+        # one pass per rule, as a separate scrubbing step would do
+        g = copy()
+        for m in g:
+            texts = m['texts']
+            for rule in rules:
+                texts = [rule.sub('[REDACTED]', t) for t in texts]
+            m['texts'] = texts
+        render_yaml('bench-cid', '2025-01-01_00-00-00', 'bench', g)
+
+    results = [(name, timed(fn, args.repeat))
+               for name, fn in [('render only', render_only), ('combined redaction', combined), ('per-rule passes', per_rule)]]
+    base = results[0][1]
+    print(f"thread: {size / 1e6:.1f} MB rendered, {len(DEFAULT_RULES)} rules")
+    for name, t in results:
+        print(f"{name:<20}{t * 1000:10.2f} ms  {size / t / 1e6:8.1f} MB/s  {(t - base) / base * 100:+6.0f}%")
+
+
+if __name__ == '__main__':
+    main()
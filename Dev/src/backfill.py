@@ -0,0 +1,90 @@
+import os
+import shutil
+import subprocess
+import sys
+import time
+from typing import Any, Callable, Dict, List
+
+# Helpers for export_cursor_history.py --recent-days / --backfill: recent
+# threads are exported in the foreground, the rest is drained by a detached
+# low-priority process in small slices while Cursor leaves its DB alone.
+
+BACKFILL_LOG = '.backfill.log'
+NICE_INCREMENT = 10
+
+
+def lower_priority() -> Dict[str, Any]:
+    """Lower this process's CPU (nice) and, on Linux, I/O (ionice idle class) priority."""
+    applied: Dict[str, Any] = {}
+    if hasattr(os, 'nice'):
+        try:
+            applied['nice'] = os.nice(NICE_INCREMENT)
+        except OSError:
+            pass
+    ionice = shutil.which('ionice') if sys.platform.startswith('linux') else None
+    if ionice:
+        proc = subprocess.run([ionice, '-c', '3', '-p', str(os.getpid())], capture_output=True)
+        if proc.returncode == 0:
+            applied['ionice'] = 'idle'
+    return applied
+
+
+def db_last_write(db_path: str) -> float:
+    """Newest mtime of the DB and its WAL/journal (0 if none exist)."""
+    latest = 0.0
+    for p in (db_path, db_path + '-wal', db_path + '-journal'):
+        try:
+            latest = max(latest, os.stat(p).st_mtime)
+        except OSError:
+            pass
+    return latest
+
+
+def wait_for_quiet(
+    db_path: str,
+    quiet_s: float,
+    poll_s: float = 5.0,
+    clock: Callable[[], float] = time.time,
+    sleep: Callable[[float], None] = time.sleep,
+) -> float:
+    """Block until the DB has not been written for quiet_s seconds; returns the seconds waited."""
+    waited = 0.0
+    while True:
+        idle = clock() - db_last_write(db_path)
+        if idle >= quiet_s:
+            return waited
+        pause = min(poll_s, quiet_s - idle)
+        sleep(pause)
+        waited += pause
+
+
+def backfill_argv(argv: List[str]) -> List[str]:
+    """Arguments for the background run: the same export without the foreground-only options."""
+    out: List[str] = []
+    skip = False
+    for a in argv:
+        if skip:
+            skip = False
+        elif a == '--recent-days':
+            skip = True
+        elif a.startswith('--recent-days=') or a in ('--rescan', '--all'):
+            continue
+        else:
+            out.append(a)
+    return out + ['--backfill']
+
+
+def spawn_backfill(script: str, argv: List[str], out_root: str) -> Dict[str, Any]:
+    """Start `script argv` detached from this terminal, logging to <out_root>/.backfill.log."""
+    log_path = os.path.join(out_root, BACKFILL_LOG)
+    kwargs: Dict[str, Any] = {}
+    if sys.platform.startswith('win'):
+        kwargs['creationflags'] = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        kwargs['start_new_session'] = True
+    with open(log_path, 'a', encoding='utf-8') as log:
+        proc = subprocess.Popen(
+            [sys.executable, script] + argv,
+            stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT, **kwargs,
+        )
+    return {'pid': proc.pid, 'log': log_path}
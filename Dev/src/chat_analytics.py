@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""Usage statistics over an output root without reading any chat.yaml.
+
+    python chat_analytics.py build --root @chat_history
+    python chat_analytics.py report --root @chat_history --by week --since 2025-09-01
+
+`build` writes <root>/chat_analytics.bin from the catalog and turns on its
+upkeep: from then on every catalog upsert (export, append, per-date
+rebuilds, packing) appends the thread's metrics to it. The file is a 16-byte
+header followed by fixed-size little-endian int64 records, one per written
+thread (FIELDS); the last record of a thread wins, so `build` again compacts
+it. Deleting a thread's last catalog row (forget, move to another root,
+rebuild) appends a tombstone, a record with day TOMBSTONE, and a thread
+whose last record is a tombstone is not counted.
+
+`report` reads the records into one array per field (NumPy when it is
+installed, the array module otherwise) and computes per-day or per-week
+totals and thread-size percentiles over them.
+"""
+import argparse
+import datetime
+import hashlib
+import json
+import math
+import os
+import struct
+import sys
+import time
+from array import array
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional
+
+from chat_catalog import COLUMNS, open_catalog
+
+ANALYTICS_NAME = 'chat_analytics.bin'
+MAGIC = b'CHATAN01'
+HEADER = struct.Struct('<8sII')  # magic, fields per record, reserved
+
+FIELDS = (
+    'day',  # local creation date as days since 1970-01-01
+    'created_ms',
+    'cid_key',  # first 8 bytes of blake2b(cid)
+    'messages', 'user_messages', 'assistant_messages',
+    'user_chars', 'assistant_chars',
+    'bytes',
+)
+SUMMED = ('messages', 'user_messages', 'assistant_messages', 'user_chars', 'assistant_chars')
+QUANTILES = (0.5, 0.9, 0.99)
+TOMBSTONE = -1  # day of the record appended when a thread leaves the catalog
+
+EPOCH = datetime.date(1970, 1, 1).toordinal()
+
+
+def analytics_path(root: str) -> str:
+    return os.path.join(root, ANALYTICS_NAME)
+
+
+def cid_key(cid: str) -> int:
+    return int.from_bytes(hashlib.blake2b(cid.encode('utf-8'), digest_size=8).digest(), 'little', signed=True)
+
+
+def day_number(date: str) -> int:
+    try:
+        return datetime.date.fromisoformat(date[:10]).toordinal() - EPOCH
+    except ValueError:
+        return 0
+
+
+def bound_day(date: str) -> int:
+    """day_number of a --since/--until value, which unlike a catalog date must parse."""
+    try:
+        return datetime.date.fromisoformat(date).toordinal() - EPOCH
+    except ValueError:
+        raise ValueError(f'invalid date {date!r} (expected YYYY-MM-DD)')
+
+
+def day_text(day: int) -> str:
+    return datetime.date.fromordinal(day + EPOCH).isoformat()
+
+
+def record(row: Dict[str, Any]) -> List[int]:
+    """FIELDS of a catalog row (unknown values are 0)."""
+    return [
+        day_number(row['date']),
+        row['created_at_ms'] or 0,
+        cid_key(row['cid']),
+        row['messages'] or 0,
+        row['user_messages'] or 0,
+        row['assistant_messages'] or 0,
+        row['user_chars'] or 0,
+        row['assistant_chars'] or 0,
+        row['bytes'] or 0,
+    ]
+
+
+def _pack(rows: Iterable[Dict[str, Any]]) -> bytes:
+    values = array('q')
+    for row in rows:
+        values.extend(record(row))
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values.tobytes()
+
+
+def _append(root: str, data: bytes) -> None:
+    path = analytics_path(root)
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        if os.fstat(fd).st_size == 0:
+            data = HEADER.pack(MAGIC, len(FIELDS), 0) + data
+        os.write(fd, data)
+    finally:
+        os.close(fd)
+
+
+def append_rows(root: str, rows: Iterable[Dict[str, Any]]) -> None:
+    """Append the metrics of freshly upserted catalog rows (one write, O_APPEND)."""
+    _append(root, _pack(rows))
+
+
+def append_tombstones(root: str, cids: Iterable[str]) -> None:
+    """Mark threads deleted from the catalog (their earlier records stop counting)."""
+    values = array('q')
+    for cid in cids:
+        values.extend([TOMBSTONE, 0, cid_key(cid)] + [0] * (len(FIELDS) - 3))
+    if sys.byteorder == 'big':
+        values.byteswap()
+    _append(root, values.tobytes())
+
+
+def build(root: str) -> Dict[str, Any]:
+    """Rewrite the file from the catalog and keep it up to date from now on."""
+    path = analytics_path(root)
+    cat = open_catalog(root)
+    try:
+        with cat:
+            cat.execute("INSERT OR REPLACE INTO meta(key, value) VALUES ('analytics', '1')")
+        rows = [dict(r) for r in cat.execute(f"SELECT {', '.join(COLUMNS)} FROM threads ORDER BY created_at_ms")]
+        with open(path + '.tmp', 'wb') as f:
+            f.write(HEADER.pack(MAGIC, len(FIELDS), 0) + _pack(rows))
+        os.replace(path + '.tmp', path)
+    finally:
+        cat.close()
+    return {'threads': len(rows), 'path': analytics_path(root), 'bytes': os.path.getsize(analytics_path(root))}
+
+
+class Table:
+    """One array per field, the latest record of each thread only."""
+
+    def __init__(self, columns: Dict[str, Any], engine: str) -> None:
+        self.columns = columns
+        self.engine = engine
+
+    def __len__(self) -> int:
+        return len(self.columns['day'])
+
+    def __getitem__(self, name: str) -> Any:
+        return self.columns[name]
+
+
+def _numpy() -> Any:
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def load(root: str, use_numpy: bool = True) -> Table:
+    """Map chat_analytics.bin into columns; a partly written last record is ignored."""
+    day = FIELDS.index('day')
+    with open(analytics_path(root), 'rb') as f:
+        data = f.read()
+    magic, width, _ = HEADER.unpack_from(data) if len(data) >= HEADER.size else (b'', 0, 0)
+    if magic != MAGIC or width < len(FIELDS):
+        raise ValueError(f'{analytics_path(root)}: not a {MAGIC.decode()} file; run build again')
+    n = (len(data) - HEADER.size) // (8 * width)
+    np = _numpy() if use_numpy else None
+    if np is not None:
+        matrix = np.frombuffer(data, dtype='<i8', count=n * width, offset=HEADER.size).reshape(n, width)
+        keys = matrix[:, FIELDS.index('cid_key')]
+        # the last record of each thread: first occurrence in the reversed keys
+        _, first = np.unique(keys[::-1], return_index=True)
+        keep = np.sort(n - 1 - first)
+        keep = keep[matrix[keep, day] != TOMBSTONE]
+        return Table({name: np.ascontiguousarray(matrix[keep, i]) for i, name in enumerate(FIELDS)}, 'numpy')
+    values = array('q')
+    values.frombytes(data[HEADER.size:HEADER.size + n * width * 8])
+    if sys.byteorder == 'big':
+        values.byteswap()
+    keys = values[FIELDS.index('cid_key')::width]
+    latest: Dict[int, int] = {}
+    for i, k in enumerate(keys):
+        latest[k] = i
+    if len(latest) == n and TOMBSTONE not in values[day::width]:
+        return Table({name: values[i::width] for i, name in enumerate(FIELDS)}, 'array')
+    keep = [r for r in sorted(latest.values()) if values[r * width + day] != TOMBSTONE]
+    return Table({name: array('q', [values[r * width + i] for r in keep]) for i, name in enumerate(FIELDS)}, 'array')
+
+
+def _quantiles(values: Any, np: Any) -> Dict[str, int]:
+    """Nearest-rank percentiles and the maximum."""
+    ordered = np.sort(values) if np is not None else sorted(values)
+    n = len(ordered)
+    out = {f'p{round(q * 100)}': int(ordered[max(0, math.ceil(q * n) - 1)]) if n else 0 for q in QUANTILES}
+    out['max'] = int(ordered[-1]) if n else 0
+    return out
+
+
+def aggregate(
+    table: Table, by: str = 'day', since: Optional[str] = None, until: Optional[str] = None
+) -> Dict[str, Any]:
+    """Totals per day or per week (starting on Monday) and thread-size percentiles."""
+    lo = bound_day(since) if since else None
+    hi = bound_day(until) if until else None
+    np = _numpy() if table.engine == 'numpy' else None
+    if np is not None:
+        day = table['day']
+        mask = np.ones(len(day), dtype=bool)
+        if lo is not None:
+            mask &= day >= lo
+        if hi is not None:
+            mask &= day <= hi
+        cols = {name: table[name][mask] for name in FIELDS}
+        period = cols['day'] - (cols['day'] + 3) % 7 if by == 'week' else cols['day']
+        starts, inverse, counts = np.unique(period, return_inverse=True, return_counts=True)
+        sums = {name: np.bincount(inverse, weights=cols[name], minlength=len(starts)) for name in SUMMED}
+        periods = []
+        for j, start in enumerate(starts.tolist()):
+            entry: Dict[str, Any] = {by: day_text(start), 'threads': int(counts[j])}
+            entry.update({name: int(sums[name][j]) for name in SUMMED})
+            periods.append(entry)
+        chars = cols['user_chars'] + cols['assistant_chars']
+    else:
+        cols = table.columns
+        if lo is not None or hi is not None:
+            rows = [i for i, d in enumerate(cols['day']) if (lo is None or d >= lo) and (hi is None or d <= hi)]
+            cols = {name: [cols[name][i] for i in rows] for name in FIELDS}
+        period = [d - (d + 3) % 7 for d in cols['day']] if by == 'week' else cols['day']
+        counts = Counter(period)
+        sums = {}
+        for name in SUMMED:
+            acc = dict.fromkeys(counts, 0)
+            for p, v in zip(period, cols[name]):
+                acc[p] += v
+            sums[name] = acc
+        periods = []
+        for start in sorted(counts):
+            entry = {by: day_text(start), 'threads': counts[start]}
+            entry.update({name: sums[name][start] for name in SUMMED})
+            periods.append(entry)
+        chars = [u + a for u, a in zip(cols['user_chars'], cols['assistant_chars'])]
+    totals: Dict[str, Any] = {'threads': len(cols['day'])}
+    totals.update({name: sum(p[name] for p in periods) for name in SUMMED})
+    return {
+        'by': by,
+        'totals': totals,
+        'periods': periods,
+        'thread_sizes': {
+            'messages': _quantiles(cols['messages'], np),
+            'chars': _quantiles(chars, np),
+            'bytes': _quantiles(cols['bytes'], np),
+        },
+    }
+
+
+def report(
+    root: str, by: str = 'day', since: Optional[str] = None, until: Optional[str] = None, use_numpy: bool = True
+) -> Dict[str, Any]:
+    started = time.perf_counter()
+    table = load(root, use_numpy)
+    out = aggregate(table, by, since, until)
+    out['engine'] = table.engine
+    out['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    return out
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Threads and messages per day or week and thread-size percentiles, from chat_analytics.bin.')
+    parser.add_argument('command', choices=['build', 'report'])
+    parser.add_argument('--root', required=True, help='Output root (@chat_history or Flow)')
+    parser.add_argument('--by', choices=['day', 'week'], default='day')
+    parser.add_argument('--since', help='First date (YYYY-MM-DD)')
+    parser.add_argument('--until', help='Last date (YYYY-MM-DD, inclusive)')
+    parser.add_argument('--no-numpy', action='store_true', help='Use the array module even when NumPy is installed')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        from file_lock import root_lock
+
+        # appends from running exports would be lost in the swap
+        with root_lock(args.root, shared=False):
+            result = build(args.root)
+    else:
+        if not os.path.exists(analytics_path(args.root)):
+            parser.error(f'{analytics_path(args.root)} not found; run build first')
+        try:
+            result = report(args.root, args.by, args.since, args.until, use_numpy=not args.no_numpy)
+        except ValueError as e:
+            parser.error(str(e))
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
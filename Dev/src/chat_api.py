@@ -0,0 +1,126 @@
+"""In-process access to the chats in state.vscdb.
+
+    from chat_api import iter_threads, iter_messages
+
+    for thread in iter_threads(db_path, since=datetime.date(2025, 1, 1)):
+        for m in iter_messages(thread):
+            print(thread.cid, m.role, m.text[:40])
+
+Threads are yielded one at a time with their header list already fetched
+(one statement per 500 threads); messages are fetched 500 bubbles per
+statement and decoded row by row, keeping only role and text, so no caller
+has to hold more than the thread it is looking at. The export and update scripts are built
+on the same two generators.
+"""
+import datetime
+import sqlite3
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from chat_core import bubble_text, connect_db_readonly, group_texts, map_role
+from cursor_kv import SQL_VAR_CHUNK, fetch_heads, iter_bubbles, select_threads
+
+When = Union[None, int, datetime.date, datetime.datetime]
+
+
+class Message:
+    """One non-empty bubble: role ('user', 'assistant' or 'other'), text and bubble key."""
+
+    __slots__ = ('role', 'text', 'key')
+
+    def __init__(self, role: str, text: str, key: str) -> None:
+        self.role = role
+        self.text = text
+        self.key = key
+
+    def __repr__(self) -> str:
+        return f'Message({self.role!r}, {self.text[:30]!r})'
+
+
+class Thread:
+    """A composer thread; messages are read from the DB only when iterated."""
+
+    __slots__ = ('conn', 'cid', 'created_ms', 'bubble_ids', 'watermark', 'read_bytes')
+
+    def __init__(
+        self,
+        conn: sqlite3.Connection,
+        cid: str,
+        created_ms: int,
+        bubble_ids: Optional[List[str]] = None,
+        watermark: Optional[str] = None,
+    ) -> None:
+        self.conn = conn
+        self.cid = cid
+        self.created_ms = int(created_ms)
+        self.bubble_ids = bubble_ids
+        self.watermark = watermark
+        self.read_bytes = 0  # raw bubble bytes (UTF-8) read so far by iter_messages
+
+    @property
+    def created_dt(self) -> str:
+        """Local creation time as used in folder names (YYYY-MM-DD_HH-MM-SS)."""
+        return datetime.datetime.fromtimestamp(self.created_ms / 1000).strftime('%Y-%m-%d_%H-%M-%S')
+
+    def messages(self) -> Iterator[Message]:
+        return iter_messages(self)
+
+    def __repr__(self) -> str:
+        return f'Thread({self.cid!r}, created_dt={self.created_dt!r})'
+
+
+def _to_ms(when: When) -> Optional[int]:
+    if when is None or isinstance(when, int):
+        return when
+    if not isinstance(when, datetime.datetime):
+        when = datetime.datetime(when.year, when.month, when.day)
+    return int(when.timestamp() * 1000)
+
+
+def iter_threads(
+    db: Union[str, sqlite3.Connection],
+    since: When = None,
+    until: When = None,
+    cids: Optional[List[str]] = None,
+    order_desc: bool = False,
+) -> Iterator[Thread]:
+    """Threads created in [since, until) (epoch ms, local date or datetime), oldest first.
+
+    db is a path to state.vscdb (opened read-only for the life of the
+    generator) or an open connection, which is left open.
+    """
+    conn = connect_db_readonly(db) if isinstance(db, str) else db
+    try:
+        rows = select_threads(conn, order_desc, since_ms=_to_ms(since), until_ms=_to_ms(until), cids=cids)
+        for i in range(0, len(rows), SQL_VAR_CHUNK):
+            window = rows[i:i + SQL_VAR_CHUNK]
+            heads = fetch_heads(conn, [cid for cid, _ in window])
+            for cid, created_ms in window:
+                bubble_ids, watermark = heads[cid]
+                yield Thread(conn, cid, created_ms, bubble_ids, watermark)
+    finally:
+        if conn is not db:
+            conn.close()
+
+
+def _decode(value: Any) -> Tuple[int, str, str]:
+    o, text = bubble_text(value)
+    # bytes as stored: values come back as str or bytes depending on the column affinity
+    size = len(value.encode('utf-8')) if isinstance(value, str) else len(value or b'')
+    return size, map_role(o), text
+
+
+def iter_messages(thread: Thread) -> Iterator[Message]:
+    """Non-empty messages of a thread in conversation order, fetched and decoded as they are consumed.
+
+    Raw bubble JSON is dropped as soon as a row is decoded; only the
+    role and text of the current chunk are kept while it is reordered.
+    """
+    for key, (size, role, text) in iter_bubbles(thread.conn, thread.cid, thread.bubble_ids, _decode):
+        thread.read_bytes += size
+        if text.strip():
+            yield Message(role, text, key)
+
+
+def group_roles(messages: Iterable[Message]) -> List[Dict[str, Any]]:
+    """Messages as the [{'role': ..., 'texts': [...]}] blocks the writers render."""
+    return group_texts((m.role, m.text) for m in messages)
@@ -0,0 +1,484 @@
+#!/usr/bin/env python3
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import re
+import sqlite3
+from typing import Any, Dict, List, Optional, Tuple
+
+from chat_layout import LAYOUTS, SHARDED_LAYOUTS, iter_thread_folders, prune_empty_dirs, thread_folder
+from file_lock import root_lock
+
+CATALOG_NAME = 'chat_catalog.sqlite'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS threads (
+    folder TEXT PRIMARY KEY,
+    cid TEXT NOT NULL,
+    date TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    created_at_ms INTEGER,
+    title20 TEXT NOT NULL,
+    messages INTEGER NOT NULL,
+    user_messages INTEGER NOT NULL,
+    assistant_messages INTEGER NOT NULL,
+    bytes INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    mtime_ns INTEGER,
+    watermark TEXT,
+    pack TEXT,
+    pack_offset INTEGER,
+    user_chars INTEGER,
+    assistant_chars INTEGER,
+    last_chars INTEGER,
+    tail_key TEXT,
+    tail_from TEXT,
+    tail_hash TEXT,
+    tail_offset INTEGER
+);
+CREATE INDEX IF NOT EXISTS threads_cid ON threads(cid);
+CREATE INDEX IF NOT EXISTS threads_date ON threads(date);
+CREATE TABLE IF NOT EXISTS thread_workspaces (
+    cid TEXT PRIMARY KEY,
+    workspace TEXT NOT NULL,
+    folder TEXT,
+    source TEXT NOT NULL
+);
+"""
+
+COLUMNS = (
+    'folder', 'cid', 'date', 'created_at', 'created_at_ms', 'title20',
+    'messages', 'user_messages', 'assistant_messages', 'bytes', 'sha256',
+    'mtime_ns', 'watermark', 'pack', 'pack_offset',
+    'user_chars', 'assistant_chars', 'last_chars',
+    'tail_key', 'tail_from', 'tail_hash', 'tail_offset',
+)
+TAIL_COLUMNS = COLUMNS[-4:]
+
+# Columns added after the first release: (name, declaration). Older catalogs
+# get them on open; their rows keep NULL until the thread is written again.
+# pack/pack_offset: the thread lives in <root>/<pack> (see chat_pack.py) and
+# folder is where it is extracted to. tail_*: where export's append mode
+# resumes (see chat_tail.py); rows appended to by older versions have sha256 ''.
+# *_chars: characters of the user / assistant messages and of the last role
+# group (which append mode rewrites), for chat_analytics.py.
+ADDED_COLUMNS = (
+    ('mtime_ns', 'INTEGER'), ('watermark', 'TEXT'), ('pack', 'TEXT'), ('pack_offset', 'INTEGER'),
+    ('tail_key', 'TEXT'), ('tail_from', 'TEXT'), ('tail_hash', 'TEXT'), ('tail_offset', 'INTEGER'),
+    ('user_chars', 'INTEGER'), ('assistant_chars', 'INTEGER'), ('last_chars', 'INTEGER'),
+)
+
+
+def catalog_path(root: str) -> str:
+    return os.path.join(root, CATALOG_NAME)
+
+
+def rel_folder(root: str, folder: str) -> str:
+    return os.path.relpath(folder, root).replace(os.sep, '/')
+
+
+def abs_folder(root: str, rel: str) -> str:
+    return os.path.join(root, *rel.split('/'))
+
+
+def file_digest(path: str) -> Tuple[int, str]:
+    h = hashlib.sha256()
+    size = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+            size += len(chunk)
+    return size, h.hexdigest()
+
+
+def disk_bytes(text: str) -> bytes:
+    """text as a text-mode write would store it."""
+    if os.linesep != '\n':
+        text = text.replace('\n', os.linesep)
+    return text.encode('utf-8')
+
+
+def content_digest(text: str) -> Tuple[int, str]:
+    """Size and SHA-256 of text as a text-mode write would store it."""
+    data = disk_bytes(text)
+    return len(data), hashlib.sha256(data).hexdigest()
+
+
+def open_catalog(root: str, layout: str = 'flat') -> sqlite3.Connection:
+    """Open (and on first use, build from the existing tree) the catalog at root."""
+    os.makedirs(root, exist_ok=True)
+    path = catalog_path(root)
+    fresh = not os.path.exists(path)
+    cat = sqlite3.connect(path, timeout=30)
+    cat.row_factory = sqlite3.Row
+    cat.execute('PRAGMA journal_mode=WAL')
+    cat.execute('PRAGMA synchronous=NORMAL')
+    cat.executescript(SCHEMA)
+    have = {r[1] for r in cat.execute('PRAGMA table_info(threads)')}
+    with cat:
+        for name, decl in ADDED_COLUMNS:
+            if name not in have:
+                cat.execute(f'ALTER TABLE threads ADD COLUMN {name} {decl}')
+    if fresh:
+        with cat:
+            cat.execute("INSERT OR REPLACE INTO meta(key, value) VALUES ('layout', ?)", (layout,))
+        index_tree(cat, root, layout)
+    return cat
+
+
+def near_dup_enabled(cat: sqlite3.Connection) -> bool:
+    # near_dup is imported only by catalogs that use it (keeps script start-up light)
+    row = cat.execute("SELECT value FROM meta WHERE key = 'near_dup'").fetchone()
+    return bool(row and row[0] == '1')
+
+
+def analytics_enabled(cat: sqlite3.Connection) -> bool:
+    # set by `chat_analytics.py build`; the module is imported only by catalogs that keep its log
+    row = cat.execute("SELECT value FROM meta WHERE key = 'analytics'").fetchone()
+    return bool(row and row[0] == '1')
+
+
+def catalog_root(cat: sqlite3.Connection) -> str:
+    return os.path.dirname(cat.execute('PRAGMA database_list').fetchone()[2])
+
+
+def catalog_layout(cat: sqlite3.Connection) -> str:
+    row = cat.execute("SELECT value FROM meta WHERE key = 'layout'").fetchone()
+    return row[0] if row else 'flat'
+
+
+def upsert_threads(cat: sqlite3.Connection, *rows: Dict[str, Any]) -> None:
+    with cat:
+        cat.executemany(
+            f"INSERT OR REPLACE INTO threads ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+            [tuple(row[c] for c in COLUMNS) for row in rows],
+        )
+    if rows and analytics_enabled(cat):
+        import chat_analytics
+        chat_analytics.append_rows(catalog_root(cat), rows)
+
+
+def role_chars(grouped: List[Dict[str, Any]]) -> Dict[str, int]:
+    """user_chars / assistant_chars / last_chars columns of grouped messages."""
+    chars = [sum(len(t) for t in g['texts']) for g in grouped]
+    return {
+        'user_chars': sum(n for g, n in zip(grouped, chars) if g['role'] == 'user'),
+        'assistant_chars': sum(n for g, n in zip(grouped, chars) if g['role'] == 'assistant'),
+        'last_chars': chars[-1] if chars else 0,
+    }
+
+
+def record_thread(
+    cat: sqlite3.Connection,
+    root: str,
+    folder: str,
+    cid: str,
+    created_ms: Optional[int],
+    created_dt: str,
+    title20: str,
+    grouped: List[Dict[str, Any]],
+    digest: Optional[Tuple[int, str]] = None,
+    watermark: Optional[str] = None,
+    tail: Optional[Dict[str, Any]] = None,
+) -> None:
+    """Upsert the row of a freshly written chat.yaml.
+
+    watermark is cursor_kv.WATERMARK_SQL of the source, tail the tail_*
+    columns from chat_tail.tail_columns (threads written without one are
+    always rewritten in full).
+    """
+    p = os.path.join(folder, 'chat.yaml')
+    size, sha = digest or file_digest(p)
+    row = {
+        'folder': rel_folder(root, folder),
+        'cid': cid,
+        'date': created_dt[:10],
+        'created_at': created_dt,
+        'created_at_ms': created_ms,
+        'title20': title20,
+        'messages': len(grouped),
+        'user_messages': sum(1 for g in grouped if g['role'] == 'user'),
+        'assistant_messages': sum(1 for g in grouped if g['role'] == 'assistant'),
+        'bytes': size,
+        'sha256': sha,
+        'mtime_ns': os.stat(p).st_mtime_ns,
+        'watermark': watermark,
+        'pack': None,
+        'pack_offset': None,
+    }
+    row.update(role_chars(grouped))
+    row.update(tail or dict.fromkeys(TAIL_COLUMNS))
+    upsert_threads(cat, row)
+    if near_dup_enabled(cat):
+        import near_dup
+        near_dup.index_thread(cat, cid, grouped)
+
+
+def move_folder(cat: sqlite3.Connection, old_rel: str, dest: sqlite3.Connection, new_rel: str) -> None:
+    """Carry a catalog row over to a new location (possibly in another catalog)."""
+    row = cat.execute('SELECT * FROM threads WHERE folder = ?', (old_rel,)).fetchone()
+    if row is None:
+        return
+    moved = dict(row)
+    moved['folder'] = new_rel
+    with cat:
+        cat.execute('DELETE FROM threads WHERE folder = ?', (old_rel,))
+    if dest is not cat:
+        dropped_from_analytics(cat, [moved['cid']])
+    upsert_threads(dest, moved)
+    if dest is not cat and near_dup_enabled(cat) and near_dup_enabled(dest):
+        import near_dup
+        near_dup.copy_thread(cat, dest, moved['cid'])
+
+
+def dropped_from_analytics(cat: sqlite3.Connection, cids: List[str]) -> None:
+    """Tell chat_analytics.bin about threads whose last catalog row was just deleted."""
+    if not cids or not analytics_enabled(cat):
+        return
+    gone = [c for c in dict.fromkeys(cids) if cat.execute('SELECT 1 FROM threads WHERE cid = ? LIMIT 1', (c,)).fetchone() is None]
+    if gone:
+        import chat_analytics
+        chat_analytics.append_tombstones(catalog_root(cat), gone)
+
+
+def forget_folder(cat: sqlite3.Connection, rel: str) -> None:
+    cids = [r[0] for r in cat.execute('SELECT cid FROM threads WHERE folder = ?', (rel,))]
+    with cat:
+        cat.execute('DELETE FROM threads WHERE folder = ?', (rel,))
+    dropped_from_analytics(cat, cids)
+
+
+def forget_date(cat: sqlite3.Connection, date: str) -> int:
+    cids = [r[0] for r in cat.execute('SELECT cid FROM threads WHERE date = ?', (date,))]
+    with cat:
+        n = cat.execute('DELETE FROM threads WHERE date = ?', (date,)).rowcount
+    # a rebuilt date records its threads again right after
+    dropped_from_analytics(cat, cids)
+    return n
+
+
+def threads_for_date(cat: sqlite3.Connection, date: str) -> List[Dict[str, Any]]:
+    rows = cat.execute('SELECT * FROM threads WHERE date = ? ORDER BY created_at', (date,))
+    return [dict(r) for r in rows]
+
+
+def find_thread(cat: sqlite3.Connection, cid: str) -> List[Dict[str, Any]]:
+    """Look up by full cid or by cid prefix (e.g. the 8 chars used in folder names)."""
+    hi = cid[:-1] + chr(ord(cid[-1]) + 1) if cid else '\uffff'
+    rows = cat.execute(
+        'SELECT * FROM threads WHERE cid >= ? AND cid < ? ORDER BY created_at',
+        (cid, hi),
+    )
+    return [dict(r) for r in rows]
+
+
+def record_workspace(cat: sqlite3.Connection, workspace: str, folder: Optional[str], source: str, cids: List[str]) -> None:
+    """Attribute threads to a workspaceStorage/<workspace> DB (source: 'global' or 'local' DB)."""
+    with cat:
+        cat.executemany(
+            'INSERT OR REPLACE INTO thread_workspaces (cid, workspace, folder, source) VALUES (?, ?, ?, ?)',
+            [(cid, workspace, folder, source) for cid in cids],
+        )
+
+
+def workspace_of(cat: sqlite3.Connection, cid: str) -> Optional[Dict[str, Any]]:
+    row = cat.execute('SELECT workspace, folder, source FROM thread_workspaces WHERE cid = ?', (cid,)).fetchone()
+    return dict(row) if row else None
+
+
+def list_dates(cat: sqlite3.Connection) -> List[Tuple[str, int]]:
+    rows = cat.execute('SELECT date, COUNT(*) FROM threads GROUP BY date ORDER BY date')
+    return [(r[0], r[1]) for r in rows]
+
+
+def read_chat_summary(path: str) -> Dict[str, Any]:
+    header: Dict[str, Any] = {'messages': 0, 'user_messages': 0, 'assistant_messages': 0}
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            if line.startswith('  - role: "'):
+                role = line[len('  - role: "'):].rstrip('\n').rstrip('"')
+                header['messages'] += 1
+                if role in ('user', 'assistant'):
+                    header[role + '_messages'] += 1
+                continue
+            if line.startswith(' '):
+                continue
+            m = re.match(r'^(threadId|created_at|title20): "(.*)"$', line.rstrip('\n'))
+            if m:
+                header[m.group(1)] = m.group(2)
+    return header
+
+
+def index_tree(cat: sqlite3.Connection, root: str, layout: str = 'flat', missing_only: bool = False) -> int:
+    """Scan the output tree once and (re)populate the catalog from the files on disk.
+
+    With missing_only, folders that already have a row are left untouched and only new ones are added.
+    """
+    known = {r[0] for r in cat.execute('SELECT folder FROM threads')} if missing_only else set()
+    rows: List[Dict[str, Any]] = []
+    for date, folder in iter_thread_folders(root, layout):
+        if not os.path.isdir(folder) or rel_folder(root, folder) in known:
+            continue
+        name = os.path.basename(folder)
+        p = os.path.join(folder, 'chat.yaml')
+        summary: Dict[str, Any] = {'messages': 0, 'user_messages': 0, 'assistant_messages': 0}
+        size, digest, mtime_ns = 0, '', None
+        if os.path.isfile(p):
+            summary = read_chat_summary(p)
+            size, digest = file_digest(p)
+            mtime_ns = os.stat(p).st_mtime_ns
+        m = re.match(r"^(\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2})_", name)
+        created_dt = summary.get('created_at') or (m.group(1) if m else date)
+        created_ms = None
+        try:
+            created_ms = int(datetime.datetime.strptime(created_dt, '%Y-%m-%d_%H-%M-%S').timestamp() * 1000)
+        except ValueError:
+            pass
+        rows.append({
+            'folder': rel_folder(root, folder),
+            'cid': summary.get('threadId', ''),
+            'date': date,
+            'created_at': created_dt,
+            'created_at_ms': created_ms,
+            'title20': summary.get('title20', ''),
+            'messages': summary['messages'],
+            'user_messages': summary['user_messages'],
+            'assistant_messages': summary['assistant_messages'],
+            'bytes': size,
+            'sha256': digest,
+            'mtime_ns': mtime_ns,
+            'watermark': None,
+            'pack': None,
+            'pack_offset': None,
+            'user_chars': None,
+            'assistant_chars': None,
+            'last_chars': None,
+            **dict.fromkeys(TAIL_COLUMNS),
+        })
+    if layout == 'flow':
+        packs = [n for n in sorted(os.listdir(root)) if re.fullmatch(r'\d{6}\.zip', n)] if os.path.isdir(root) else []
+        if packs:
+            import chat_pack
+            for name in packs:
+                rows += [r for r in chat_pack.pack_rows(root, name) if r['folder'] not in known]
+    upsert_threads(cat, *rows)
+    return len(rows)
+
+
+def migrate_layout(cat: sqlite3.Connection, root: str, layout: str) -> Dict[str, int]:
+    """Move every thread folder of root into the given layout using renames, in place."""
+    if layout not in SHARDED_LAYOUTS or catalog_layout(cat) not in SHARDED_LAYOUTS:
+        raise ValueError(f"cannot migrate {catalog_layout(cat)!r} -> {layout!r}")
+    moved = 0
+    missing = 0
+    rows = cat.execute('SELECT folder, cid FROM threads ORDER BY folder').fetchall()
+    for row in rows:
+        old = abs_folder(root, row['folder'])
+        new = thread_folder(root, layout, os.path.basename(old), row['cid'] or os.path.basename(old))
+        if old == new:
+            continue
+        if os.path.isdir(old):
+            os.makedirs(os.path.dirname(new), exist_ok=True)
+            os.rename(old, new)
+            prune_empty_dirs(root, os.path.dirname(old))
+        elif not os.path.isdir(new):
+            missing += 1
+            continue
+        # also picks up folders already renamed by an interrupted earlier run
+        with cat:
+            cat.execute('UPDATE threads SET folder = ? WHERE folder = ?', (rel_folder(root, new), row['folder']))
+        moved += 1
+    with cat:
+        cat.execute("INSERT OR REPLACE INTO meta(key, value) VALUES ('layout', ?)", (layout,))
+    return {'moved': moved, 'missing': missing}
+
+
+def index_near_dups(cat: sqlite3.Connection, root: str) -> Dict[str, int]:
+    """Enable the near-duplicate index and sign every cataloged thread that lacks a signature."""
+    import near_dup
+    from chat_reader import iter_messages
+
+    near_dup.enable(cat)
+    rows = cat.execute(
+        'SELECT cid, folder FROM threads WHERE cid != \'\' AND cid NOT IN (SELECT cid FROM near_dup_sig)'
+    ).fetchall()
+    indexed = 0
+    for row in rows:
+        p = os.path.join(abs_folder(root, row['folder']), 'chat.yaml')
+        if os.path.isfile(p) and near_dup.index_thread(cat, row['cid'], iter_messages(p)):
+            indexed += 1
+    return {'indexed': indexed, 'pruned': near_dup.prune(cat)}
+
+
+def near_dup_clusters(cat: sqlite3.Connection, threshold: float) -> List[List[Dict[str, Any]]]:
+    import near_dup
+
+    out = []
+    for group in near_dup.clusters(cat, threshold):
+        out.append([
+            dict(r) for cid in group
+            for r in cat.execute('SELECT cid, folder, title20, created_at FROM threads WHERE cid = ?', (cid,))
+        ])
+    return out
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Query or rebuild the catalog of exported chats.')
+    parser.add_argument('command', choices=['list', 'find', 'dates', 'rebuild', 'migrate', 'dedup-index', 'clusters'])
+    parser.add_argument('--root', default=os.path.abspath(os.path.join(os.getcwd(), '@chat_history')), help='Output root (@chat_history or Flow)')
+    parser.add_argument('--layout', choices=LAYOUTS, default=None, help='flat|date|hash for @chat_history, flow for Flow/YYYYMM/YYYY-MM-DD/chats (rebuild: layout of the tree, migrate: target layout)')
+    parser.add_argument('--date', help='YYYY-MM-DD (list)')
+    parser.add_argument('--cid', help='Thread id or prefix (find), thread id (clusters: only near-duplicates of it)')
+    parser.add_argument('--threshold', type=float, default=0.8, help='Estimated Jaccard similarity for clusters')
+    args = parser.parse_args()
+
+    cat = open_catalog(args.root, args.layout or 'flat')
+    if args.command == 'rebuild':
+        layout = args.layout or catalog_layout(cat)
+        cids = [r[0] for r in cat.execute('SELECT cid FROM threads')]
+        with cat:
+            cat.execute('DELETE FROM threads')
+            cat.execute("INSERT OR REPLACE INTO meta(key, value) VALUES ('layout', ?)", (layout,))
+        result: Any = {'indexed': index_tree(cat, args.root, layout)}
+        dropped_from_analytics(cat, cids)
+    elif args.command == 'migrate':
+        if not args.layout:
+            parser.error('--layout is required for migrate')
+        try:
+            with root_lock(args.root, shared=False):
+                result = migrate_layout(cat, args.root, args.layout)
+        except ValueError as e:
+            parser.error(str(e))
+    elif args.command == 'find':
+        if not args.cid:
+            parser.error('--cid is required for find')
+        result = find_thread(cat, args.cid)
+        for row in result:
+            row['workspace'] = workspace_of(cat, row['cid'])
+    elif args.command == 'dates':
+        result = dict(list_dates(cat))
+    elif args.command == 'dedup-index':
+        result = index_near_dups(cat, args.root)
+    elif args.command == 'clusters':
+        if not near_dup_enabled(cat):
+            parser.error('near-duplicate index not built; run dedup-index first')
+        import near_dup
+        if args.cid:
+            result = [{'cid': c, 'similarity': sim} for c, sim in near_dup.similar(cat, args.cid, args.threshold)]
+        else:
+            result = near_dup_clusters(cat, args.threshold)
+    elif args.date:
+        result = threads_for_date(cat, args.date)
+    else:
+        result = [dict(r) for r in cat.execute('SELECT * FROM threads ORDER BY created_at')]
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+import argparse
+import datetime
+import json
+import os
+import re
+import sqlite3
+import sys
+import urllib.parse
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from cursor_kv import HEADERS_SQL, WATERMARK_SQL, header_bubble_ids
+
+# Helpers shared by every script. Keep imports here to the standard library
+# modules the scripts need anyway: cursor_history.py loads this on each call.
+
+
+def default_db_path() -> str:
+    """Return a cross-platform default path to Cursor state.vscdb."""
+    if sys.platform == 'darwin':
+        # macOS
+        return os.path.expanduser('~/Library/Application Support/Cursor/User/globalStorage/state.vscdb')
+    if sys.platform.startswith('win'):
+        # Windows
+        appdata = os.environ.get('APPDATA') or os.path.expanduser('~\\AppData\\Roaming')
+        return os.path.join(appdata, 'Cursor', 'User', 'globalStorage', 'state.vscdb')
+    # Linux / others
+    xdg = os.environ.get('XDG_CONFIG_HOME') or os.path.expanduser('~/.config')
+    return os.path.join(xdg, 'Cursor', 'User', 'globalStorage', 'state.vscdb')
+
+
+def default_out_root() -> str:
+    return os.path.abspath(os.path.join(os.getcwd(), '@chat_history'))
+
+
+def default_flow_root() -> str:
+    # default to ./Flow relative to cwd if exists, else ~/Flow
+    cwd_flow = os.path.abspath(os.path.join(os.getcwd(), 'Flow'))
+    if os.path.isdir(cwd_flow):
+        return cwd_flow
+    return os.path.expanduser('~/Flow')
+
+
+def connect_db_readonly(db_path: str) -> sqlite3.Connection:
+    uri = f"file:{urllib.parse.quote(db_path)}?mode=ro"
+    return sqlite3.connect(uri, uri=True)
+
+
+def valid_date(s: str) -> str:
+    try:
+        datetime.datetime.strptime(s, '%Y-%m-%d')
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid date {s!r} (expected YYYY-MM-DD)")
+    return s
+
+
+def text_of(content: Any) -> str:
+    if isinstance(content, (dict, list)):
+        return json.dumps(content, ensure_ascii=False, indent=2)
+    return '' if content is None else str(content)
+
+
+def bubble_text(value: Any) -> Tuple[Dict[str, Any], str]:
+    """Parsed bubble and its message text."""
+    try:
+        o = json.loads(value)
+    except Exception:
+        o = {"content": value}
+    if not isinstance(o, dict):
+        o = {"content": o}
+    return o, text_of(o.get('content') or o.get('text') or o.get('richText') or o.get('message'))
+
+
+def first_nonempty_content(bubbles: List[Tuple[str, str]]) -> str:
+    for _, v in bubbles:
+        s = bubble_text(v)[1]
+        if s.strip():
+            return s.strip()
+    return ''
+
+
+def derive_title20(s: str) -> str:
+    s = (s or '').strip()
+    s = re.sub(r"\s+", " ", s)[:20]
+    for a, b in [
+        ('/', '／'), ('\\', '＼'), (':', '：'), ('*', '＊'), ('?', '？'), ('"', '”'), ('<', '＜'), ('>', '＞'), ('|', '｜')
+    ]:
+        s = s.replace(a, b)
+    return s or 'untitled'
+
+
+def map_role(o: Dict[str, Any]) -> str:
+    role_raw = o.get('role') or o.get('authorRole') or o.get('sender')
+    if isinstance(role_raw, str):
+        r = role_raw.lower()
+        if r in ('user', 'human', 'client'):
+            return 'user'
+        if r in ('assistant', 'ai', 'agent', 'bot', 'model', 'system', 'tool'):
+            return 'assistant'
+    t = o.get('type')
+    if isinstance(t, int):
+        if t == 1:
+            return 'user'
+        if t == 2:
+            return 'assistant'
+    return 'other'
+
+
+def group_texts(messages: Iterable[Tuple[str, str]]) -> List[Dict[str, Any]]:
+    """Group (role, text) pairs into consecutive same-role blocks, dropping empty texts."""
+    grouped: List[Dict[str, Any]] = []
+    for role, s in messages:
+        if not s.strip():
+            continue
+        if grouped and grouped[-1]['role'] == role:
+            grouped[-1]['texts'].append(s)
+        else:
+            grouped.append({'role': role, 'texts': [s]})
+    return grouped
+
+
+def group_messages(bubbles: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+    return group_texts((map_role(o), s) for o, s in (bubble_text(v) for _, v in bubbles))
+
+
+def head_text(grouped: List[Dict[str, Any]]) -> str:
+    """First message text of grouped messages (what first_nonempty_content returns for the bubbles)."""
+    return grouped[0]['texts'][0].strip() if grouped else ''
+
+
+def render_groups(grouped: List[Dict[str, Any]]) -> str:
+    """The messages: items of chat.yaml for grouped messages."""
+    out = []
+    for g in grouped:
+        out.append(f"  - role: \"{g['role']}\"\n")
+        out.append("    content: |-\n")
+        block = '\n\n'.join(g['texts']).rstrip('\n')
+        for line in block.splitlines():
+            out.append("      " + line + "\n")
+    return ''.join(out)
+
+
+def render_yaml(cid: str, created_dt: str, title20: str, grouped: List[Dict[str, Any]]) -> str:
+    return (
+        '---\n'
+        f"threadId: \"{cid}\"\n"
+        f"created_at: \"{created_dt}\"\n"
+        f"title20: \"{title20}\"\n"
+        "messages:\n"
+    ) + render_groups(grouped)
+
+
+def write_chat_yaml(
+    folder: str,
+    cid: str,
+    created_dt: str,
+    title20: str,
+    grouped: List[Dict[str, Any]],
+    committer: Optional[Any] = None,
+) -> str:
+    """Write <folder>/chat.yaml (through a durable_io.GroupCommitter if given) and return its text."""
+    os.makedirs(folder, exist_ok=True)
+    p = os.path.join(folder, 'chat.yaml')
+    text = render_yaml(cid, created_dt, title20, grouped)
+    if committer is not None:
+        committer.write_text(p, text)
+    else:
+        with open(p, 'w', encoding='utf-8') as f:
+            f.write(text)
+    return text
+
+
+def fetch_threads_for_date(conn: sqlite3.Connection, target_date: str) -> List[Tuple[str, int, List[str], str]]:
+    """(cid, createdAt, header bubble ids, watermark) of the threads created on a local date."""
+    y, m, d = map(int, target_date.split('-'))
+    start = datetime.datetime(y, m, d, 0, 0, 0)
+    end = start + datetime.timedelta(days=1)
+    start_ms = int(start.timestamp() * 1000)
+    end_ms = int(end.timestamp() * 1000)
+    cur = conn.cursor()
+    cur.execute(
+        f"""
+        SELECT substr(key, length('composerData:')+1) AS cid,
+               json_extract(value,'$.createdAt') AS createdAt,
+               {HEADERS_SQL} AS headers,
+               {WATERMARK_SQL} AS watermark
+        FROM cursorDiskKV
+        WHERE key >= 'composerData:' AND key < 'composerData;'
+          AND json_extract(value,'$.createdAt') >= ?
+          AND json_extract(value,'$.createdAt') < ?
+        ORDER BY createdAt ASC
+        """,
+        (start_ms, end_ms),
+    )
+    return [(row[0], int(row[1]), header_bubble_ids(row[2]), row[3]) for row in cur.fetchall()]
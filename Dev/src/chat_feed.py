@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""Change feed of an output root: <root>/changes.ndjson.
+
+Every export, per-date rebuild and organize run appends one JSON line per
+thread it changed:
+
+    {"run": "...", "ts": "...", "op": "updated", "cid": "...", "folder": "2025-09-07_...", "sha256": "..."}
+
+op is one of
+  created   a thread appeared at folder
+  updated   its chat.yaml changed (with offset: append mode rewrote only the
+            bytes from offset on; sha256 still covers the whole file)
+  renamed   it moved from prev_folder to folder
+  removed   folder was removed from the tree
+  deleted   the thread is gone from state.vscdb (its folder is kept)
+
+Threads rewritten with identical content produce no line. Consumers keep the
+byte offset they have read up to and call read_changes(root, offset), so a
+sync costs O(changes) instead of a rescan of the tree. Lines are appended
+with O_APPEND, one write per flush, so concurrent shards do not interleave.
+"""
+import argparse
+import json
+import os
+import sqlite3
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+FEED_NAME = 'changes.ndjson'
+
+DELETED_SCHEMA = 'CREATE TABLE IF NOT EXISTS db_deleted (cid TEXT PRIMARY KEY, folder TEXT, detected_at TEXT)'
+
+
+def feed_path(root: str) -> str:
+    return os.path.join(root, FEED_NAME)
+
+
+def new_run_id() -> str:
+    return time.strftime('%Y%m%dT%H%M%S') + f'-{os.getpid()}'
+
+
+class ChangeFeed:
+    """Buffer change records of one run and append them to the feed on flush()."""
+
+    def __init__(self, root: str, run_id: Optional[str] = None) -> None:
+        self.root = root
+        self.run_id = run_id or new_run_id()
+        self.counts: Dict[str, int] = {}
+        self._lines: List[str] = []
+
+    def add(self, op: str, cid: str, folder: str, sha256: Optional[str] = None, **extra: Any) -> None:
+        rec = {'run': self.run_id, 'ts': time.strftime('%Y-%m-%dT%H:%M:%S%z'), 'op': op,
+               'cid': cid, 'folder': folder, 'sha256': sha256}
+        rec.update(extra)
+        self._lines.append(json.dumps(rec, ensure_ascii=False) + '\n')
+        self.counts[op] = self.counts.get(op, 0) + 1
+
+    def thread_written(self, prev: List[Dict[str, Any]], cid: str, folder: str, sha256: str) -> None:
+        """Record a full rewrite of cid at folder given its catalog rows from before the write."""
+        old = prev[-1] if prev else None
+        if old is None:
+            self.add('created', cid, folder, sha256)
+        elif old['folder'] != folder:
+            self.add('renamed', cid, folder, sha256, prev_folder=old['folder'])
+        elif old['sha256'] != sha256:
+            self.add('updated', cid, folder, sha256)
+
+    def date_rebuilt(self, old_rows: Iterable[Dict[str, Any]], new_rows: Iterable[Dict[str, Any]]) -> None:
+        """Record the difference between a date's catalog rows before and after it was rebuilt."""
+        old = {r['cid']: r for r in old_rows}
+        for r in new_rows:
+            self.thread_written([old[r['cid']]] if r['cid'] in old else [], r['cid'], r['folder'], r['sha256'])
+            old.pop(r['cid'], None)
+        for r in old.values():
+            self.add('removed', r['cid'], r['folder'], r['sha256'])
+
+    def flush(self) -> None:
+        if not self._lines:
+            return
+        data = ''.join(self._lines).encode('utf-8')
+        self._lines = []
+        fd = os.open(feed_path(self.root), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+
+
+def note_db_deletions(feed: ChangeFeed, cat: sqlite3.Connection, db_cids: Iterable[str]) -> int:
+    """Add a 'deleted' record for each cataloged thread no longer in the DB (once per thread)."""
+    cat.execute(DELETED_SCHEMA)
+    live = set(db_cids)
+    reported = {r[0] for r in cat.execute('SELECT cid FROM db_deleted')}
+    gone: Dict[str, str] = {}
+    # threads exported from a workspace DB (chat_workspaces.py) are not expected in the global one
+    rows = cat.execute(
+        "SELECT cid, folder FROM threads WHERE cid NOT IN"
+        " (SELECT cid FROM thread_workspaces WHERE source = 'local') ORDER BY created_at"
+    )
+    for cid, folder in rows:
+        if cid not in live and cid not in reported:
+            gone[cid] = folder
+    now = time.strftime('%Y-%m-%dT%H:%M:%S%z')
+    with cat:
+        cat.executemany('DELETE FROM db_deleted WHERE cid = ?', [(c,) for c in reported & live])
+        cat.executemany('INSERT OR REPLACE INTO db_deleted VALUES (?, ?, ?)', [(c, f, now) for c, f in gone.items()])
+    for cid, folder in gone.items():
+        feed.add('deleted', cid, folder)
+    return len(gone)
+
+
+def read_changes(root: str, offset: int = 0, limit: Optional[int] = None) -> Tuple[List[Dict[str, Any]], int]:
+    """Records after byte offset and the offset to resume from (a partly written last line is left for later)."""
+    out: List[Dict[str, Any]] = []
+    try:
+        f = open(feed_path(root), 'rb')
+    except FileNotFoundError:
+        return out, offset
+    with f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b'\n') or (limit is not None and len(out) >= limit):
+                break
+            out.append(json.loads(line))
+            offset += len(line)
+    return out, offset
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Print the changes recorded in <root>/changes.ndjson after a byte offset.')
+    parser.add_argument('--root', required=True, help='Output root (@chat_history or Flow)')
+    parser.add_argument('--offset', type=int, default=0, help='Byte offset returned as next_offset by the previous call')
+    parser.add_argument('--limit', type=int, help='At most this many records')
+    args = parser.parse_args()
+    records, next_offset = read_changes(args.root, args.offset, args.limit)
+    print(json.dumps({'records': records, 'next_offset': next_offset}, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+"""Extra output formats written in the same pass as chat.yaml.
+
+    python export_cursor_history.py --all --format ndjson --format markdown
+
+The exporter fetches and decodes every thread once; after chat.yaml is
+written the grouped (and, with --redact, redacted) messages are handed to
+each selected writer, which only renders them and buffers the result in its
+own sink. A format is a Writer subclass registered under a name:
+
+    @register('csv')
+    class CSVWriter(Writer):
+        def write(self, thread): ...
+"""
+import abc
+import json
+import os
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
+
+FORMATS_DIR = 'formats'
+SINK_BUFFER = 1 << 20  # bytes a sink holds before it writes them out
+
+FORMATS: Dict[str, Type['Writer']] = {}
+
+
+def register(name: str) -> Callable[[Type['Writer']], Type['Writer']]:
+    def deco(cls: Type['Writer']) -> Type['Writer']:
+        cls.name = name
+        FORMATS[name] = cls
+        return cls
+    return deco
+
+
+class ThreadOut:
+    """What every writer gets for an exported thread (messages already grouped and redacted)."""
+
+    __slots__ = ('cid', 'created_dt', 'title20', 'folder', 'grouped', 'prev_folder')
+
+    def __init__(
+        self,
+        cid: str,
+        created_dt: str,
+        title20: str,
+        folder: str,
+        grouped: List[Dict[str, Any]],
+        prev_folder: Optional[str] = None,
+    ) -> None:
+        self.cid = cid
+        self.created_dt = created_dt
+        self.title20 = title20
+        self.folder = folder
+        self.grouped = grouped
+        self.prev_folder = prev_folder  # the folder it was exported to before, when it was renamed
+
+    def messages(self) -> List[Dict[str, str]]:
+        """Messages as chat_reader.load_chat returns them."""
+        return [{'role': g['role'], 'content': '\n\n'.join(g['texts']).rstrip('\n')} for g in self.grouped]
+
+
+class Writer(abc.ABC):
+    """Base class of the output formats; one instance per export run.
+
+    write() renders a thread into the sink; flush() writes out what is
+    buffered (the exporter calls it at its durable checkpoints with fsync
+    set) and close() flushes and releases the sink.
+    """
+
+    name = ''
+
+    def __init__(self, out_root: str, run_id: str) -> None:
+        self.out_root = out_root
+        self.run_id = run_id
+        self.threads = 0
+        self.chars = 0
+
+    @abc.abstractmethod
+    def write(self, thread: ThreadOut) -> None:
+        """Render thread into the sink."""
+
+    def flush(self, fsync: bool = False) -> None:
+        pass
+
+    def close(self) -> None:
+        self.flush()
+
+    def summary(self) -> Dict[str, Any]:
+        return {'threads': self.threads, 'chars': self.chars}
+
+
+@register('ndjson')
+class NDJSONWriter(Writer):
+    """One JSON object per line in formats/threads-<run>.ndjson; every run starts a new file."""
+
+    def __init__(self, out_root: str, run_id: str) -> None:
+        super().__init__(out_root, run_id)
+        self.path = os.path.join(out_root, FORMATS_DIR, f'threads-{run_id}.ndjson')
+        self._f: Optional[Any] = None
+
+    def write(self, thread: ThreadOut) -> None:
+        if self._f is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._f = open(self.path, 'a', encoding='utf-8', buffering=SINK_BUFFER)
+        line = json.dumps({
+            'threadId': thread.cid,
+            'created_at': thread.created_dt,
+            'title20': thread.title20,
+            'messages': thread.messages(),
+        }, ensure_ascii=False) + '\n'
+        self._f.write(line)
+        self.threads += 1
+        self.chars += len(line)
+
+    def flush(self, fsync: bool = False) -> None:
+        if self._f is not None:
+            self._f.flush()
+            if fsync:
+                os.fsync(self._f.fileno())
+
+    def close(self) -> None:
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+    def summary(self) -> Dict[str, Any]:
+        return dict(super().summary(), path=self.path)
+
+
+def render_markdown(thread: ThreadOut) -> str:
+    out = [f'# {thread.title20}\n\n', f'- threadId: `{thread.cid}`\n', f'- created_at: {thread.created_dt}\n']
+    for m in thread.messages():
+        out.append(f"\n## {m['role']}\n\n")
+        out.append(m['content'] + '\n')
+    return ''.join(out)
+
+
+@register('markdown')
+class MarkdownWriter(Writer):
+    """One page per thread under formats/markdown/YYYY-MM-DD/, named like its chat.yaml folder.
+
+    A renamed thread's page is renamed with it: the page of its previous
+    folder is removed when the new one is written.
+    """
+
+    def __init__(self, out_root: str, run_id: str) -> None:
+        super().__init__(out_root, run_id)
+        self.dir = os.path.join(out_root, FORMATS_DIR, 'markdown')
+        self._pending: List[Tuple[str, str]] = []
+        self._stale: List[str] = []
+        self._buffered = 0
+
+    def page_path(self, created_dt: str, folder: str) -> str:
+        return os.path.join(self.dir, created_dt[:10], os.path.basename(folder.rstrip('/\\')) + '.md')
+
+    def write(self, thread: ThreadOut) -> None:
+        page = render_markdown(thread)
+        path = self.page_path(thread.created_dt, thread.folder)
+        if thread.prev_folder is not None:
+            old = self.page_path(thread.created_dt, thread.prev_folder)
+            if old != path:
+                self._stale.append(old)
+        self._pending.append((path, page))
+        self._buffered += len(page)
+        self.threads += 1
+        self.chars += len(page)
+        if self._buffered >= SINK_BUFFER:
+            self.flush()
+
+    def flush(self, fsync: bool = False) -> None:
+        for path, page in self._pending:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(page)
+                if fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+        for path in self._stale:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        self._pending = []
+        self._stale = []
+        self._buffered = 0
+
+    def summary(self) -> Dict[str, Any]:
+        return dict(super().summary(), dir=self.dir)
+
+
+def open_writers(names: Optional[List[str]], out_root: str, run_id: str) -> List[Writer]:
+    """Writer instances for the selected format names (duplicates ignored); ValueError for unknown ones."""
+    writers = []
+    for name in dict.fromkeys(names or []):
+        if name not in FORMATS:
+            raise ValueError(f"unknown format {name!r} (choose from {', '.join(sorted(FORMATS))})")
+        writers.append(FORMATS[name](out_root, run_id))
+    return writers
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""Profile the keyspace of state.vscdb: what its rows are and where the bytes go.
+
+    python chat_inspect.py [--db state.vscdb] [--out report.json] [--history trend.jsonl]
+
+cursorDiskKV is read in one sequential table scan (rowid order, no index,
+no sort). Only the key, the value's size and, for bubbles, whether it has a
+createdAt cross into Python; sizes go into log-scale histograms, so memory
+grows with the number of key families and threads, never with the number
+of rows or the size of values.
+"""
+import argparse
+import heapq
+import json
+import math
+import os
+import sqlite3
+import sys
+import time
+from typing import Any, Dict, List, Optional, TextIO
+
+from chat_core import connect_db_readonly, default_db_path
+
+BUCKETS_PER_OCTAVE = 4  # size percentiles are exact to within 2**(1/4) ~ 19%
+MAX_FAMILIES = 200  # rarer families beyond this are counted under OTHER
+OTHER = '(other)'
+NO_PREFIX = '(no prefix)'
+
+# Size in bytes whether the value is stored as TEXT or BLOB; for bubbles also
+# 1 = has createdAt, 0 = has none, -1 = not JSON (NULL for other keys).
+SCAN_SQL = (
+    "SELECT key, length(CAST(value AS BLOB)),"
+    " CASE WHEN substr(key, 1, 9) = 'bubbleId:' THEN"
+    "  CASE WHEN NOT json_valid(CAST(value AS TEXT)) THEN -1"
+    "  ELSE json_type(CAST(value AS TEXT), '$.createdAt') IS NOT NULL END"
+    " END"
+    " FROM cursorDiskKV"
+)
+
+
+class SizeHistogram:
+    """Count, total, max and approximate percentiles of value sizes in O(log max) memory."""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self.buckets: Dict[int, int] = {}
+
+    def add(self, size: int) -> None:
+        self.count += 1
+        self.total += size
+        if size > self.max:
+            self.max = size
+        b = -1 if size <= 0 else int(math.log2(size) * BUCKETS_PER_OCTAVE)
+        self.buckets[b] = self.buckets.get(b, 0) + 1
+
+    def percentile(self, q: float) -> int:
+        """Upper bound of the bucket holding the q-th percentile (capped at the max)."""
+        rank = max(1, math.ceil(q * self.count))
+        seen = 0
+        for b in sorted(self.buckets):
+            seen += self.buckets[b]
+            if seen >= rank:
+                return 0 if b < 0 else min(self.max, int(2 ** ((b + 1) / BUCKETS_PER_OCTAVE)))
+        return self.max
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'rows': self.count,
+            'bytes': self.total,
+            'avg': round(self.total / self.count) if self.count else 0,
+            'p50': self.percentile(0.5),
+            'p90': self.percentile(0.9),
+            'p99': self.percentile(0.99),
+            'max': self.max,
+        }
+
+
+def family(key: str) -> str:
+    """Key family: everything up to and including the first ':' ('bubbleId:', 'composerData:')."""
+    i = key.find(':')
+    return key[:i + 1] if i > 0 else NO_PREFIX
+
+
+def db_pages(conn: sqlite3.Connection) -> Dict[str, int]:
+    page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+    pages = conn.execute('PRAGMA page_count').fetchone()[0]
+    free = conn.execute('PRAGMA freelist_count').fetchone()[0]
+    return {'page_size': page_size, 'file_bytes': page_size * pages, 'free_bytes': page_size * free}
+
+
+def inspect(
+    conn: sqlite3.Connection,
+    top: int = 20,
+    progress_interval: float = 0,
+    stream: Optional[TextIO] = None,
+    clock: Any = time.monotonic,
+) -> Dict[str, Any]:
+    """Scan cursorDiskKV once and summarise it per key family and per thread."""
+    started = clock()
+    next_report = started + progress_interval if progress_interval > 0 else None
+    families: Dict[str, SizeHistogram] = {}
+    # per thread: [bubble rows, bubble bytes, composerData bytes]
+    threads: Dict[str, List[int]] = {}
+    no_created = 0
+    not_json = 0
+    rows = 0
+    for key, size, created in conn.execute(SCAN_SQL):
+        size = size or 0
+        fam = family(key)
+        hist = families.get(fam)
+        if hist is None:
+            hist = families.setdefault(fam if len(families) < MAX_FAMILIES else OTHER, SizeHistogram())
+        hist.add(size)
+        if fam == 'bubbleId:':
+            cid = key[9:].split(':', 1)[0]
+            t = threads.get(cid)
+            if t is None:
+                t = threads[cid] = [0, 0, 0]
+            t[0] += 1
+            t[1] += size
+            if created == 0:
+                no_created += 1
+            elif created == -1:
+                not_json += 1
+        elif fam == 'composerData:':
+            t = threads.setdefault(key[13:], [0, 0, 0])
+            t[2] += size
+        rows += 1
+        if next_report is not None and not rows % 10000 and clock() >= next_report:
+            out = stream if stream is not None else sys.stderr
+            out.write('progress ' + json.dumps({'rows': rows, 'elapsed_s': round(clock() - started, 1)}) + '\n')
+            out.flush()
+            next_report = clock() + progress_interval
+
+    total = sum(h.total for h in families.values()) or 1
+    report_families = {}
+    for fam, hist in sorted(families.items(), key=lambda kv: -kv[1].total):
+        report_families[fam] = dict(hist.summary(), share=round(hist.total / total, 4))
+    largest = heapq.nlargest(top, threads.items(), key=lambda kv: kv[1][1])
+    return {
+        'generated_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'db': dict(db_pages(conn), rows=rows, value_bytes=sum(h.total for h in families.values())),
+        'families': report_families,
+        'threads': {
+            'composers': sum(1 for t in threads.values() if t[2]),
+            'with_bubbles': sum(1 for t in threads.values() if t[0]),
+            # bubbles whose composerData row is gone: never exported, still stored
+            'orphaned_bubble_threads': sum(1 for t in threads.values() if t[0] and not t[2]),
+        },
+        'largest_threads': [
+            {'cid': cid, 'bubbles': t[0], 'bubble_bytes': t[1], 'composer_bytes': t[2]}
+            for cid, t in largest if t[1]
+        ],
+        'bubbles_without_createdAt': no_created,
+        'bubbles_not_json': not_json,
+        'elapsed_s': round(clock() - started, 2),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Report key families, value sizes and the largest threads in state.vscdb (one sequential scan).')
+    parser.add_argument('--db', default=default_db_path(), help='Path to Cursor state.vscdb')
+    parser.add_argument('--top', type=int, default=20, help='Number of largest threads to list')
+    parser.add_argument('--out', help='Also write the report to this JSON file')
+    parser.add_argument('--history', help='Append the report as one JSON line to this file (for trending)')
+    parser.add_argument('--progress-interval', type=float, default=30.0, help='Seconds between progress lines on stderr (0 disables)')
+    args = parser.parse_args()
+
+    conn = connect_db_readonly(args.db)
+    report = inspect(conn, top=args.top, progress_interval=args.progress_interval)
+    conn.close()
+    report['db']['path'] = os.path.abspath(args.db)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    if args.history:
+        with open(args.history, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(report, ensure_ascii=False) + '\n')
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+import hashlib
+import os
+import re
+from typing import Iterator, Tuple
+
+# Directory layouts understood by the writers and readers.
+#   flat: <root>/<folder>                       (@chat_history default)
+#   date: <root>/YYYY/MM/DD/<folder>
+#   hash: <root>/<2 hex chars of sha1(cid)>/<folder>
+#   flow: <root>/YYYYMM/YYYY-MM-DD/chats/<folder> (AIPM Flow, written by update_latest_chat_per_date)
+SHARDED_LAYOUTS = ('flat', 'date', 'hash')
+LAYOUTS = SHARDED_LAYOUTS + ('flow',)
+
+_FOLDER_DATE_RE = re.compile(r"^(\d{4})-(\d{2})-(\d{2})_")
+
+
+def shard_dir(root: str, layout: str, created_dt: str, cid: str) -> str:
+    """Return the directory a thread folder belongs in (created_dt is YYYY-MM-DD_HH-MM-SS)."""
+    if layout == 'date':
+        return os.path.join(root, created_dt[0:4], created_dt[5:7], created_dt[8:10])
+    if layout == 'hash':
+        return os.path.join(root, hashlib.sha1(cid.encode('utf-8')).hexdigest()[:2])
+    if layout == 'flat':
+        return root
+    raise ValueError(f"layout {layout!r} has no shard directory")
+
+
+def thread_folder(root: str, layout: str, folder_name: str, cid: str) -> str:
+    # folder names start with the created_at stamp, so they double as created_dt here
+    return os.path.join(shard_dir(root, layout, folder_name, cid), folder_name)
+
+
+def month_pack_path(root: str, ym: str) -> str:
+    """<root>/YYYYMM.zip: the thread folders of a Flow month rolled up by chat_pack.py."""
+    return os.path.join(root, ym + '.zip')
+
+
+def _dirs(path: str, pattern: str) -> Iterator[str]:
+    for name in sorted(os.listdir(path)):
+        if re.fullmatch(pattern, name) and os.path.isdir(os.path.join(path, name)):
+            yield name
+
+
+def iter_thread_folders(root: str, layout: str) -> Iterator[Tuple[str, str]]:
+    """Walk an output tree once, yielding (YYYY-MM-DD, folder path) for every thread folder."""
+    if not os.path.isdir(root):
+        return
+    if layout == 'flow':
+        for ym in _dirs(root, r"\d{6}"):
+            ym_path = os.path.join(root, ym)
+            for date in _dirs(ym_path, r"\d{4}-\d{2}-\d{2}"):
+                date_path = os.path.join(ym_path, date)
+                chats_dir = os.path.join(date_path, 'chats')
+                if os.path.isdir(chats_dir):
+                    for name in sorted(os.listdir(chats_dir)):
+                        yield date, os.path.join(chats_dir, name)
+                for name in sorted(os.listdir(date_path)):
+                    if name.startswith(date + '_'):
+                        yield date, os.path.join(date_path, name)
+        return
+    if layout == 'date':
+        shards = [
+            os.path.join(root, y, m, d)
+            for y in _dirs(root, r"\d{4}")
+            for m in _dirs(os.path.join(root, y), r"\d{2}")
+            for d in _dirs(os.path.join(root, y, m), r"\d{2}")
+        ]
+    elif layout == 'hash':
+        shards = [os.path.join(root, h) for h in _dirs(root, r"[0-9a-f]{2}")]
+    else:
+        shards = [root]
+    for shard in shards:
+        for name in sorted(os.listdir(shard)):
+            m = _FOLDER_DATE_RE.match(name)
+            if m:
+                yield '-'.join(m.groups()), os.path.join(shard, name)
+
+
+def prune_empty_dirs(root: str, path: str) -> None:
+    """Remove path and its now-empty parents, stopping at root."""
+    root = os.path.abspath(root)
+    path = os.path.abspath(path)
+    while path != root and path.startswith(root + os.sep):
+        try:
+            os.rmdir(path)
+        except OSError:
+            return
+        path = os.path.dirname(path)
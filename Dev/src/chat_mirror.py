@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""Keep a slim local copy of the chat keyspace of state.vscdb.
+
+    python chat_mirror.py --mirror chat_mirror.vscdb
+    python export_cursor_history.py --db chat_mirror.vscdb --all --out /tmp/rerender
+
+Only the composerData: and bubbleId: rows are copied, into a cursorDiskKV
+table of the same shape (plus created_at_ms, the createdAt of the value,
+indexed), so every script that takes --db reads the mirror unchanged.
+
+The first run copies both key ranges with INSERT ... SELECT from the
+attached source. Later runs compare one marker per thread: the watermark of
+its composerData row (cursor_kv.WATERMARK_SQL: last update time and header
+count) and the number of its bubble keys. Only the composerData values and
+the key index are read for that, never a bubble value. Threads whose marker
+differs from the one stored at the last sync are re-copied row by row (rows
+whose value is unchanged are skipped), threads gone from the source are
+deleted. A sync is one transaction on the mirror and sees one snapshot of
+the source. A bubble edited in place without a new lastUpdatedAt on its
+thread is not noticed; --full copies everything again.
+"""
+import argparse
+import json
+import os
+import sqlite3
+import time
+import urllib.parse
+from typing import Any, Dict, Tuple
+
+from chat_core import default_db_path
+from cursor_kv import COMPOSER_LO, COMPOSER_HI, WATERMARK_SQL
+
+MIRROR_NAME = 'chat_mirror.vscdb'
+BUBBLE_LO, BUBBLE_HI = 'bubbleId:', 'bubbleId;'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cursorDiskKV (key TEXT PRIMARY KEY, value BLOB, created_at_ms INTEGER);
+CREATE INDEX IF NOT EXISTS cursorDiskKV_created ON cursorDiskKV(created_at_ms);
+CREATE TABLE IF NOT EXISTS mirror_threads (cid TEXT PRIMARY KEY, digest TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS mirror_meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+CREATED_SQL = (
+    "CASE WHEN json_valid(CAST(s.value AS TEXT))"
+    " THEN json_extract(CAST(s.value AS TEXT), '$.createdAt') END"
+)
+COPY_SQL = (
+    "INSERT OR REPLACE INTO main.cursorDiskKV (key, value, created_at_ms)"
+    f" SELECT s.key, s.value, {CREATED_SQL} FROM src.cursorDiskKV s WHERE s.key >= ? AND s.key < ?"
+)
+# the same, skipping rows the mirror already has with an identical value
+COPY_CHANGED_SQL = COPY_SQL + (
+    " AND NOT EXISTS (SELECT 1 FROM main.cursorDiskKV m WHERE m.key = s.key AND m.value IS s.value)"
+)
+DELETE_GONE_SQL = (
+    "DELETE FROM main.cursorDiskKV WHERE key >= ? AND key < ?"
+    " AND key NOT IN (SELECT key FROM src.cursorDiskKV WHERE key >= ? AND key < ?)"
+)
+WATERMARKS_SQL = (
+    f"SELECT substr(key, {len(COMPOSER_LO) + 1}), {WATERMARK_SQL}"
+    " FROM {schema}.cursorDiskKV WHERE key >= ? AND key < ?"
+)
+# answered from the primary-key index alone
+KEYS_SQL = "SELECT key FROM {schema}.cursorDiskKV WHERE key >= ? AND key < ?"
+
+
+def default_mirror_path() -> str:
+    return os.path.abspath(os.path.join(os.getcwd(), MIRROR_NAME))
+
+
+def thread_ranges(cid: str) -> Tuple[Tuple[str, str], Tuple[str, str]]:
+    """Key ranges holding thread cid: its composerData row and its bubbles."""
+    composer = 'composerData:' + cid
+    return (composer, composer + '\0'), (f'bubbleId:{cid}:', f'bubbleId:{cid};')
+
+
+def thread_digests(conn: sqlite3.Connection, schema: str = 'main') -> Dict[str, str]:
+    """{cid: '<watermark>/<bubble keys>'}, from the composerData rows and the bubble keys."""
+    watermarks = dict(conn.execute(WATERMARKS_SQL.format(schema=schema), (COMPOSER_LO, COMPOSER_HI)))
+    counts: Dict[str, int] = {}
+    for (key,) in conn.execute(KEYS_SQL.format(schema=schema), (BUBBLE_LO, BUBBLE_HI)):
+        cid = key[len(BUBBLE_LO):].split(':', 1)[0]
+        counts[cid] = counts.get(cid, 0) + 1
+    # bubbles without a composerData row get the marker '-'
+    return {cid: f"{watermarks.get(cid, '-')}/{counts.get(cid, 0)}" for cid in watermarks.keys() | counts.keys()}
+
+
+def open_mirror(path: str) -> sqlite3.Connection:
+    fresh = not os.path.exists(path)
+    conn = sqlite3.connect(f'file:{urllib.parse.quote(path)}', uri=True, timeout=30, isolation_level=None)
+    if fresh:
+        conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def sync(source: str, mirror: str, full: bool = False) -> Dict[str, Any]:
+    """Bring mirror up to date with the chat rows of source."""
+    started = time.monotonic()
+    conn = open_mirror(mirror)
+    try:
+        conn.execute('ATTACH DATABASE ? AS src', (f'file:{urllib.parse.quote(source)}?mode=ro',))
+        conn.execute('BEGIN IMMEDIATE')
+        src = thread_digests(conn, 'src')
+        known = {} if full else dict(conn.execute('SELECT cid, digest FROM mirror_threads'))
+        copied = deleted = 0
+        if not known:
+            # first sync (or --full): two bulk range copies
+            conn.execute('DELETE FROM main.cursorDiskKV')
+            conn.execute('DELETE FROM mirror_threads')
+            for lo, hi in ((COMPOSER_LO, COMPOSER_HI), (BUBBLE_LO, BUBBLE_HI)):
+                copied += conn.execute(COPY_SQL, (lo, hi)).rowcount
+            changed = list(src)
+        else:
+            changed = [cid for cid, d in src.items() if known.get(cid) != d]
+            for cid in changed:
+                for lo, hi in thread_ranges(cid):
+                    copied += conn.execute(COPY_CHANGED_SQL, (lo, hi)).rowcount
+                    deleted += conn.execute(DELETE_GONE_SQL, (lo, hi, lo, hi)).rowcount
+        removed = [cid for cid in known if cid not in src]
+        for cid in removed:
+            for lo, hi in thread_ranges(cid):
+                deleted += conn.execute('DELETE FROM main.cursorDiskKV WHERE key >= ? AND key < ?', (lo, hi)).rowcount
+        conn.executemany('INSERT OR REPLACE INTO mirror_threads VALUES (?, ?)', [(c, src[c]) for c in changed])
+        conn.executemany('DELETE FROM mirror_threads WHERE cid = ?', [(c,) for c in removed])
+        summary = {
+            'source': os.path.abspath(source),
+            'mirror': os.path.abspath(mirror),
+            'initial': not known,
+            'threads': len(src),
+            'changed_threads': len(changed) if known else 0,
+            'removed_threads': len(removed),
+            'copied_rows': copied,
+            'deleted_rows': deleted,
+            'synced_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        }
+        conn.execute("INSERT OR REPLACE INTO mirror_meta VALUES ('last_sync', ?)", (json.dumps(summary),))
+        conn.execute('COMMIT')
+        if deleted or not known:
+            conn.execute('PRAGMA incremental_vacuum')
+        conn.execute('DETACH DATABASE src')
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute('ROLLBACK')
+        raise
+    finally:
+        conn.close()
+    summary['mirror_bytes'] = os.path.getsize(mirror)
+    summary['elapsed_s'] = round(time.monotonic() - started, 2)
+    return summary
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Copy the composerData:/bubbleId: rows of state.vscdb into a slim local mirror, syncing only changed threads.')
+    parser.add_argument('--db', default=default_db_path(), help='Path to Cursor state.vscdb')
+    parser.add_argument('--mirror', default=default_mirror_path(), help='Mirror to create or update (pass it as --db to the other scripts)')
+    parser.add_argument('--full', action='store_true', help='Copy every chat row again instead of only the changed threads')
+    args = parser.parse_args()
+    if not os.path.exists(args.db):
+        parser.error(f'{args.db} not found')
+    print(json.dumps(sync(args.db, args.mirror, full=args.full), ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
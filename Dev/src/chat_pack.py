@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""Roll closed Flow months into one zip each (Flow/YYYYMM.zip).
+
+The thread folders of the month move into the zip under their Flow-relative
+paths; other files in the date directories stay where they are. The zip
+ends with an index.json member holding the catalog row of every thread
+including the offset of its chat.yaml, and the catalog keeps the same
+offset, so a thread is read with one seek and one member decompression.
+"""
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import re
+import shutil
+import struct
+import zipfile
+import zlib
+from typing import Any, Dict, Iterator, List
+
+from chat_catalog import COLUMNS, abs_folder, find_thread, open_catalog, upsert_threads
+from chat_core import default_flow_root
+from chat_layout import month_pack_path, prune_empty_dirs
+from file_lock import root_lock
+
+INDEX_MEMBER = 'index.json'
+PACK_VERSION = 1
+_LOCAL_HEADER = struct.Struct('<4sHHHHHIIIHH')  # zip local file header (30 bytes)
+_MONTH_RE = re.compile(r'\d{6}')
+
+
+def _month_rows(cat: Any, ym: str) -> List[Dict[str, Any]]:
+    lo = f'{ym[:4]}-{ym[4:]}-'
+    rows = cat.execute('SELECT * FROM threads WHERE date >= ? AND date < ? ORDER BY folder', (lo, lo[:-1] + '.'))
+    return [dict(r) for r in rows]
+
+
+def pack_rows(root: str, name: str) -> List[Dict[str, Any]]:
+    """Catalog rows stored in the index of pack <root>/<name>."""
+    with zipfile.ZipFile(os.path.join(root, name)) as zf:
+        index = json.loads(zf.read(INDEX_MEMBER).decode('utf-8'))
+    rows = []
+    for row in index['threads']:
+        row = {c: row.get(c) for c in COLUMNS}
+        row['pack'] = name
+        rows.append(row)
+    return rows
+
+
+def read_member(path: str, offset: int) -> bytes:
+    """Bytes of the zip member whose local header starts at offset."""
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        sig, _, flags, method, _, _, crc, csize, _, nlen, xlen = _LOCAL_HEADER.unpack(f.read(_LOCAL_HEADER.size))
+        if sig != b'PK\x03\x04':
+            raise ValueError(f'{path}: no zip member at offset {offset}')
+        name = f.read(nlen).decode('utf-8')
+        if flags & 0x08 or csize == 0xFFFFFFFF:
+            # sizes live in a data descriptor / zip64 extra: let zipfile find them
+            with zipfile.ZipFile(path) as zf:
+                return zf.read(name)
+        f.seek(xlen, os.SEEK_CUR)
+        data = f.read(csize)
+    if method == zipfile.ZIP_DEFLATED:
+        data = zlib.decompress(data, -15)
+    elif method != zipfile.ZIP_STORED:
+        raise ValueError(f'{path}: {name}: unsupported compression {method}')
+    if zlib.crc32(data) != crc:
+        raise ValueError(f'{path}: {name}: CRC mismatch')
+    return data
+
+
+def read_packed(root: str, pack: str, offset: int) -> str:
+    """chat.yaml text of a packed thread (as a text-mode read of the file would return it)."""
+    return read_member(os.path.join(root, pack), offset).decode('utf-8').replace('\r\n', '\n')
+
+
+def read_thread(root: str, cid: str) -> str:
+    """chat.yaml text of a thread by cid (or prefix), packed or not."""
+    cat = open_catalog(root, 'flow')
+    rows = find_thread(cat, cid)
+    cat.close()
+    if not rows:
+        raise KeyError(cid)
+    row = rows[-1]
+    if row['pack']:
+        return read_packed(root, row['pack'], row['pack_offset'])
+    with open(os.path.join(abs_folder(root, row['folder']), 'chat.yaml'), 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def pack_month(root: str, ym: str) -> Dict[str, Any]:
+    """Move the loose thread folders of month ym into <root>/<ym>.zip (merging an existing pack).
+
+    The caller holds the root lock exclusively or the month lock.
+    """
+    path = month_pack_path(root, ym)
+    if os.path.exists(path):
+        unpack_month(root, ym)
+    cat = open_catalog(root, 'flow')
+    rows = []
+    # folders that lost their chat.yaml stay loose and are reported like chat_verify's missing
+    missing = []
+    for r in _month_rows(cat, ym):
+        folder = abs_folder(root, r['folder'])
+        if r['pack'] or not os.path.isdir(folder):
+            continue
+        if os.path.isfile(os.path.join(folder, 'chat.yaml')):
+            rows.append(r)
+        else:
+            missing.append({'cid': r['cid'], 'folder': r['folder'], 'date': r['date'], 'reason': 'chat.yaml not on disk'})
+    if not rows:
+        cat.close()
+        return {'month': ym, 'threads': 0, 'missing': missing}
+    name = os.path.basename(path)
+    tmp = path + '.tmp'
+    try:
+        with zipfile.ZipFile(tmp, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+            for row in rows:
+                folder = abs_folder(root, row['folder'])
+                for dirpath, _, files in os.walk(folder):
+                    for fname in sorted(files):
+                        p = os.path.join(dirpath, fname)
+                        zf.write(p, os.path.relpath(p, root).replace(os.sep, '/'))
+                row['pack'] = name
+                row['pack_offset'] = zf.getinfo(row['folder'] + '/chat.yaml').header_offset
+            index = {'version': PACK_VERSION, 'month': ym, 'threads': rows}
+            zf.writestr(INDEX_MEMBER, json.dumps(index, ensure_ascii=False))
+        os.replace(tmp, path)
+    except BaseException:
+        cat.close()
+        with contextlib.suppress(OSError):
+            os.remove(tmp)
+        raise
+    with cat:
+        cat.executemany(
+            'UPDATE threads SET pack = ?, pack_offset = ? WHERE folder = ?',
+            [(name, r['pack_offset'], r['folder']) for r in rows],
+        )
+    cat.close()
+    for row in rows:
+        folder = abs_folder(root, row['folder'])
+        shutil.rmtree(folder)
+        prune_empty_dirs(root, os.path.dirname(folder))
+    return {'month': ym, 'threads': len(rows), 'bytes': os.path.getsize(path), 'missing': missing}
+
+
+def unpack_month(root: str, ym: str) -> int:
+    """Extract <root>/<ym>.zip back into thread folders and remove it; returns the thread count."""
+    path = month_pack_path(root, ym)
+    name = os.path.basename(path)
+    with zipfile.ZipFile(path) as zf:
+        zf.extractall(root, [m for m in zf.namelist() if m != INDEX_MEMBER])
+    rows = pack_rows(root, name)
+    for row in rows:
+        row['pack'] = row['pack_offset'] = None
+        row['mtime_ns'] = os.stat(os.path.join(abs_folder(root, row['folder']), 'chat.yaml')).st_mtime_ns
+    cat = open_catalog(root, 'flow')
+    upsert_threads(cat, *rows)
+    cat.close()
+    os.remove(path)
+    return len(rows)
+
+
+@contextlib.contextmanager
+def unpacked(root: str, ym: str) -> Iterator[None]:
+    """Unpack month ym for the duration of the block and repack it afterwards (caller holds month_lock)."""
+    unpack_month(root, ym)
+    try:
+        yield
+    finally:
+        pack_month(root, ym)
+
+
+def closed_months(root: str) -> List[str]:
+    """Months before the current one that still have loose thread folders."""
+    current = datetime.date.today().strftime('%Y%m')
+    cat = open_catalog(root, 'flow')
+    months = [r[0] for r in cat.execute(
+        'SELECT DISTINCT substr(date, 1, 4) || substr(date, 6, 2) FROM threads WHERE pack IS NULL ORDER BY 1'
+    )]
+    cat.close()
+    return [ym for ym in months if _MONTH_RE.fullmatch(ym) and ym < current]
+
+
+def valid_month(s: str) -> str:
+    if not _MONTH_RE.fullmatch(s) or not 1 <= int(s[4:]) <= 12:
+        raise argparse.ArgumentTypeError(f"invalid month {s!r} (expected YYYYMM)")
+    return s
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Pack closed Flow months into Flow/YYYYMM.zip, unpack them, or read one thread.')
+    parser.add_argument('command', choices=['pack', 'unpack', 'show'])
+    parser.add_argument('--flow', default=default_flow_root(), help='Flow root folder')
+    parser.add_argument('--month', action='append', type=valid_month, help='YYYYMM (repeatable; pack default: every closed month)')
+    parser.add_argument('--cid', help='Thread id or prefix (show)')
+    args = parser.parse_args()
+
+    if args.command == 'show':
+        if not args.cid:
+            parser.error('--cid is required for show')
+        from chat_reader import load_chat_text
+
+        try:
+            result: Any = load_chat_text(read_thread(args.flow, args.cid))
+        except KeyError:
+            parser.error(f'thread {args.cid!r} not in the catalog')
+    else:
+        with root_lock(args.flow, shared=False):
+            if args.command == 'pack':
+                result = [pack_month(args.flow, ym) for ym in args.month or closed_months(args.flow)]
+            else:
+                if not args.month:
+                    parser.error('--month is required for unpack')
+                result = {
+                    ym: unpack_month(args.flow, ym) if os.path.exists(month_pack_path(args.flow, ym)) else 0
+                    for ym in args.month
+                }
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
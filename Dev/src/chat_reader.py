@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+import argparse
+import io
+import json
+import mmap
+import os
+import re
+from typing import Any, Dict, Iterator, List, Optional
+
+# Reader for the restricted chat.yaml format produced by write_yaml:
+#   ---
+#   key: "value"            (header)
+#   messages:
+#     - role: "<role>"
+#       content: |-
+#         <text indented by 6 spaces>
+# Anything else is not supported; use PyYAML for hand-edited files.
+
+_HEADER_RE = re.compile(r'^([A-Za-z_][A-Za-z0-9_]*): ?(.*)$')
+_ROLE_PREFIX = '  - role: '
+_CONTENT_LINE = '    content: |-'
+_INDENT = '      '
+_ROLE_PREFIX_B = b'\n  - role: '
+
+
+def _unquote(v: str) -> str:
+    v = v.strip()
+    if len(v) >= 2 and v[0] == '"' and v[-1] == '"':
+        inner = v[1:-1]
+        if '\\' in inner:
+            try:
+                return json.loads(v)
+            except ValueError:
+                pass
+        return inner
+    return v
+
+
+def _parse_header_lines(lines: Iterator[str]) -> Dict[str, str]:
+    header: Dict[str, str] = {}
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if line == '---' or not line:
+            continue
+        if line == 'messages:':
+            break
+        m = _HEADER_RE.match(line)
+        if m:
+            header[m.group(1)] = _unquote(m.group(2))
+    return header
+
+
+def _finish(role: str, body: List[str]) -> Dict[str, str]:
+    return {'role': role, 'content': ''.join(body).rstrip('\n')}
+
+
+def read_header(path: str) -> Dict[str, str]:
+    """Read only the header fields (threadId, created_at, title20, ...) of a chat.yaml."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return _parse_header_lines(f)
+
+
+def _iter_message_lines(f: Iterator[str]) -> Iterator[Dict[str, str]]:
+    _parse_header_lines(f)
+    role: Optional[str] = None
+    body: List[str] = []
+    skip = len(_INDENT)
+    for line in f:
+        if line.startswith(_ROLE_PREFIX):
+            if role is not None:
+                yield _finish(role, body)
+            role = _unquote(line[len(_ROLE_PREFIX):])
+            body = []
+        elif line.startswith(_CONTENT_LINE):
+            continue
+        else:
+            body.append(line[skip:])
+    if role is not None:
+        yield _finish(role, body)
+
+
+def _iter_messages_stream(path: str) -> Iterator[Dict[str, str]]:
+    with open(path, 'r', encoding='utf-8') as f:
+        yield from _iter_message_lines(f)
+
+
+def _iter_messages_mmap(path: str) -> Iterator[Dict[str, str]]:
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            pos = mm.find(b'\nmessages:')
+            if pos < 0:
+                return
+            pos = mm.find(_ROLE_PREFIX_B, pos)
+            while pos >= 0:
+                start = pos + len(_ROLE_PREFIX_B)
+                nxt = mm.find(_ROLE_PREFIX_B, start)
+                chunk = mm[start:nxt if nxt >= 0 else len(mm)].decode('utf-8')
+                if '\r' in chunk:
+                    chunk = chunk.replace('\r\n', '\n')
+                role_line, _, rest = chunk.partition('\n')
+                _, _, text = rest.partition('\n')  # drop "content: |-"
+                text = text[len(_INDENT):].replace('\n' + _INDENT, '\n')
+                yield {'role': _unquote(role_line), 'content': text.rstrip('\n')}
+                pos = nxt
+
+
+def iter_messages(path: str, use_mmap: bool = False) -> Iterator[Dict[str, str]]:
+    """Lazily yield {'role', 'content'} dicts in file order."""
+    if use_mmap:
+        return _iter_messages_mmap(path)
+    return _iter_messages_stream(path)
+
+
+def load_chat(path: str, use_mmap: bool = False) -> Dict[str, Any]:
+    """Return the same structure yaml.safe_load gives for an exporter-written chat.yaml."""
+    data: Dict[str, Any] = dict(read_header(path))
+    data['messages'] = list(iter_messages(path, use_mmap=use_mmap))
+    return data
+
+
+def load_chat_text(text: str) -> Dict[str, Any]:
+    """load_chat for chat.yaml content already in memory (e.g. read from a month pack)."""
+    data: Dict[str, Any] = dict(_parse_header_lines(io.StringIO(text)))
+    data['messages'] = list(_iter_message_lines(io.StringIO(text)))
+    return data
+
+
+class ChatThread:
+    __slots__ = ('root', 'folder', 'path', 'cid', 'created_at', 'title20', 'pack', 'pack_offset', '_header')
+
+    def __init__(
+        self,
+        root: str,
+        folder: str,
+        cid: str = '',
+        created_at: str = '',
+        title20: str = '',
+        pack: Optional[str] = None,
+        pack_offset: Optional[int] = None,
+    ) -> None:
+        self.root = root
+        self.folder = folder
+        self.path = os.path.join(folder, 'chat.yaml')
+        self.cid = cid
+        self.created_at = created_at
+        self.title20 = title20
+        self.pack = pack
+        self.pack_offset = pack_offset
+        self._header: Optional[Dict[str, str]] = None
+
+    def _packed_text(self) -> str:
+        # one member read at its offset; the rest of the month stays compressed
+        from chat_pack import read_packed
+
+        return read_packed(self.root, self.pack, self.pack_offset)
+
+    @property
+    def header(self) -> Dict[str, str]:
+        if self._header is None:
+            if self.pack:
+                self._header = _parse_header_lines(io.StringIO(self._packed_text()))
+            else:
+                self._header = read_header(self.path)
+        return self._header
+
+    def messages(self, use_mmap: bool = False) -> Iterator[Dict[str, str]]:
+        if self.pack:
+            return _iter_message_lines(io.StringIO(self._packed_text()))
+        return iter_messages(self.path, use_mmap=use_mmap)
+
+    def load(self, use_mmap: bool = False) -> Dict[str, Any]:
+        if self.pack:
+            return load_chat_text(self._packed_text())
+        return load_chat(self.path, use_mmap=use_mmap)
+
+    def __repr__(self) -> str:
+        return f"ChatThread({self.folder!r})"
+
+
+def iter_threads(root: str, layout: str = 'flat', date: Optional[str] = None) -> Iterator[ChatThread]:
+    """Yield threads of an exported archive from its catalog without opening any chat.yaml."""
+    from chat_catalog import abs_folder, open_catalog
+
+    cat = open_catalog(root, layout)
+    try:
+        if date:
+            rows = cat.execute('SELECT * FROM threads WHERE date = ? ORDER BY created_at', (date,)).fetchall()
+        else:
+            rows = cat.execute('SELECT * FROM threads ORDER BY created_at').fetchall()
+    finally:
+        cat.close()
+    for row in rows:
+        yield ChatThread(
+            root, abs_folder(root, row['folder']), row['cid'], row['created_at'], row['title20'],
+            row['pack'], row['pack_offset'],
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Print an exported chat.yaml (or only its header) as JSON.')
+    parser.add_argument('path', help='Path to chat.yaml')
+    parser.add_argument('--header-only', action='store_true', help='Read only the header fields')
+    parser.add_argument('--mmap', action='store_true', help='Use the mmap-backed parser')
+    args = parser.parse_args()
+
+    if args.header_only:
+        result: Any = read_header(args.path)
+    else:
+        result = load_chat(args.path, use_mmap=args.mmap)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+"""Read-only local HTTP service over an exported tree or state.vscdb.
+
+    GET /threads?date=YYYY-MM-DD&limit=N    thread listing (newest first without date)
+    GET /threads/<cid or prefix>            one thread with its messages
+    GET /search?q=TEXT&date=YYYY-MM-DD      title matches (and body matches on that date)
+    GET /metrics                            request latency and cache counters
+
+Listings and lookups go through the catalog (or the DB's key index), never
+a tree walk. Decoded threads are kept in a bounded LRU cache and checked
+before each use: against the chat.yaml (or pack) mtime and size for an
+exported tree, against PRAGMA data_version and then the thread watermark
+for the DB. All DB and file work runs on one worker thread, so the sources
+need no locking; the event loop only parses requests and writes responses.
+"""
+import argparse
+import asyncio
+import collections
+import json
+import os
+import sqlite3
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from chat_api import Thread, group_roles
+from chat_catalog import LAYOUTS, abs_folder, catalog_layout, find_thread, open_catalog, threads_for_date
+from chat_core import (
+    connect_db_readonly,
+    default_out_root,
+    derive_title20,
+    fetch_threads_for_date,
+    head_text,
+    valid_date,
+)
+from cursor_kv import fetch_heads, select_threads
+from redaction import Redactor, add_redaction_args, redact_head, redactor_from_args
+
+DEFAULT_PORT = 8765
+LATENCY_SAMPLES = 1024
+MAX_LIMIT = 1000
+
+
+class LRUCache:
+    """At most max_items values, each stored with the stamp it was valid for."""
+
+    def __init__(self, max_items: int) -> None:
+        self.max_items = max_items
+        self.items: 'collections.OrderedDict[str, Tuple[Any, Any]]' = collections.OrderedDict()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key: str, stamp: Any) -> Any:
+        entry = self.items.get(key)
+        if entry is None or entry[0] != stamp:
+            self.misses += 1
+            return None
+        self.items.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: str, stamp: Any, value: Any) -> None:
+        self.items[key] = (stamp, value)
+        self.items.move_to_end(key)
+        while len(self.items) > self.max_items:
+            self.items.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {'size': len(self.items), 'max': self.max_items, 'hits': self.hits,
+                'misses': self.misses, 'evictions': self.evictions}
+
+
+def _matches(thread: Dict[str, Any], needle: str) -> bool:
+    if needle in thread['title20'].lower():
+        return True
+    return any(needle in m['content'].lower() for m in thread['messages'])
+
+
+class ArchiveSource:
+    """Threads of an exported tree (@chat_history or Flow), located through its catalog."""
+
+    def __init__(self, root: str, layout: Optional[str], cache: LRUCache) -> None:
+        self.root = root
+        self.layout = layout
+        self.cache = cache
+        self.cat: Optional[sqlite3.Connection] = None
+
+    def _catalog(self) -> sqlite3.Connection:
+        if self.cat is None:
+            self.cat = open_catalog(self.root, self.layout or 'flat')
+        return self.cat
+
+    def describe(self) -> Dict[str, Any]:
+        return {'root': self.root, 'layout': catalog_layout(self._catalog())}
+
+    def list(self, date: Optional[str], limit: int) -> List[Dict[str, Any]]:
+        cat = self._catalog()
+        if date:
+            return threads_for_date(cat, date)[:limit]
+        return [dict(r) for r in cat.execute('SELECT * FROM threads ORDER BY created_at DESC LIMIT ?', (limit,))]
+
+    def _load(self, row: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if row['pack']:
+            path = os.path.join(self.root, row['pack'])
+        else:
+            path = os.path.join(abs_folder(self.root, row['folder']), 'chat.yaml')
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        stamp = (row['pack_offset'], st.st_mtime_ns, st.st_size)
+        thread = self.cache.get(row['folder'], stamp)
+        if thread is None:
+            # the parser is only needed once a thread is actually read
+            from chat_reader import load_chat, load_chat_text
+
+            if row['pack']:
+                from chat_pack import read_packed
+
+                thread = load_chat_text(read_packed(self.root, row['pack'], row['pack_offset']))
+            else:
+                thread = load_chat(path)
+            thread['folder'] = row['folder']
+            self.cache.put(row['folder'], stamp, thread)
+        return thread
+
+    def thread(self, cid: str) -> Optional[Dict[str, Any]]:
+        rows = find_thread(self._catalog(), cid)
+        return self._load(rows[-1]) if rows else None
+
+    def search(self, needle: str, date: Optional[str], limit: int) -> List[Dict[str, Any]]:
+        needle = needle.lower()
+        if date:
+            hits = []
+            for row in threads_for_date(self._catalog(), date):
+                thread = self._load(row)
+                if thread is not None and _matches(thread, needle):
+                    hits.append(row)
+            return hits[:limit]
+        rows = self._catalog().execute(
+            'SELECT * FROM threads WHERE instr(lower(title20), ?) > 0 ORDER BY created_at DESC LIMIT ?',
+            (needle, limit),
+        )
+        return [dict(r) for r in rows]
+
+
+class DBSource:
+    """Threads read straight from state.vscdb through chat_api."""
+
+    def __init__(self, db_path: str, cache: LRUCache, redactor: Optional[Redactor] = None) -> None:
+        self.db_path = db_path
+        self.cache = cache
+        self.redactor = redactor
+        self.conn: Optional[sqlite3.Connection] = None
+        self.data_version = 0
+        self.watermarks: Dict[str, Tuple[int, str]] = {}  # cid -> (data_version read at, watermark)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.conn is None:
+            self.conn = connect_db_readonly(self.db_path)
+        # changes whenever another connection (Cursor) commits to the file
+        self.data_version = self.conn.execute('PRAGMA data_version').fetchone()[0]
+        return self.conn
+
+    def _watermark(self, cid: str) -> str:
+        """Watermark of cid, read again only after the DB has changed."""
+        seen = self.watermarks.get(cid)
+        if seen is None or seen[0] != self.data_version:
+            seen = (self.data_version, fetch_heads(self.conn, [cid])[cid][1])
+            self.watermarks[cid] = seen
+        return seen[1]
+
+    def describe(self) -> Dict[str, Any]:
+        self._connect()
+        return {'db': self.db_path, 'data_version': self.data_version}
+
+    def list(self, date: Optional[str], limit: int) -> List[Dict[str, Any]]:
+        conn = self._connect()
+        if date:
+            rows = [(cid, ms) for cid, ms, _, _ in fetch_threads_for_date(conn, date)]
+        else:
+            rows = select_threads(conn, order_desc=True)
+        return [{'cid': cid, 'created_at': Thread(conn, cid, ms).created_dt} for cid, ms in rows[:limit]]
+
+    def _load(self, thread: Thread) -> Dict[str, Any]:
+        cid = thread.cid
+        if thread.watermark is not None:
+            self.watermarks[cid] = (self.data_version, thread.watermark)
+        watermark = self._watermark(cid)
+        data = self.cache.get(cid, watermark)
+        if data is not None:
+            return data
+        grouped = group_roles(thread.messages())
+        title20 = derive_title20(redact_head(self.redactor, head_text(grouped)))
+        if self.redactor is not None:
+            self.redactor.redact_thread(cid, grouped)
+        data = {
+            'threadId': cid,
+            'created_at': thread.created_dt,
+            'title20': title20,
+            'messages': [{'role': g['role'], 'content': '\n\n'.join(g['texts']).rstrip('\n')} for g in grouped],
+        }
+        self.cache.put(cid, watermark, data)
+        return data
+
+    def thread(self, cid: str) -> Optional[Dict[str, Any]]:
+        """Look up by full cid or by cid prefix (a key range on composerData:)."""
+        conn = self._connect()
+        hi = cid[:-1] + chr(ord(cid[-1]) + 1) if cid else '\uffff'
+        row = conn.execute(
+            "SELECT substr(key, length('composerData:')+1), json_extract(value,'$.createdAt') FROM cursorDiskKV "
+            "WHERE key >= ? AND key < ? AND json_extract(value,'$.createdAt') IS NOT NULL "
+            "ORDER BY key DESC LIMIT 1",
+            ('composerData:' + cid, 'composerData:' + hi),
+        ).fetchone()
+        return self._load(Thread(conn, row[0], row[1])) if row else None
+
+    def search(self, needle: str, date: Optional[str], limit: int) -> List[Dict[str, Any]]:
+        if not date:
+            raise ValueError('searching the DB needs a date')
+        needle = needle.lower()
+        conn = self._connect()
+        hits = []
+        for row in fetch_threads_for_date(conn, date):
+            data = self._load(Thread(conn, *row))
+            if _matches(data, needle):
+                hits.append({'cid': data['threadId'], 'created_at': data['created_at'], 'title20': data['title20']})
+        return hits[:limit]
+
+
+class Metrics:
+    """Request count, errors and latency percentiles per route (over the last LATENCY_SAMPLES requests)."""
+
+    def __init__(self) -> None:
+        self.routes: Dict[str, Dict[str, Any]] = {}
+
+    def record(self, route: str, ms: float, error: bool) -> None:
+        r = self.routes.setdefault(route, {'count': 0, 'errors': 0, 'samples': collections.deque(maxlen=LATENCY_SAMPLES)})
+        r['count'] += 1
+        r['errors'] += error
+        r['samples'].append(ms)
+
+    def summary(self) -> Dict[str, Any]:
+        out = {}
+        for route, r in sorted(self.routes.items()):
+            samples = sorted(r['samples'])
+            pick = lambda q: round(samples[min(len(samples) - 1, int(q * len(samples)))], 3)  # noqa: E731
+            out[route] = {'count': r['count'], 'errors': r['errors'],
+                          'p50_ms': pick(0.5), 'p95_ms': pick(0.95), 'max_ms': round(samples[-1], 3)}
+        return out
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+ROUTES = {'/threads': 'threads', '/search': 'search', '/metrics': 'metrics'}
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+
+def _query_args(query: Dict[str, List[str]]) -> Tuple[Optional[str], int]:
+    date = query.get('date', [None])[0]
+    try:
+        if date is not None:
+            valid_date(date)
+        limit = int(query.get('limit', ['100'])[0])
+    except (argparse.ArgumentTypeError, ValueError) as e:
+        raise HttpError(400, str(e))
+    return date, max(1, min(limit, MAX_LIMIT))
+
+
+class ChatService:
+    """Routes requests to a source on its worker thread and keeps the metrics."""
+
+    def __init__(self, source: Any) -> None:
+        self.source = source
+        self.metrics = Metrics()
+        self.pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='chat-serve')
+        self.started = time.time()
+
+    async def _run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self.pool, fn, *args)
+
+    async def route(self, name: str, path: str, query: Dict[str, List[str]]) -> Any:
+        """JSON body for a GET; raises HttpError."""
+        if name == 'threads':
+            date, limit = _query_args(query)
+            return await self._run(self.source.list, date, limit)
+        if name == 'thread':
+            cid = urllib.parse.unquote(path[len('/threads/'):])
+            thread = await self._run(self.source.thread, cid)
+            if thread is None:
+                raise HttpError(404, f'thread {cid!r} not found')
+            return thread
+        if name == 'search':
+            needle = query.get('q', [''])[0]
+            if not needle:
+                raise HttpError(400, 'q is required')
+            date, limit = _query_args(query)
+            try:
+                return await self._run(self.source.search, needle, date, limit)
+            except ValueError as e:
+                raise HttpError(400, str(e))
+        if name == 'metrics':
+            source = await self._run(self.source.describe)
+            return {'uptime_s': round(time.time() - self.started, 1), 'source': source,
+                    'cache': self.source.cache.stats(), 'routes': self.metrics.summary()}
+        raise HttpError(404, f'no route {path!r}')
+
+    async def respond(self, method: str, target: str) -> Tuple[int, bytes]:
+        t0 = time.perf_counter()
+        url = urllib.parse.urlsplit(target)
+        path = url.path.rstrip('/')
+        name = ROUTES.get(path) or ('thread' if path.startswith('/threads/') else 'other')
+        status = 200
+        try:
+            if method != 'GET':
+                raise HttpError(405, f'{method} not allowed')
+            body = await self.route(name, path, urllib.parse.parse_qs(url.query))
+        except HttpError as e:
+            status, body = e.status, {'error': str(e)}
+        except Exception as e:  # keep serving; the error goes to the client and the metrics
+            status, body = 500, {'error': f'{type(e).__name__}: {e}'}
+        self.metrics.record(name, (time.perf_counter() - t0) * 1000, status >= 500)
+        return status, json.dumps(body, ensure_ascii=False).encode('utf-8')
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """HTTP/1.1 with keep-alive; request bodies are not read (GET only)."""
+        try:
+            while True:
+                line = await reader.readline()
+                if not line.strip():
+                    break
+                parts = line.decode('latin-1').split()
+                if len(parts) != 3:
+                    break
+                method, target, version = parts
+                headers = {}
+                while True:
+                    h = await reader.readline()
+                    if h in (b'\r\n', b'\n', b''):
+                        break
+                    k, _, v = h.decode('latin-1').partition(':')
+                    headers[k.strip().lower()] = v.strip().lower()
+                keep = version == 'HTTP/1.1' and headers.get('connection') != 'close'
+                status, body = await self.respond(method, target)
+                writer.write(
+                    f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                    "Content-Type: application/json; charset=utf-8\r\n"
+                    f"Content-Length: {len(body)}\r\n"
+                    f"Connection: {'keep-alive' if keep else 'close'}\r\n\r\n".encode('latin-1') + body
+                )
+                await writer.drain()
+                if not keep:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host: str = '127.0.0.1', port: int = DEFAULT_PORT, unix: Optional[str] = None) -> asyncio.AbstractServer:
+        if unix:
+            return await asyncio.start_unix_server(self.handle, path=unix)
+        return await asyncio.start_server(self.handle, host, port)
+
+
+async def _serve(service: ChatService, args: argparse.Namespace) -> None:
+    server = await service.start(args.host, args.port, args.unix)
+    where = args.unix or '{}:{}'.format(*server.sockets[0].getsockname()[:2])
+    print(json.dumps({'listening': where, 'source': args.db or args.root}, ensure_ascii=False), flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Serve thread listings, threads and search from an exported tree or state.vscdb over local HTTP.')
+    parser.add_argument('--root', default=default_out_root(), help='Exported tree to serve (@chat_history or Flow)')
+    parser.add_argument('--layout', choices=LAYOUTS, default=None, help='Layout of a root that has no catalog yet (flow for Flow)')
+    parser.add_argument('--db', help='Serve this state.vscdb directly instead of an exported tree')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='TCP port (0 picks a free one)')
+    parser.add_argument('--unix', metavar='PATH', help='Listen on a Unix socket instead of TCP')
+    parser.add_argument('--cache-size', type=int, default=256, help='Decoded threads kept in the LRU cache')
+    add_redaction_args(parser)
+    args = parser.parse_args()
+    try:
+        redactor = redactor_from_args(args)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    if redactor is not None and not args.db:
+        parser.error('--redact applies to --db; exported trees are served as written')
+
+    cache = LRUCache(max(1, args.cache_size))
+    if args.db:
+        source: Any = DBSource(args.db, cache, redactor)
+    else:
+        source = ArchiveSource(args.root, args.layout, cache)
+    try:
+        asyncio.run(_serve(ChatService(source), args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
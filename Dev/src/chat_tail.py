@@ -0,0 +1,153 @@
+"""Append mode for threads that grow after they were exported.
+
+A full export records in the catalog the last header bubble id (tail_key),
+the id of the first bubble of the last role group (tail_from), a hash of
+the header ids up to tail_key (tail_hash) and the byte offset of that last
+group in chat.yaml (tail_offset). When the thread is exported again and its
+header list still starts with the same ids, only the bubbles from tail_from
+on are fetched and decoded, and chat.yaml is rewritten from tail_offset:
+the last group may have gained texts and new groups may follow. The bytes
+before tail_offset are only read back to hash the whole file.
+
+Anything else falls back to a full rewrite: a changed id prefix (edited or
+deleted messages), a chat.yaml whose size or mtime is not the one recorded,
+a title that would change, or different redaction rules. Edits to the text
+of bubbles before tail_from are not detected, as Cursor adds new bubbles
+rather than editing old ones.
+"""
+import hashlib
+import json
+import os
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from chat_api import Message, Thread
+from chat_catalog import TAIL_COLUMNS, abs_folder, disk_bytes, role_chars
+from chat_core import derive_title20, head_text, render_groups
+from redaction import Redactor, redact_head
+
+GROUP_MARK = '\n  - role: "'
+TAIL_VERSION = 1  # bump when render_groups changes: recorded tails then stop matching
+
+
+def tail_hash(bubble_ids: List[str], redactor: Optional[Redactor]) -> str:
+    h = hashlib.sha1(f'{TAIL_VERSION}\n'.encode('utf-8'))
+    if redactor is not None:
+        h.update(json.dumps(redactor.rules, sort_keys=True).encode('utf-8'))
+    h.update(b'\0')
+    h.update('\n'.join(bubble_ids).encode('utf-8'))
+    return h.hexdigest()
+
+
+def group_tail(messages: Iterable[Message]) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """group_roles() plus the bubble key each group starts at."""
+    grouped: List[Dict[str, Any]] = []
+    starts: List[str] = []
+    for m in messages:
+        if grouped and grouped[-1]['role'] == m.role:
+            grouped[-1]['texts'].append(m.text)
+        else:
+            grouped.append({'role': m.role, 'texts': [m.text]})
+            starts.append(m.key)
+    return grouped, starts
+
+
+def _bubble_id(cid: str, key: str) -> str:
+    return key[len('bubbleId:') + len(cid) + 1:]
+
+
+def tail_columns(
+    text: str, cid: str, bubble_ids: Optional[List[str]], starts: List[str], redactor: Optional[Redactor], base: int = 0
+) -> Dict[str, Any]:
+    """tail_* catalog columns for rendered chat.yaml text (which starts at byte base of the file)."""
+    ids = list(dict.fromkeys(bubble_ids or []))
+    pos = ('\n' + text).rfind(GROUP_MARK)  # = start of the last '  - role:' line in text
+    if not ids or not starts or pos < 0:
+        # range-scanned threads have no header ids to resume from
+        return dict.fromkeys(TAIL_COLUMNS)
+    return {
+        'tail_key': ids[-1],
+        'tail_from': _bubble_id(cid, starts[-1]),
+        'tail_hash': tail_hash(ids, redactor),
+        'tail_offset': base + len(disk_bytes(text[:pos])),
+    }
+
+
+def append_thread(
+    root: str, row: Dict[str, Any], thread: Thread, redactor: Optional[Redactor] = None
+) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    """Bring the chat.yaml of catalog row up to date by rewriting its tail.
+
+    Returns (new catalog row, {'written': bytes, 'redactions': counts}), or
+    None when the thread has to be rewritten in full. The caller holds the
+    date lock of row['date'].
+    """
+    if row['pack'] or not row['tail_hash'] or row['tail_offset'] is None:
+        return None
+    ids = list(dict.fromkeys(thread.bubble_ids or []))
+    try:
+        n = ids.index(row['tail_key']) + 1
+        start = ids.index(row['tail_from'])
+    except ValueError:
+        return None
+    if start >= n or tail_hash(ids[:n], redactor) != row['tail_hash']:
+        return None
+    path = os.path.join(abs_folder(root, row['folder']), 'chat.yaml')
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    if (st.st_size, st.st_mtime_ns) != (row['bytes'], row['mtime_ns']):
+        return None
+    if row['watermark'] == thread.watermark and n == len(ids):
+        return dict(row), {'written': 0, 'redactions': {}}
+
+    tail = Thread(thread.conn, thread.cid, thread.created_ms, ids[start:], thread.watermark)
+    grouped, starts = group_tail(tail.messages())
+    thread.read_bytes += tail.read_bytes
+    if not starts or starts[0] != f'bubbleId:{thread.cid}:{row["tail_from"]}':
+        # the old last group no longer starts where it did
+        return None
+    if row['messages'] == 1 and derive_title20(redact_head(redactor, head_text(grouped))) != row['title20']:
+        # the last group is also the first and the title comes from it
+        return None
+    counts = redactor.redact_thread(thread.cid, grouped) if redactor is not None else {}
+    text = render_groups(grouped)
+    data = disk_bytes(text)
+    with open(path, 'r+b') as f:
+        f.seek(row['tail_offset'])
+        if f.read(len(GROUP_MARK) - 1) != GROUP_MARK[1:].encode('utf-8'):
+            return None
+        # the kept prefix is read (not decoded) once to keep sha256 exact for the feed and verify
+        h = hashlib.sha256()
+        f.seek(0)
+        left = row['tail_offset']
+        while left:
+            chunk = f.read(min(left, 1 << 20))
+            h.update(chunk)
+            left -= len(chunk)
+        h.update(data)
+        f.write(data)
+        f.truncate()
+    role = grouped[0]['role']  # the old last group's role
+    new = dict(row)
+    new.update({
+        'messages': row['messages'] - 1 + len(grouped),
+        'user_messages': row['user_messages'] - (role == 'user') + sum(1 for g in grouped if g['role'] == 'user'),
+        'assistant_messages': (row['assistant_messages'] - (role == 'assistant')
+                               + sum(1 for g in grouped if g['role'] == 'assistant')),
+        'bytes': row['tail_offset'] + len(data),
+        'sha256': h.hexdigest(),
+        'mtime_ns': os.stat(path).st_mtime_ns,
+        'watermark': thread.watermark,
+    })
+    if row['last_chars'] is not None:
+        # the old last group is rewritten as grouped[0]
+        chars = role_chars(grouped)
+        new.update({
+            'user_chars': row['user_chars'] - (role == 'user') * row['last_chars'] + chars['user_chars'],
+            'assistant_chars': (row['assistant_chars'] - (role == 'assistant') * row['last_chars']
+                                + chars['assistant_chars']),
+            'last_chars': chars['last_chars'],
+        })
+    new.update(tail_columns(text, thread.cid, ids, starts, redactor, base=row['tail_offset']))
+    return new, {'written': len(data), 'redactions': counts}
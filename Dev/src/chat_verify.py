@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""Check an output tree (@chat_history or Flow) against state.vscdb without re-exporting it.
+
+Each cataloged thread stores the watermark of its source row and the size,
+mtime and SHA-256 of its chat.yaml. Only files whose size or mtime differ
+from the catalog are hashed; rows written before watermarks existed are
+compared against a render from the DB instead.
+"""
+import argparse
+import datetime
+import json
+import os
+import shutil
+import sqlite3
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from chat_api import Thread, group_roles
+from chat_catalog import (
+    LAYOUTS,
+    abs_folder,
+    catalog_layout,
+    content_digest,
+    file_digest,
+    forget_folder,
+    open_catalog,
+    read_chat_summary,
+    rel_folder,
+)
+from chat_core import (
+    connect_db_readonly,
+    default_db_path,
+    default_out_root,
+    derive_title20,
+    head_text,
+    render_yaml,
+)
+from chat_layout import iter_thread_folders, prune_empty_dirs
+from cursor_kv import WATERMARK_SQL, fetch_heads
+from file_lock import date_lock, root_lock
+from redaction import Redactor, add_redaction_args, redact_head, redactor_from_args
+
+PROBLEMS = ('missing', 'stale', 'orphaned', 'corrupted')
+# problems --repair fixes; orphans are only reported
+DAMAGE = ('missing', 'stale', 'corrupted')
+REPAIR_MANIFEST = '.verify_repair.json'
+# uncataloged DB threads found untitled (never exported), by watermark
+UNTITLED_SCHEMA = 'CREATE TABLE IF NOT EXISTS verify_untitled (cid TEXT PRIMARY KEY, watermark TEXT)'
+
+
+def db_threads(conn: sqlite3.Connection) -> Dict[str, Tuple[int, str]]:
+    """{cid: (createdAt, watermark)} of every thread in the DB (one key-range scan)."""
+    cur = conn.cursor()
+    cur.execute(
+        f"""
+        SELECT substr(key, length('composerData:')+1), json_extract(value,'$.createdAt'), {WATERMARK_SQL}
+        FROM cursorDiskKV
+        WHERE key >= 'composerData:' AND key < 'composerData;'
+          AND json_extract(value,'$.createdAt') IS NOT NULL
+        """
+    )
+    return {cid: (int(created), watermark) for cid, created, watermark in cur.fetchall()}
+
+
+def local_date(created_ms: int) -> str:
+    return datetime.datetime.fromtimestamp(created_ms / 1000).strftime('%Y-%m-%d')
+
+
+def _stat_dir(folders: List[str]) -> List[Tuple[str, Optional[Tuple[int, int]]]]:
+    out = []
+    for folder in folders:
+        try:
+            st = os.stat(os.path.join(folder, 'chat.yaml'))
+            out.append((folder, (st.st_size, st.st_mtime_ns)))
+        except OSError:
+            out.append((folder, None))
+    return out
+
+
+def scan_tree(root: str, layout: str, pool: ThreadPoolExecutor) -> Dict[str, Optional[Tuple[int, int]]]:
+    """{relative folder: (size, mtime_ns) of chat.yaml or None}, stat'ed one directory per task."""
+    by_dir: Dict[str, List[str]] = {}
+    for _, folder in iter_thread_folders(root, layout):
+        if os.path.isdir(folder):
+            by_dir.setdefault(os.path.dirname(folder), []).append(folder)
+    return {
+        rel_folder(root, folder): st
+        for stats in pool.map(_stat_dir, by_dir.values())
+        for folder, st in stats
+    }
+
+
+def expected_digest(
+    conn: sqlite3.Connection, cid: str, created_ms: int, bubble_ids: List[str], redactor: Optional[Redactor]
+) -> Optional[Tuple[int, str]]:
+    """Size and SHA-256 an export of the thread would have now (None when it would be skipped)."""
+    thread = Thread(conn, cid, created_ms, bubble_ids)
+    grouped = group_roles(thread.messages())
+    title20 = derive_title20(redact_head(redactor, head_text(grouped)))
+    if title20 == 'untitled':
+        return None
+    if redactor is not None:
+        for g in grouped:
+            g['texts'] = [redactor.redact(t) for t in g['texts']]
+    return content_digest(render_yaml(cid, thread.created_dt, title20, grouped))
+
+
+def verify(
+    conn: sqlite3.Connection,
+    root: str,
+    layout: Optional[str] = None,
+    workers: int = 8,
+    full: bool = False,
+    redactor: Optional[Redactor] = None,
+) -> Dict[str, Any]:
+    """Report missing, stale, orphaned and corrupted threads of root.
+
+    Flow trees hold only some dates, so threads count as missing there only
+    for dates the tree already has.
+    """
+    cat = open_catalog(root, layout or 'flat')
+    layout = catalog_layout(cat)
+    report: Dict[str, Any] = {'root': root, 'layout': layout}
+    for name in PROBLEMS:
+        report[name] = []
+
+    def problem(kind: str, cid: str, folder: Optional[str], date: str, reason: str) -> None:
+        report[kind].append({'cid': cid, 'folder': folder, 'date': date, 'reason': reason})
+
+    db = db_threads(conn)
+    rows = {r['folder']: dict(r) for r in cat.execute('SELECT * FROM threads')}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        on_disk = scan_tree(root, layout, pool)
+
+        present = set()
+        to_hash: List[Dict[str, Any]] = []
+        legacy: List[Dict[str, Any]] = []
+        packs: Dict[str, bool] = {}
+        for rel, row in rows.items():
+            cid = row['cid']
+            st = on_disk.pop(rel, None)
+            if row['pack']:
+                # month packs (chat_pack.py) are not hashed; a missing pack is missing threads
+                if row['pack'] not in packs:
+                    packs[row['pack']] = os.path.isfile(os.path.join(root, row['pack']))
+                if not packs[row['pack']]:
+                    problem('missing', cid, rel, row['date'], f"pack {row['pack']} not on disk")
+                    continue
+                st = (row['bytes'], row['mtime_ns'])
+            if st is None:
+                if cid in db:
+                    problem('missing', cid, rel, row['date'], 'chat.yaml not on disk')
+                else:
+                    problem('orphaned', cid, rel, row['date'], 'catalog row without folder')
+                continue
+            present.add(cid)
+            if cid not in db:
+                problem('orphaned', cid, rel, row['date'], 'thread not in DB')
+                continue
+            if st[0] != row['bytes']:
+                problem('corrupted', cid, rel, row['date'], f"size {st[0]} != {row['bytes']}")
+                continue
+            if (full and not row['pack']) or st[1] != row['mtime_ns']:
+                to_hash.append(row)
+            if row['watermark'] is None:
+                legacy.append(row)
+            elif row['watermark'] != db[cid][1]:
+                problem('stale', cid, rel, row['date'], f"watermark {row['watermark']} != {db[cid][1]}")
+
+        for rel in sorted(on_disk):
+            p = os.path.join(abs_folder(root, rel), 'chat.yaml')
+            cid = read_chat_summary(p).get('threadId', '') if on_disk[rel] else ''
+            if cid in db:
+                present.add(cid)  # exported, just not cataloged: not missing
+            problem('orphaned', cid, rel, os.path.basename(rel)[:10], 'folder not in catalog')
+
+        # suspicious files only, hashed in parallel
+        paths = [os.path.join(abs_folder(root, row['folder']), 'chat.yaml') for row in to_hash]
+        corrupted = set()
+        refreshed = []
+        unhashed = []
+        for row, path, (_, sha) in zip(to_hash, paths, pool.map(file_digest, paths)):
+            if not row['sha256']:
+                unhashed.append((row, path, sha))
+            elif sha != row['sha256']:
+                corrupted.add(row['folder'])
+                problem('corrupted', row['cid'], row['folder'], row['date'], 'content hash differs')
+            else:
+                refreshed.append((sha, os.stat(path).st_mtime_ns, row['folder']))
+    # appended in place by older versions (chat_tail.py): no full hash was recorded, compare with the DB
+    heads = fetch_heads(conn, [row['cid'] for row, _, _ in unhashed])
+    for row, path, sha in unhashed:
+        if row['watermark'] != db[row['cid']][1]:
+            continue  # already reported stale
+        expected = expected_digest(conn, row['cid'], db[row['cid']][0], heads[row['cid']][0], redactor)
+        if expected is None or expected[1] != sha:
+            problem('stale', row['cid'], row['folder'], row['date'], 'content differs from DB')
+        else:
+            refreshed.append((sha, os.stat(path).st_mtime_ns, row['folder']))
+    if refreshed:
+        # touched but intact: remember the hash and new mtime so the next run skips them
+        with cat:
+            cat.executemany('UPDATE threads SET sha256 = ?, mtime_ns = ? WHERE folder = ?', refreshed)
+
+    # rows without a watermark and uncataloged DB threads need their bubbles,
+    # except threads that were untitled at the same watermark last time
+    cat.execute(UNTITLED_SCHEMA)
+    untitled = dict(cat.execute('SELECT cid, watermark FROM verify_untitled'))
+    dates = {row['date'] for row in rows.values()}
+    candidates = [
+        cid for cid, (created_ms, watermark) in db.items()
+        if cid not in present and (cid not in untitled or untitled[cid] != watermark)
+        and (layout != 'flow' or local_date(created_ms) in dates)
+    ]
+    legacy = [row for row in legacy if row['folder'] not in corrupted]
+    heads = fetch_heads(conn, candidates + [row['cid'] for row in legacy])
+    for row in legacy:
+        expected = expected_digest(conn, row['cid'], db[row['cid']][0], heads[row['cid']][0], redactor)
+        if expected is None or expected[1] != row['sha256']:
+            problem('stale', row['cid'], row['folder'], row['date'], 'content differs from DB')
+    reported = {e['cid'] for e in report['missing']}
+    verdicts = []
+    for cid in candidates:
+        if cid in reported:
+            continue
+        created_ms = db[cid][0]
+        if expected_digest(conn, cid, created_ms, heads[cid][0], redactor) is not None:
+            problem('missing', cid, None, local_date(created_ms), 'not exported')
+        else:
+            verdicts.append((cid, db[cid][1]))
+    with cat:
+        cat.executemany('INSERT OR REPLACE INTO verify_untitled VALUES (?, ?)', verdicts)
+        cat.executemany('DELETE FROM verify_untitled WHERE cid = ?', [(c,) for c in untitled if c not in db])
+    cat.close()
+
+    report['db_threads'] = len(db)
+    report['folders'] = len(rows) + sum(1 for e in report['orphaned'] if e['reason'] == 'folder not in catalog')
+    report['hashed'] = len(to_hash)
+    report['ok'] = not any(report[name] for name in PROBLEMS)
+    return report
+
+
+def repair(
+    conn: sqlite3.Connection, root: str, report: Dict[str, Any], redactor: Optional[Redactor] = None
+) -> Dict[str, Any]:
+    """Re-export the missing, stale and corrupted threads of a verify report.
+
+    Orphaned folders are left alone (the archive may be the only copy); only
+    catalog rows whose folder is gone are dropped.
+    """
+    broken = report['missing'] + report['stale'] + report['corrupted']
+    cat = open_catalog(root)
+    layout = catalog_layout(cat)
+    for e in report['orphaned']:
+        if e['reason'] == 'catalog row without folder':
+            forget_folder(cat, e['folder'])
+    if layout == 'flow':
+        cat.close()
+        from update_latest_chat_per_date import rebuild_date
+
+        # Flow dates are always rebuilt as a whole
+        dates = sorted({e['date'] for e in broken})
+        for date in dates:
+            rebuild_date(conn, root, date, redactor=redactor)
+        return {'threads': len(broken), 'dates': dates}
+
+    from export_cursor_history import ensure_manifest, export_batch
+
+    # the catalog rows stay until the re-export, which then records the
+    # threads as updated (or renamed) in the change feed
+    for e in broken:
+        if e['folder']:
+            with root_lock(root), date_lock(root, e['date']):
+                shutil.rmtree(abs_folder(root, e['folder']), ignore_errors=True)
+    cat.close()
+    cids = sorted({e['cid'] for e in broken})
+    if not cids:
+        return {'threads': 0, 'reexported': 0, 'skipped': 0}
+    manifest_path = os.path.join(root, REPAIR_MANIFEST)
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+    ensure_manifest(manifest_path, conn, order_desc=False, filters={'cids': cids})
+    done, skipped = export_batch(conn, root, manifest_path, 0, len(cids), redactor=redactor, append=False)
+    os.remove(manifest_path)
+    # rows whose folder was not written again (renamed or now untitled)
+    cat = open_catalog(root)
+    for e in broken:
+        folder = abs_folder(root, e['folder']) if e['folder'] else None
+        if folder and not os.path.isdir(folder):
+            with root_lock(root), date_lock(root, e['date']):
+                forget_folder(cat, e['folder'])
+                prune_empty_dirs(root, os.path.dirname(folder))
+    cat.close()
+    return {'threads': len(cids), 'reexported': done, 'skipped': skipped}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Verify an exported tree against state.vscdb (fsck) and optionally repair it.')
+    parser.add_argument('--db', default=default_db_path(), help='Path to Cursor state.vscdb')
+    parser.add_argument('--root', default=default_out_root(), help='Output root to check (@chat_history or Flow)')
+    parser.add_argument('--layout', choices=LAYOUTS, default=None, help='Layout of a root that has no catalog yet (flow for Flow)')
+    parser.add_argument('--workers', type=int, default=min(8, os.cpu_count() or 1), help='Threads for stat and hashing')
+    parser.add_argument('--full', action='store_true', help='Hash every chat.yaml, not only those whose size or mtime changed')
+    parser.add_argument('--repair', action='store_true', help='Re-export missing, stale and corrupted threads (orphans are only reported)')
+    add_redaction_args(parser)
+    args = parser.parse_args()
+    try:
+        redactor = redactor_from_args(args)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
+    conn = connect_db_readonly(args.db)
+    report = verify(conn, args.root, layout=args.layout, workers=args.workers, full=args.full, redactor=redactor)
+    if args.repair and not report['ok']:
+        report['repair'] = repair(conn, args.root, report, redactor=redactor)
+        after = verify(conn, args.root, workers=args.workers, redactor=redactor)
+        report['remaining'] = {name: len(after[name]) for name in PROBLEMS}
+        damaged = any(report['remaining'][name] for name in DAMAGE)
+    else:
+        damaged = any(report[name] for name in DAMAGE)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    sys.exit(1 if damaged else 0)
+
+
+if __name__ == '__main__':
+    main()
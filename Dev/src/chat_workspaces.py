@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""Discover the per-project state.vscdb files under workspaceStorage and export their threads.
+
+Cursor keeps one workspaceStorage/<hash>/state.vscdb per opened folder next
+to globalStorage/state.vscdb. Its ItemTable lists the composer threads of
+that workspace (their messages live in the global DB); some builds also keep
+whole threads in the workspace DB's own cursorDiskKV.
+
+A run stats every workspace DB (and its -wal) and compares size and mtime
+with <out>/.workspaces.json, so unchanged databases cost one stat each.
+Changed ones are probed (two key lookups) and exported concurrently by a
+bounded pool; each thread is attributed to its workspace folder in the
+catalog (chat_catalog.py find shows it).
+"""
+import argparse
+import json
+import os
+import sqlite3
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from chat_catalog import open_catalog, record_workspace
+from chat_core import connect_db_readonly, default_db_path, default_out_root
+from chat_feed import new_run_id
+from cursor_kv import COMPOSER_LO, COMPOSER_HI, composer_ids
+from redaction import Redactor, add_redaction_args, redactor_from_args
+
+STATE_NAME = '.workspaces.json'
+COMPOSER_LIST_KEY = 'composer.composerData'
+
+
+def default_storage_root() -> str:
+    return os.path.join(os.path.dirname(os.path.dirname(default_db_path())), 'workspaceStorage')
+
+
+def uri_to_path(uri: str) -> str:
+    """Local path of a file:// URI from workspace.json (other schemes are returned as they are)."""
+    parsed = urllib.parse.urlparse(uri)
+    if parsed.scheme != 'file':
+        return uri
+    path = urllib.parse.unquote(parsed.path)
+    if len(path) > 2 and path[0] == '/' and path[2] == ':':
+        path = path[1:]  # /c:/Users/... on Windows
+    return path
+
+
+def db_signature(db: str) -> Optional[List[int]]:
+    """[size, mtime_ns] of the DB and its WAL ([..., 0, 0] without one); None if the DB is gone."""
+    sig = []
+    for p in (db, db + '-wal'):
+        try:
+            st = os.stat(p)
+        except OSError:
+            if p == db:
+                return None
+            sig += [0, 0]
+            continue
+        sig += [st.st_size, st.st_mtime_ns]
+    return sig
+
+
+def discover(storage: str) -> List[Dict[str, Any]]:
+    """Every workspaceStorage/<hash>/state.vscdb with its signature and project folder."""
+    found = []
+    try:
+        entries = list(os.scandir(storage))
+    except OSError:
+        return found
+    for e in sorted(entries, key=lambda e: e.name):
+        if not e.is_dir():
+            continue
+        db = os.path.join(e.path, 'state.vscdb')
+        sig = db_signature(db)
+        if sig is None:
+            continue
+        found.append({'workspace': e.name, 'db': db, 'sig': sig, 'folder': workspace_folder(e.path)})
+    return found
+
+
+def workspace_folder(path: str) -> Optional[str]:
+    try:
+        with open(os.path.join(path, 'workspace.json'), 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    uri = data.get('folder') or data.get('workspace') if isinstance(data, dict) else None
+    return uri_to_path(uri) if isinstance(uri, str) else None
+
+
+def probe(db: str) -> Tuple[List[str], List[str]]:
+    """(thread ids listed for the workspace, thread ids stored in the workspace DB itself)."""
+    conn = connect_db_readonly(db)
+    try:
+        tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        listed: List[str] = []
+        if 'ItemTable' in tables:
+            row = conn.execute('SELECT value FROM ItemTable WHERE key = ?', (COMPOSER_LIST_KEY,)).fetchone()
+            try:
+                data = json.loads(row[0]) if row and row[0] else {}
+            except ValueError:
+                data = {}
+            for c in (data.get('allComposers') or []) if isinstance(data, dict) else []:
+                if isinstance(c, dict) and isinstance(c.get('composerId'), str):
+                    listed.append(c['composerId'])
+        local: List[str] = []
+        if 'cursorDiskKV' in tables:
+            has = conn.execute(
+                'SELECT 1 FROM cursorDiskKV WHERE key >= ? AND key < ? LIMIT 1', (COMPOSER_LO, COMPOSER_HI)
+            ).fetchone()
+            if has:
+                local = composer_ids(conn)
+        return listed, local
+    finally:
+        conn.close()
+
+
+def export_threads(
+    db: str,
+    out_root: str,
+    workspace: str,
+    source: str,
+    cids: Optional[List[str]],
+    redactor: Optional[Redactor],
+    run_id: str,
+) -> Tuple[int, int]:
+    """Export the given threads of db (all when cids is None) through a checkpoint of their own."""
+    from export_cursor_history import ensure_manifest, export_batch, manifest_path_for
+
+    manifest_path = manifest_path_for(out_root, {'workspace': workspace, 'source': source})
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)  # the workspace changed: list its threads again
+    conn = connect_db_readonly(db)
+    try:
+        manifest = ensure_manifest(manifest_path, conn, order_desc=False, filters={'cids': cids} if cids else None)
+        result = export_batch(conn, out_root, manifest_path, 0, len(manifest['items']),
+                              redactor=redactor, throttle=0, run_id=run_id)
+    finally:
+        conn.close()
+    # every run lists the workspace's threads again, so a finished checkpoint is of no use
+    os.remove(manifest_path)
+    return result
+
+
+def export_workspaces(
+    storage: str,
+    global_db: str,
+    out_root: str,
+    workers: int = 4,
+    force: bool = False,
+    redactor: Optional[Redactor] = None,
+) -> Dict[str, Any]:
+    from export_cursor_history import atomic_write_json, load_manifest
+
+    started = time.monotonic()
+    os.makedirs(out_root, exist_ok=True)
+    state_path = os.path.join(out_root, STATE_NAME)
+    state = load_manifest(state_path)
+    found = discover(storage)
+    changed = [w for w in found if force or state.get(w['workspace'], {}).get('sig') != w['sig']]
+    run_id = new_run_id()
+
+    def try_probe(w: Dict[str, Any]) -> Any:
+        try:
+            return probe(w['db'])
+        except (sqlite3.Error, OSError) as e:
+            return e
+
+    def job_redactor() -> Optional[Redactor]:
+        # workers must not share one Redactor: its counters are plain dicts
+        return None if redactor is None else Redactor(redactor.rules)
+
+    failed: Dict[str, str] = {}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        probes = list(pool.map(try_probe, changed))
+        # a thread listed by several workspaces is exported (and attributed) once
+        seen: set = set()
+        jobs = []
+        for w, probed in zip(changed, probes):
+            if isinstance(probed, Exception):  # one unreadable DB must not stop the others
+                failed[w['workspace']] = f'{type(probed).__name__}: {probed}'
+                w['listed'], w['local'] = [], []
+                continue
+            listed, local = probed
+            w['listed'] = [c for c in dict.fromkeys(listed) if c not in seen]
+            w['local'] = local
+            seen.update(w['listed'])
+            # each job opens its own connections; export_batch locks the dates it writes
+            if w['listed']:
+                r = job_redactor()
+                jobs.append((w, r, pool.submit(export_threads, global_db, out_root, w['workspace'], 'global',
+                                               w['listed'], r, run_id)))
+            if w['local']:
+                r = job_redactor()
+                jobs.append((w, r, pool.submit(export_threads, w['db'], out_root, w['workspace'], 'local',
+                                               None, r, run_id)))
+        done = skipped = 0
+        for w, r, fut in jobs:
+            try:
+                d, s = fut.result()
+            except Exception as e:  # one unreadable DB must not stop the others
+                failed[w['workspace']] = f'{type(e).__name__}: {e}'
+                continue
+            finally:
+                if r is not None:
+                    redactor.merge(r)
+            done += d
+            skipped += s
+
+    catalog = open_catalog(out_root)
+    for w in changed:
+        if w['workspace'] in failed:
+            continue
+        record_workspace(catalog, w['workspace'], w['folder'], 'global', w['listed'])
+        record_workspace(catalog, w['workspace'], w['folder'], 'local', w['local'])
+        state[w['workspace']] = {'sig': w['sig'], 'folder': w['folder'],
+                                 'listed': len(w['listed']), 'local': len(w['local'])}
+    catalog.close()
+    for gone in set(state) - {w['workspace'] for w in found}:
+        del state[gone]
+    atomic_write_json(state_path, state)
+    summary = {
+        'workspaces': len(found),
+        'unchanged': len(found) - len(changed),
+        'probed': len(changed),
+        'with_threads': sum(1 for w in changed if w['listed'] or w['local']),
+        'processed': done,
+        'skipped': skipped,
+        'failed': failed,
+        'run': run_id,
+        'elapsed_s': round(time.monotonic() - started, 2),
+    }
+    if redactor is not None:
+        summary['redactions'] = redactor.summary()
+    return summary
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Export the threads of every changed workspaceStorage/*/state.vscdb, attributed to its project folder.')
+    parser.add_argument('--storage', default=default_storage_root(), help='workspaceStorage directory')
+    parser.add_argument('--db', default=default_db_path(), help='Global state.vscdb holding the messages of listed threads')
+    parser.add_argument('--out', default=default_out_root())
+    parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1), help='Databases probed and exported at a time')
+    parser.add_argument('--force', action='store_true', help='Probe every workspace DB, also those unchanged since the last run')
+    add_redaction_args(parser)
+    args = parser.parse_args()
+    try:
+        redactor = redactor_from_args(args)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    summary = export_workspaces(args.storage, args.db, args.out, workers=args.workers, force=args.force, redactor=redactor)
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
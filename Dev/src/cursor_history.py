@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""cursor-history: one entry point for the export and maintenance scripts.
+
+    python cursor_history.py <command> [options]     (options: <command> --help)
+
+Subcommand modules are imported only when selected so that frequent hook
+calls pay for nothing but the command they run.
+"""
+import os
+import sys
+from typing import List, Optional
+
+COMMANDS = {
+    # name: (module, summary)
+    'export': ('export_cursor_history', 'Export all threads to @chat_history in resumable batches'),
+    'update-date': ('update_latest_chat_per_date', 'Rebuild one date under Flow/YYYYMM/YYYY-MM-DD/chats'),
+    'update-dates': ('update_latest_chats_for_dates', 'Rebuild several dates under Flow in one process'),
+    'update-standalone': ('update_standalone_chat_per_date', 'Rebuild one date under @chat_history'),
+    'organize': ('move_and_organize_chats', 'Move exported folders into Flow and organize chats/'),
+    'catalog': ('chat_catalog', 'Query, rebuild or migrate chat_catalog.sqlite'),
+    'read': ('chat_reader', 'Print exported chat.yaml files as JSON'),
+    'verify': ('chat_verify', 'Check an exported tree against the DB and optionally repair it'),
+    'pack': ('chat_pack', 'Pack closed Flow months into YYYYMM.zip or read threads from them'),
+    'serve': ('chat_serve', 'Serve threads, listings and search from a tree or the DB over local HTTP'),
+    'inspect': ('chat_inspect', 'Profile key families, value sizes and the largest threads in state.vscdb'),
+    'feed': ('chat_feed', 'Print the changes recorded in changes.ndjson after a byte offset'),
+    'workspaces': ('chat_workspaces', 'Export the threads of changed workspaceStorage DBs, attributed to their folders'),
+    'analytics': ('chat_analytics', 'Threads and messages per day or week and thread-size percentiles'),
+    'mirror': ('chat_mirror', 'Sync the chat rows of state.vscdb into a slim local mirror usable as --db'),
+}
+
+
+def usage() -> str:
+    width = max(len(name) for name in COMMANDS)
+    lines = ['usage: cursor-history <command> [options]', '', 'commands:']
+    lines += [f'  {name.ljust(width)}  {summary}' for name, (_, summary) in COMMANDS.items()]
+    lines += ['', "Run 'cursor-history <command> --help' for the options of a command."]
+    return '\n'.join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ('-h', '--help'):
+        print(usage())
+        sys.exit(0 if argv else 2)
+    command = COMMANDS.get(argv[0])
+    if command is None:
+        sys.stderr.write(f"cursor-history: unknown command {argv[0]!r}\n\n{usage()}\n")
+        sys.exit(2)
+    # the scripts import their siblings by name
+    here = os.path.dirname(os.path.abspath(__file__))
+    if here not in sys.path:
+        sys.path.insert(0, here)
+    # plain __import__ (not importlib) so -X importtime reports the module
+    module = __import__(command[0])
+    sys.argv = [f'cursor-history {argv[0]}'] + list(argv[1:])
+    module.main()
+
+
+if __name__ == '__main__':
+    main()
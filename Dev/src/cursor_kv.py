@@ -0,0 +1,214 @@
+import json
+import sqlite3
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+SQL_VAR_CHUNK = 500
+COMPOSER_LO, COMPOSER_HI = 'composerData:', 'composerData;'
+
+# Bubble ids of a conversation in display order. Current Cursor builds keep
+# them in fullConversationHeadersOnly; older ones in conversation.
+HEADERS_SQL = (
+    "COALESCE(json_extract(value,'$.fullConversationHeadersOnly'),"
+    " json_extract(value,'$.conversation'))"
+)
+
+# Cheap per-thread change marker stored with each exported thread: last
+# update time (creation time on builds without it) and header count.
+WATERMARK_SQL = (
+    "COALESCE(json_extract(value,'$.lastUpdatedAt'), json_extract(value,'$.createdAt'), '')"
+    " || ':' || COALESCE(json_array_length(value,'$.fullConversationHeadersOnly'),"
+    " json_array_length(value,'$.conversation'), 0)"
+)
+
+
+def header_bubble_ids(headers: Optional[str]) -> List[str]:
+    """Bubble ids from the header array stored in composerData (JSON text)."""
+    if not headers:
+        return []
+    try:
+        items = json.loads(headers)
+    except ValueError:
+        return []
+    if not isinstance(items, list):
+        return []
+    return [h['bubbleId'] for h in items if isinstance(h, dict) and isinstance(h.get('bubbleId'), str)]
+
+
+def fetch_heads(conn: sqlite3.Connection, cids: List[str]) -> Dict[str, Tuple[List[str], str]]:
+    """(header bubble ids, watermark) for many threads at once (([], '') when a thread is gone)."""
+    keys = ['composerData:' + cid for cid in dict.fromkeys(cids)]
+    out: Dict[str, Tuple[List[str], str]] = {cid: ([], '') for cid in cids}
+    cur = conn.cursor()
+    for i in range(0, len(keys), SQL_VAR_CHUNK):
+        chunk = keys[i:i + SQL_VAR_CHUNK]
+        cur.execute(
+            f"SELECT substr(key, length('composerData:')+1), {HEADERS_SQL}, {WATERMARK_SQL} "
+            f"FROM cursorDiskKV WHERE key IN ({','.join('?' * len(chunk))})",
+            chunk,
+        )
+        for cid, headers, watermark in cur.fetchall():
+            out[cid] = (header_bubble_ids(headers), watermark)
+    return out
+
+
+def fetch_header_ids(conn: sqlite3.Connection, cids: List[str]) -> Dict[str, List[str]]:
+    """Header bubble ids for many threads at once ([] when a thread has none)."""
+    return {cid: ids for cid, (ids, _) in fetch_heads(conn, cids).items()}
+
+
+def _raw(value: Any) -> Any:
+    return value
+
+
+def iter_bubbles_by_ids(
+    conn: sqlite3.Connection, cid: str, bubble_ids: List[str], decode: Callable[[Any], Any] = _raw
+) -> Iterator[Tuple[str, Any]]:
+    """Primary-key point lookups in chunks, yielded in the order of bubble_ids.
+
+    A chunk is only queried once the previous one has been consumed. Rows
+    arrive in key order, so a chunk is buffered for reordering: pass decode
+    to keep decode(value) instead of the raw JSON while it waits.
+    """
+    keys = [f"bubbleId:{cid}:{b}" for b in dict.fromkeys(bubble_ids)]
+    cur = conn.cursor()
+    for i in range(0, len(keys), SQL_VAR_CHUNK):
+        chunk = keys[i:i + SQL_VAR_CHUNK]
+        cur.execute(f"SELECT key, value FROM cursorDiskKV WHERE key IN ({','.join('?' * len(chunk))})", chunk)
+        found = {k: decode(v) for k, v in cur}
+        for k in chunk:
+            if k in found:
+                yield k, found.pop(k)
+
+
+def fetch_bubbles_by_ids(conn: sqlite3.Connection, cid: str, bubble_ids: List[str]) -> List[Tuple[str, Any]]:
+    """Primary-key point lookups in chunks, returned in the order of bubble_ids."""
+    return list(iter_bubbles_by_ids(conn, cid, bubble_ids))
+
+
+def iter_scan_bubbles(conn: sqlite3.Connection, cid: str, decode: Callable[[Any], Any] = _raw) -> Iterator[Tuple[str, Any]]:
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT key, value FROM cursorDiskKV
+        WHERE key >= ? AND key < ?
+        ORDER BY COALESCE(json_extract(value,'$.createdAt'),0) ASC
+        """,
+        (f"bubbleId:{cid}:", f"bubbleId:{cid};"),
+    )
+    for k, v in cur:
+        yield k, decode(v)
+
+
+def scan_bubbles(conn: sqlite3.Connection, cid: str) -> List[Tuple[str, Any]]:
+    return list(iter_scan_bubbles(conn, cid))
+
+
+def iter_bubbles(
+    conn: sqlite3.Connection,
+    cid: str,
+    bubble_ids: Optional[List[str]] = None,
+    decode: Callable[[Any], Any] = _raw,
+) -> Iterator[Tuple[str, Any]]:
+    """(key, decode(value)) of a thread's bubbles in conversation order, fetched as they are consumed.
+
+    Uses the composerData header list (pass bubble_ids if already known);
+    threads without one fall back to the bubbleId:<cid>: range sorted by createdAt.
+    """
+    if bubble_ids is None:
+        bubble_ids = fetch_header_ids(conn, [cid])[cid]
+    if bubble_ids:
+        found = False
+        for row in iter_bubbles_by_ids(conn, cid, bubble_ids, decode):
+            found = True
+            yield row
+        if found:
+            return
+    yield from iter_scan_bubbles(conn, cid, decode)
+
+
+def fetch_bubbles(
+    conn: sqlite3.Connection, cid: str, bubble_ids: Optional[List[str]] = None
+) -> List[Tuple[str, Any]]:
+    """All of iter_bubbles() as a list."""
+    return list(iter_bubbles(conn, cid, bubble_ids))
+
+
+def has_created_index(conn: sqlite3.Connection) -> bool:
+    """True for a chat_mirror.py copy, whose cursorDiskKV has an indexed created_at_ms column."""
+    return any(row[1] == 'created_at_ms' for row in conn.execute('PRAGMA table_info(cursorDiskKV)'))
+
+
+def select_threads(
+    conn: sqlite3.Connection,
+    order_desc: bool,
+    since_ms: Optional[int] = None,
+    until_ms: Optional[int] = None,
+    cids: Optional[List[str]] = None,
+    min_messages: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+) -> List[Tuple[str, int]]:
+    """Return (cid, createdAt) of matching threads; every filter is evaluated inside SQLite.
+
+    state.vscdb has no index on createdAt, so since_ms/until_ms still read
+    every composerData value. A chat_mirror.py copy keeps createdAt in the
+    indexed created_at_ms column, and there only the rows in the date range
+    are visited.
+    """
+    created = "json_extract(c.value,'$.createdAt')"
+    composer_range = "c.key >= ? AND c.key < ?"
+    if (since_ms is not None or until_ms is not None) and has_created_index(conn):
+        created = 'c.created_at_ms'
+        composer_range = "+c.key >= ? AND +c.key < ?"  # '+': walk the created_at_ms index instead
+    where = [f"{created} IS NOT NULL"]
+    params: List[Any] = []
+    if since_ms is not None:
+        where.append(f"{created} >= ?")
+        params.append(since_ms)
+    if until_ms is not None:
+        where.append(f"{created} < ?")
+        params.append(until_ms)
+    # Bubble filters are primary-key range scans over bubbleId:<cid>: ... bubbleId:<cid>;
+    bubble_range = (
+        "FROM cursorDiskKV b WHERE b.key >= 'bubbleId:' || substr(c.key, length('composerData:')+1) || ':' "
+        "AND b.key < 'bubbleId:' || substr(c.key, length('composerData:')+1) || ';'"
+    )
+    if min_messages is not None:
+        where.append(f"(SELECT COUNT(*) {bubble_range}) >= ?")
+        params.append(min_messages)
+    if max_bytes is not None:
+        where.append(f"(SELECT COALESCE(SUM(length(CAST(b.value AS BLOB))),0) {bubble_range}) <= ?")
+        params.append(max_bytes)
+
+    if cids is None:
+        key_filters = [(composer_range, [COMPOSER_LO, COMPOSER_HI])]
+    else:
+        keys = ['composerData:' + cid for cid in dict.fromkeys(cids)]
+        key_filters = [
+            (f"c.key IN ({','.join('?' * len(chunk))})", chunk)
+            for chunk in (keys[i:i + SQL_VAR_CHUNK] for i in range(0, len(keys), SQL_VAR_CHUNK))
+        ]
+
+    rows: List[Tuple[str, int]] = []
+    cur = conn.cursor()
+    for key_sql, key_params in key_filters:
+        cur.execute(
+            f"""
+            SELECT substr(c.key, length('composerData:')+1) AS cid,
+                   {created} AS createdAt
+            FROM cursorDiskKV c
+            WHERE {key_sql} AND {' AND '.join(where)}
+            """,
+            key_params + params,
+        )
+        rows += [(row[0], int(row[1])) for row in cur.fetchall()]
+    rows.sort(key=lambda r: r[1], reverse=order_desc)
+    return rows
+
+
+def composer_ids(conn: sqlite3.Connection) -> List[str]:
+    """Every thread id in the DB, read from the key index alone (no values)."""
+    cur = conn.execute(
+        "SELECT substr(key, length('composerData:')+1) FROM cursorDiskKV WHERE key >= ? AND key < ?",
+        (COMPOSER_LO, COMPOSER_HI),
+    )
+    return [row[0] for row in cur]
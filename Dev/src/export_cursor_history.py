@@ -1,150 +1,61 @@
 #!/usr/bin/env python3
 import argparse
 import datetime
+import hashlib
 import json
 import os
 import re
 import sqlite3
 import sys
 import time
-import urllib.parse
-from typing import Any, Dict, List, Tuple
+import zlib
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+from chat_api import Thread
+from chat_catalog import (
+    abs_folder,
+    catalog_layout,
+    content_digest,
+    find_thread,
+    near_dup_enabled,
+    open_catalog,
+    record_thread,
+    rel_folder,
+    upsert_threads,
+)
+from chat_core import (
+    connect_db_readonly,
+    default_db_path,
+    default_out_root,
+    derive_title20,
+    head_text,
+    write_chat_yaml as write_yaml,
+)
+from chat_feed import ChangeFeed, new_run_id, note_db_deletions
+from chat_layout import SHARDED_LAYOUTS, thread_folder
+from cursor_kv import SQL_VAR_CHUNK, composer_ids, fetch_heads, select_threads
+from durable_io import GroupCommitter, atomic_write_text, recover
+from file_lock import FileLock, date_lock, job_lock, root_lock
+from progress import ExportProgress
+
+if TYPE_CHECKING:
+    # backfill, chat_formats, chat_tail, governor and redaction are imported
+    # where they are used, so `--help` and library imports stay cheap
+    from chat_formats import Writer
+    from governor import Budget
+    from redaction import Redactor
+
+# Older callers import these from here; chat_api is the in-process interface now.
+from chat_core import group_messages as group_messages_by_role  # noqa: F401
+from cursor_kv import fetch_bubbles  # noqa: F401
 
 
-def default_db_path() -> str:
-    """Return a cross-platform default path to Cursor state.vscdb."""
-    if sys.platform == 'darwin':
-        # macOS
-        return os.path.expanduser('~/Library/Application Support/Cursor/User/globalStorage/state.vscdb')
-    if sys.platform.startswith('win'):
-        # Windows
-        appdata = os.environ.get('APPDATA') or os.path.expanduser('~\\AppData\\Roaming')
-        return os.path.join(appdata, 'Cursor', 'User', 'globalStorage', 'state.vscdb')
-    # Linux / others
-    xdg = os.environ.get('XDG_CONFIG_HOME') or os.path.expanduser('~/.config')
-    return os.path.join(xdg, 'Cursor', 'User', 'globalStorage', 'state.vscdb')
-
-
-def connect_db_readonly(db_path: str) -> sqlite3.Connection:
-    uri = f"file:{urllib.parse.quote(db_path)}?mode=ro"
-    return sqlite3.connect(uri, uri=True)
+def fetch_all_threads(conn: sqlite3.Connection, order_desc: bool) -> List[Tuple[str, int]]:
+    return select_threads(conn, order_desc)
 
 
-def fetch_all_threads(conn: sqlite3.Connection, order_desc: bool) -> List[Tuple[str, int]]:
-    order = "DESC" if order_desc else "ASC"
-    cur = conn.cursor()
-    query = (
-        f"""
-        SELECT substr(key, length('composerData:')+1) AS cid,
-               json_extract(value,'$.createdAt') AS createdAt
-        FROM cursorDiskKV
-        WHERE key LIKE 'composerData:%' AND json_extract(value,'$.createdAt') IS NOT NULL
-        ORDER BY createdAt {order}
-        """
-    )
-    cur.execute(query)
-    return [(row[0], int(row[1])) for row in cur.fetchall()]
-
-
-def text_of(content: Any) -> str:
-    if isinstance(content, (dict, list)):
-        return json.dumps(content, ensure_ascii=False, indent=2)
-    return '' if content is None else str(content)
-
-
-def fetch_bubbles(conn: sqlite3.Connection, cid: str) -> List[Tuple[str, str]]:
-    cur = conn.cursor()
-    cur.execute(
-        """
-        SELECT key, value
-        FROM cursorDiskKV
-        WHERE key LIKE ?
-        ORDER BY COALESCE(json_extract(value,'$.createdAt'),0) ASC
-        """,
-        (f"bubbleId:{cid}:%",),
-    )
-    return cur.fetchall()
-
-
-def first_nonempty_content(bubbles: List[Tuple[str, str]]) -> str:
-    for _, v in bubbles:
-        try:
-            o = json.loads(v)
-        except Exception:
-            o = {"content": v}
-        s = text_of(o.get('content') or o.get('text') or o.get('richText') or o.get('message'))
-        if s.strip():
-            return s.strip()
-    return ''
-
-
-def derive_title20(s: str) -> str:
-    s = (s or '').strip()
-    s = re.sub(r"\s+", " ", s)[:20]
-    for a, b in [
-        ('/', '／'), ('\\', '＼'), (':', '：'), ('*', '＊'), ('?', '？'), ('"', '”'), ('<', '＜'), ('>', '＞'), ('|', '｜')
-    ]:
-        s = s.replace(a, b)
-    return s or 'untitled'
-
-
-def map_role(o: Dict[str, Any]) -> str:
-    role_raw = o.get('role') or o.get('authorRole') or o.get('sender')
-    if isinstance(role_raw, str):
-        r = role_raw.lower()
-        if r in ('user', 'human', 'client'):
-            return 'user'
-        if r in ('assistant', 'ai', 'agent', 'bot', 'model', 'system', 'tool'):
-            return 'assistant'
-    t = o.get('type')
-    if isinstance(t, int):
-        if t == 1:
-            return 'user'
-        if t == 2:
-            return 'assistant'
-    return 'other'
-
-
-def group_messages_by_role(bubbles: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
-    grouped: List[Dict[str, Any]] = []
-    for _, v in bubbles:
-        try:
-            o = json.loads(v)
-        except Exception:
-            o = {"content": v}
-        s = text_of(o.get('content') or o.get('text') or o.get('richText') or o.get('message'))
-        if not s.strip():
-            continue
-        role = map_role(o)
-        if grouped and grouped[-1]['role'] == role:
-            grouped[-1]['texts'].append(s)
-        else:
-            grouped.append({'role': role, 'texts': [s]})
-    return grouped
-
-
-def write_yaml(folder: str, cid: str, created_dt: str, title20: str, grouped: List[Dict[str, Any]]) -> None:
-    os.makedirs(folder, exist_ok=True)
-    p = os.path.join(folder, 'chat.yaml')
-    with open(p, 'w', encoding='utf-8') as f:
-        f.write('---\n')
-        f.write(f"threadId: \"{cid}\"\n")
-        f.write(f"created_at: \"{created_dt}\"\n")
-        f.write(f"title20: \"{title20}\"\n")
-        f.write("messages:\n")
-        for g in grouped:
-            f.write(f"  - role: \"{g['role']}\"\n")
-            f.write("    content: |-\n")
-            block = '\n\n'.join(g['texts']).rstrip('\n')
-            for line in block.splitlines():
-                f.write("      " + line + "\n")
-
-
-def atomic_write_json(path: str, data: Any) -> None:
-    tmp = path + ".tmp"
-    with open(tmp, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-    os.replace(tmp, path)
+def atomic_write_json(path: str, data: Any, fsync: bool = False) -> None:
+    atomic_write_text(path, json.dumps(data, ensure_ascii=False, indent=2), fsync=fsync)
 
 
 def load_manifest(path: str) -> Dict[str, Any]:
@@ -156,13 +67,51 @@ def load_manifest(path: str) -> Dict[str, Any]:
         return {}
 
 
-def ensure_manifest(manifest_path: str, conn: sqlite3.Connection, order_desc: bool) -> Dict[str, Any]:
+def parse_shard(s: str) -> Tuple[int, int]:
+    m = re.fullmatch(r"(\d+)/(\d+)", s)
+    if not m or int(m.group(2)) < 1 or int(m.group(1)) >= int(m.group(2)):
+        raise argparse.ArgumentTypeError(f"invalid shard {s!r} (expected k/N with 0 <= k < N)")
+    return int(m.group(1)), int(m.group(2))
+
+
+def in_shard(cid: str, shard: Optional[Tuple[int, int]]) -> bool:
+    # crc32 is stable across processes and machines (unlike hash())
+    if shard is None:
+        return True
+    k, n = shard
+    return zlib.crc32(cid.encode('utf-8')) % n == k
+
+
+def manifest_path_for(
+    out_root: str,
+    filters: Optional[Dict[str, Any]] = None,
+    shard: Optional[Tuple[int, int]] = None,
+) -> str:
+    """Unfiltered exports share export_manifest.json; each filter set and shard gets its own checkpoint."""
+    active = {k: v for k, v in (filters or {}).items() if v is not None}
+    name = 'export_manifest'
+    if active:
+        name += '.' + hashlib.sha1(json.dumps(active, sort_keys=True).encode('utf-8')).hexdigest()[:10]
+    if shard is not None:
+        name += f'.shard-{shard[0]}-of-{shard[1]}'
+    return os.path.join(out_root, name + '.json')
+
+
+def ensure_manifest(
+    manifest_path: str,
+    conn: sqlite3.Connection,
+    order_desc: bool,
+    filters: Optional[Dict[str, Any]] = None,
+    shard: Optional[Tuple[int, int]] = None,
+) -> Dict[str, Any]:
     manifest = load_manifest(manifest_path)
     if manifest.get('items'):
         return manifest
     items = []
-    threads = fetch_all_threads(conn, order_desc=order_desc)
+    threads = select_threads(conn, order_desc=order_desc, **(filters or {}))
     for cid, created_ms in threads:
+        if not in_shard(cid, shard):
+            continue
         items.append({
             'cid': cid,
             'createdAtMs': int(created_ms),
@@ -176,78 +125,445 @@ def ensure_manifest(manifest_path: str, conn: sqlite3.Connection, order_desc: bo
         'items': items,
         'last_index': -1,
     }
+    active = {k: v for k, v in (filters or {}).items() if v is not None}
+    if active:
+        manifest['filters'] = active
+    if shard is not None:
+        manifest['shard'] = f'{shard[0]}/{shard[1]}'
     atomic_write_json(manifest_path, manifest)
     return manifest
 
 
+def merge_shard_manifests(out_root: str, shards: int, filters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Fold the per-shard checkpoints into the regular manifest and summarize them."""
+    target = manifest_path_for(out_root, filters)
+    merged: Dict[str, Dict[str, Any]] = {it['cid']: it for it in load_manifest(target).get('items', [])}
+    order = load_manifest(target).get('order')
+    per_shard = []
+    for k in range(shards):
+        part = load_manifest(manifest_path_for(out_root, filters, (k, shards)))
+        its = part.get('items', [])
+        order = order or part.get('order')
+        per_shard.append({
+            'shard': f'{k}/{shards}',
+            'found': bool(part),
+            'total': len(its),
+            'processed': sum(1 for it in its if it.get('processed') and not it.get('skipped')),
+            'skipped': sum(1 for it in its if it.get('skipped')),
+        })
+        for it in its:
+            if it.get('processed') or it['cid'] not in merged:
+                merged[it['cid']] = it
+    items = sorted(merged.values(), key=lambda it: it['createdAtMs'], reverse=(order != 'asc'))
+    processed = [i for i, it in enumerate(items) if it.get('processed')]
+    manifest = {
+        'order': order or 'desc',
+        'total': len(items),
+        'items': items,
+        'last_index': processed[-1] if processed else -1,
+    }
+    if filters and any(v is not None for v in filters.values()):
+        manifest['filters'] = {k: v for k, v in filters.items() if v is not None}
+    atomic_write_json(target, manifest)
+    return {
+        'mode': 'merge',
+        'shards': per_shard,
+        'total_threads': len(items),
+        'processed': sum(s['processed'] for s in per_shard),
+        'skipped': sum(s['skipped'] for s in per_shard),
+        'remaining': sum(1 for it in items if not it.get('processed')),
+        'manifest': target,
+    }
+
+
 def export_batch(
     conn: sqlite3.Connection,
     out_root: str,
     manifest_path: str,
     start_index: int,
     batch_size: int,
+    layout: Optional[str] = None,
+    durable: bool = False,
+    fsync_every: int = 32,
+    progress: Optional[ExportProgress] = None,
+    redactor: Optional['Redactor'] = None,
+    throttle: float = 0.05,
+    append: bool = True,
+    budget: Optional['Budget'] = None,
+    writers: Optional[List['Writer']] = None,
+    run_id: Optional[str] = None,
 ) -> Tuple[int, int]:
+    from chat_tail import append_thread, group_tail, tail_columns
+    from redaction import redact_head
+
     manifest = load_manifest(manifest_path)
     items = manifest.get('items', [])
-    end_index = min(len(items), start_index + batch_size)
-    done = 0
-    skipped = 0
-    for idx in range(start_index, end_index):
-        it = items[idx]
-        if it.get('processed'):
-            continue
-        cid = it['cid']
-        created_ms = it['createdAtMs']
-        bubbles = fetch_bubbles(conn, cid)
-        head = first_nonempty_content(bubbles)
-        title20 = derive_title20(head)
-        if title20 == 'untitled':
+    catalog = open_catalog(out_root, layout or 'flat')
+    root = root_lock(out_root)
+    held: Dict[str, FileLock] = {}
+    committer: Optional[GroupCommitter] = None
+    writers = writers or []
+
+    def release_dates() -> None:
+        for lk in held.values():
+            lk.release()
+        held.clear()
+
+    # whatever goes wrong, no lock, file or connection outlives the call
+    # (a leaked date lock would block the other threads of this process)
+    finished = False
+    try:
+        if layout and layout != catalog_layout(catalog):
+            raise ValueError(f"{out_root} uses layout {catalog_layout(catalog)!r}; run chat_catalog.py migrate first")
+        layout = catalog_layout(catalog)
+        # durable writes replace whole files; near-dup signatures and the extra formats need every message
+        appendable = append and not durable and not near_dup_enabled(catalog) and not writers
+        feed = ChangeFeed(out_root, run_id)
+
+        # Other shards and the per-date rebuilders may write the same root
+        # concurrently; dates are locked while their folders are being written.
+        root.acquire()
+
+        # In durable mode the manifest and catalog only advance once a whole
+        # group of chat.yaml files has been fsynced and renamed into place.
+        pending_rows: List[Tuple[Any, ...]] = []
+        journal_name = '.' + os.path.basename(manifest_path) + '.journal'
+        if durable:
+            recover(out_root, journal_name)
+
+            def checkpoint() -> None:
+                for w in writers:
+                    w.flush(fsync=True)
+                for row in pending_rows:
+                    record_thread(catalog, out_root, *row)
+                pending_rows.clear()
+                feed.flush()
+                atomic_write_json(manifest_path, manifest, fsync=True)
+                release_dates()
+
+            committer = GroupCommitter(out_root, every=fsync_every, checkpoint=checkpoint, journal_name=journal_name)
+
+        def lock_date(date: str) -> None:
+            if date in held:
+                return
+            lk = date_lock(out_root, date)
+            if not lk.acquire(blocking=False):
+                # never wait while holding other dates: flush the group first
+                if committer is not None:
+                    committer.commit()
+                release_dates()
+                lk.acquire()
+            held[date] = lk
+
+        end_index = min(len(items), start_index + batch_size)
+        if progress is not None:
+            progress.total = sum(1 for it in items[start_index:end_index] if not it.get('processed'))
+        done = 0
+        skipped = 0
+        heads: Dict[str, Tuple[List[str], str]] = {}
+        for idx in range(start_index, end_index):
+            it = items[idx]
+            if it.get('processed'):
+                continue
+            if budget is not None and not budget.next():
+                break
+            cid = it['cid']
+            created_ms = it['createdAtMs']
+            if cid not in heads:
+                # header lists and watermarks for the next chunk of threads in one statement;
+                # under a time budget only for as many threads as are expected to fit
+                fit = budget.fit() if budget is not None else None
+                window = items[idx:min(end_index, idx + min(SQL_VAR_CHUNK, fit or SQL_VAR_CHUNK))]
+                heads = fetch_heads(conn, [x['cid'] for x in window if not x.get('processed')])
+            thread = Thread(conn, cid, created_ms, *heads[cid])
+            prev = [r for r in find_thread(catalog, cid) if r['cid'] == cid]
+            if prev and appendable:
+                # exported before: rewrite only the tail of chat.yaml if its start is unchanged
+                lock_date(prev[-1]['date'])
+                appended = append_thread(out_root, prev[-1], thread, redactor)
+                if appended is not None:
+                    new_row, info = appended
+                    upsert_threads(catalog, new_row)
+                    if info['written']:
+                        # the file is unchanged up to the old tail offset
+                        feed.add('updated', cid, new_row['folder'], new_row['sha256'], offset=prev[-1]['tail_offset'])
+                        feed.flush()
+                    if redactor is not None:
+                        it['redactions'] = info['redactions']
+                    it['processed'] = True
+                    it['skipped'] = False
+                    it['folder'] = abs_folder(out_root, new_row['folder'])
+                    it['appended'] = info['written']
+                    manifest['last_index'] = idx
+                    atomic_write_json(manifest_path, manifest)
+                    release_dates()
+                    done += 1
+                    if progress is not None:
+                        progress.thread_done(thread.read_bytes, info['written'])
+                    if throttle and info['written']:
+                        time.sleep(throttle)
+                    continue
+            grouped, starts = group_tail(thread.messages())
+            title20 = derive_title20(redact_head(redactor, head_text(grouped)))
+            if title20 == 'untitled':
+                it['processed'] = True
+                it['skipped'] = True
+                manifest['last_index'] = idx
+                if committer is None:
+                    atomic_write_json(manifest_path, manifest)
+                skipped += 1
+                if progress is not None:
+                    progress.thread_done(thread.read_bytes, skipped=True)
+                continue
+            created_dt = thread.created_dt
+            folder = thread_folder(out_root, layout, f"{created_dt}_{title20}_{cid[:8]}", cid)
+            if redactor is not None:
+                it['redactions'] = redactor.redact_thread(cid, grouped)
             it['processed'] = True
-            it['skipped'] = True
+            it['skipped'] = False
+            it['folder'] = folder
             manifest['last_index'] = idx
-            atomic_write_json(manifest_path, manifest)
-            skipped += 1
-            continue
-        created_dt = datetime.datetime.fromtimestamp(int(created_ms) / 1000).strftime('%Y-%m-%d_%H-%M-%S')
-        folder = os.path.join(out_root, f"{created_dt}_{title20}_{cid[:8]}")
-        grouped = group_messages_by_role(bubbles)
-        write_yaml(folder, cid, created_dt, title20, grouped)
-        it['processed'] = True
-        it['skipped'] = False
-        it['folder'] = folder
-        manifest['last_index'] = idx
-        atomic_write_json(manifest_path, manifest)
-        done += 1
-        time.sleep(0.05)
+            lock_date(created_dt[:10])
+            text = write_yaml(folder, cid, created_dt, title20, grouped, committer=committer)
+            if writers:
+                # the same decoded thread for every other format
+                from chat_formats import ThreadOut
+
+                out = ThreadOut(cid, created_dt, title20, folder, grouped, prev[-1]['folder'] if prev else None)
+                for w in writers:
+                    w.write(out)
+            digest = content_digest(text)
+            tail = tail_columns(text, cid, thread.bubble_ids, starts, redactor)
+            row = (folder, cid, created_ms, created_dt, title20, grouped, digest, thread.watermark, tail)
+            feed.thread_written(prev, cid, rel_folder(out_root, folder), digest[1])
+            if committer is None:
+                record_thread(catalog, out_root, *row)
+                feed.flush()
+                atomic_write_json(manifest_path, manifest)
+                release_dates()
+            else:
+                pending_rows.append(row)
+            done += 1
+            if progress is not None:
+                progress.thread_done(thread.read_bytes, digest[0])
+            if throttle:
+                time.sleep(throttle)
+        if budget is not None:
+            budget.finish()
+        if committer is not None:
+            committer.close()
+            committer = None
+        for w in writers:
+            w.flush()
+        feed.flush()
+        finished = True
+    finally:
+        if committer is not None:
+            committer.abort()
+        if not finished:
+            for w in writers:
+                try:
+                    w.flush()  # what the manifest already records as exported
+                except OSError:
+                    pass
+        release_dates()
+        root.release()
+        catalog.close()
     return done, skipped
 
 
+def record_db_deletions(conn: sqlite3.Connection, out_root: str, run_id: Optional[str] = None) -> int:
+    """Add a 'deleted' change for each exported thread that is no longer in the DB."""
+    with root_lock(out_root):
+        catalog = open_catalog(out_root)
+        feed = ChangeFeed(out_root, run_id)
+        n = note_db_deletions(feed, catalog, composer_ids(conn))
+        feed.flush()
+        catalog.close()
+    return n
+
+
+def recent_range(items: List[Dict[str, Any]], cutoff_ms: int) -> Tuple[int, int]:
+    """[start, end) of the manifest items created at/after cutoff_ms (contiguous: items are sorted)."""
+    idx = [i for i, it in enumerate(items) if it['createdAtMs'] >= cutoff_ms]
+    return (idx[0], idx[-1] + 1) if idx else (0, 0)
+
+
+def run_backfill(
+    conn: sqlite3.Connection,
+    args: argparse.Namespace,
+    manifest_path: str,
+    redactor: Optional['Redactor'],
+    budget: Optional['Budget'] = None,
+    writers: Optional[List['Writer']] = None,
+    run_id: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Drain the unprocessed manifest items in slices at low priority, pausing while the DB is written."""
+    from backfill import lower_priority, wait_for_quiet
+
+    lock = job_lock(args.out, 'backfill')
+    if not lock.acquire(blocking=False):
+        return {'mode': 'backfill', 'running_elsewhere': True}
+    try:
+        priority = lower_priority()
+        items = load_manifest(manifest_path).get('items', [])
+        slice_size = max(1, args.slice_size)
+        starts = [
+            i for i in range(0, len(items), slice_size)
+            if any(not it.get('processed') for it in items[i:i + slice_size])
+        ]
+        done = skipped = 0
+        paused = 0.0
+        for start in starts:
+            if budget is not None and budget.stopped:
+                break
+            paused += wait_for_quiet(args.db, args.quiet_seconds)
+            d, s = export_batch(conn, args.out, manifest_path, start, slice_size, layout=args.layout,
+                                durable=args.durable, fsync_every=args.fsync_every, redactor=redactor,
+                                append=not args.no_append, budget=budget, writers=writers,
+                                run_id=run_id)
+            done += d
+            skipped += s
+    finally:
+        lock.release()
+    return {
+        'mode': 'backfill',
+        'slices': len(starts),
+        'processed': done,
+        'skipped': skipped,
+        'paused_s': round(paused, 1),
+        'priority': priority,
+        'manifest': manifest_path,
+    }
+
+
+def parse_local_date(s: str) -> datetime.datetime:
+    try:
+        return datetime.datetime.fromisoformat(s)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid date {s!r} (expected YYYY-MM-DD or YYYY-MM-DDTHH:MM)")
+
+
+def parse_until(s: str) -> datetime.datetime:
+    # a bare date includes the whole day
+    dt = parse_local_date(s)
+    return dt + datetime.timedelta(days=1) if len(s) == 10 else dt
+
+
+def read_cids(values: Optional[List[str]], cid_file: Optional[str]) -> Optional[List[str]]:
+    if not values and not cid_file:
+        return None
+    cids = [c.strip() for v in (values or []) for c in v.split(',') if c.strip()]
+    if cid_file:
+        with open(cid_file, 'r', encoding='utf-8') as f:
+            cids += [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    return cids
+
+
 def main() -> None:
+    from chat_formats import FORMATS, open_writers
+    from governor import add_budget_args, budget_from_args
+    from redaction import add_redaction_args, redactor_from_args
+
     parser = argparse.ArgumentParser(description='Export Cursor chat history to YAML (grouped) in batches.')
     parser.add_argument('--db', default=default_db_path(), help='Path to Cursor state.vscdb')
-    parser.add_argument('--out', default=os.path.abspath(os.path.join(os.getcwd(), '@chat_history')))
+    parser.add_argument('--out', default=default_out_root())
     parser.add_argument('--batch-size', type=int, default=50)
     parser.add_argument('--start-index', type=int, default=0)
     parser.add_argument('--order', choices=['desc', 'asc'], default='desc', help='desc=newest first (default)')
     parser.add_argument('--rescan', action='store_true', help='Rebuild manifest before exporting')
     parser.add_argument('--all', action='store_true', help='Process all threads in one go (ignores batch-size and start-index)')
+    parser.add_argument('--durable', action='store_true', help='Write every file via tmp+rename and fsync in groups (crash-safe resume)')
+    parser.add_argument('--fsync-every', type=int, default=32, help='Files per fsync group in --durable mode')
+    parser.add_argument('--layout', choices=SHARDED_LAYOUTS, default=None, help='Folder layout for a new output root: flat (default), date=YYYY/MM/DD, hash=2-char fan-out')
+    parser.add_argument('--since', type=parse_local_date, help='Only threads created at/after this local date or datetime')
+    parser.add_argument('--until', type=parse_until, help='Only threads created up to this local date (inclusive) or before this datetime')
+    parser.add_argument('--cid', action='append', help='Only this thread id (repeatable, comma-separated allowed)')
+    parser.add_argument('--cid-file', help='File with one thread id per line')
+    parser.add_argument('--min-messages', type=int, help='Only threads with at least this many bubbles')
+    parser.add_argument('--max-bytes', type=int, help='Only threads whose bubbles total at most this many bytes')
+    parser.add_argument('--shard', type=parse_shard, help='Export only partition k/N (stable hash of cid, 0 <= k < N) with its own checkpoint')
+    parser.add_argument('--progress-interval', type=float, default=30.0, help='Seconds between progress lines on stderr (0 disables)')
+    parser.add_argument('--metrics-file', help='Prometheus textfile-collector file (*.prom) rewritten atomically during the run')
+    parser.add_argument('--metrics-interval', type=float, default=15.0, help='Seconds between --metrics-file updates')
+    parser.add_argument('--no-append', action='store_true', help='Rewrite threads exported before in full instead of only the tail of chat.yaml')
+    add_budget_args(parser)
+    parser.add_argument('--format', action='append', choices=sorted(FORMATS), dest='formats',
+                        help='Also write this format from the same decoded threads (repeatable); chat.yaml is always written')
+    add_redaction_args(parser)
+    parser.add_argument('--recent-days', type=float, metavar='N', help='Export threads of the last N days at full speed first, then leave the rest to a background --backfill')
+    parser.add_argument('--backfill', action='store_true', help='Drain the unprocessed threads in slices at low CPU/IO priority, pausing while the DB is being written')
+    parser.add_argument('--slice-size', type=int, default=20, help='Threads per --backfill slice (checkpointed after each)')
+    parser.add_argument('--quiet-seconds', type=float, default=15.0, help='--backfill waits until the DB has not been written for this long before each slice')
+    parser.add_argument('--merge-shards', type=int, metavar='N', help='Merge the N per-shard checkpoints into the regular manifest and exit')
     args = parser.parse_args()
+    budget = budget_from_args(args)  # measured from here: start-up and the manifest count against it
+
+    filters = {
+        'since_ms': int(args.since.timestamp() * 1000) if args.since else None,
+        'until_ms': int(args.until.timestamp() * 1000) if args.until else None,
+        'cids': read_cids(args.cid, args.cid_file),
+        'min_messages': args.min_messages,
+        'max_bytes': args.max_bytes,
+    }
+
+    try:
+        redactor = redactor_from_args(args)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
 
     os.makedirs(args.out, exist_ok=True)
-    manifest_path = os.path.join(args.out, 'export_manifest.json')
+    if args.merge_shards:
+        print(json.dumps(merge_shard_manifests(args.out, args.merge_shards, filters), ensure_ascii=False, indent=2))
+        return
+    manifest_path = manifest_path_for(args.out, filters, args.shard)
+    run_id = new_run_id() + (f'-shard{args.shard[0]}of{args.shard[1]}' if args.shard else '')
+    writers = open_writers(args.formats, args.out, run_id)
 
     conn = connect_db_readonly(args.db)
     if args.rescan or not os.path.exists(manifest_path):
-        ensure_manifest(manifest_path, conn, order_desc=(args.order == 'desc'))
+        ensure_manifest(manifest_path, conn, order_desc=(args.order == 'desc'), filters=filters, shard=args.shard)
+    progress = ExportProgress(
+        0,
+        interval=args.progress_interval,
+        metrics_path=args.metrics_file,
+        metrics_interval=args.metrics_interval,
+        job=f'shard-{args.shard[0]}-of-{args.shard[1]}' if args.shard else 'export',
+    )
 
-    if args.all:
-        # Process all threads in one go
+    if args.recent_days is not None or args.backfill:
+        summary = {'mode': 'scheduled', 'manifest': manifest_path}
+        if args.recent_days is not None:
+            items = load_manifest(manifest_path).get('items', [])
+            cutoff_ms = int((time.time() - args.recent_days * 86400) * 1000)
+            start, end = recent_range(items, cutoff_ms)
+            done, skipped = export_batch(conn, args.out, manifest_path, start, end - start, layout=args.layout,
+                                         durable=args.durable, fsync_every=args.fsync_every, progress=progress,
+                                         redactor=redactor, throttle=0, append=not args.no_append, budget=budget,
+                                         writers=writers, run_id=run_id)
+            remaining = sum(1 for it in load_manifest(manifest_path).get('items', []) if not it.get('processed'))
+            summary['recent'] = {'days': args.recent_days, 'processed': done, 'skipped': skipped, 'remaining': remaining}
+            if remaining and not args.backfill:
+                from backfill import backfill_argv, spawn_backfill
+
+                # the script itself, also when started through cursor_history.py
+                summary['backfill'] = spawn_backfill(os.path.abspath(__file__), backfill_argv(sys.argv[1:]), args.out)
+        if args.backfill:
+            summary['backfill'] = run_backfill(conn, args, manifest_path, redactor, budget, writers, run_id)
+    elif args.all or budget is not None:
+        # Process all threads in one go (or, under a budget, as many as fit)
         with open(manifest_path, 'r', encoding='utf-8') as f:
             manifest = json.load(f)
-        total_threads = len(manifest.get('threads', []))
-        done, skipped = export_batch(conn, args.out, manifest_path, 0, total_threads)
+        total_threads = len(manifest.get('items', []))
+        start = 0 if args.all else args.start_index
+        # no pause between threads when racing a deadline
+        throttle = 0 if args.time_budget is not None else 0.05
+        done, skipped = export_batch(conn, args.out, manifest_path, start, total_threads - start, layout=args.layout,
+                                     durable=args.durable, fsync_every=args.fsync_every, progress=progress,
+                                     redactor=redactor, throttle=throttle, append=not args.no_append, budget=budget,
+                                     writers=writers, run_id=run_id)
         summary = {
-            'mode': 'all',
+            'mode': 'all' if args.all else 'budget',
             'total_threads': total_threads,
             'processed': done,
             'skipped': skipped,
@@ -255,7 +571,10 @@ def main() -> None:
         }
     else:
         # Process in batches
-        done, skipped = export_batch(conn, args.out, manifest_path, args.start_index, args.batch_size)
+        done, skipped = export_batch(conn, args.out, manifest_path, args.start_index, args.batch_size, layout=args.layout,
+                                     durable=args.durable, fsync_every=args.fsync_every, progress=progress,
+                                     redactor=redactor, append=not args.no_append, writers=writers,
+                                     run_id=run_id)
         summary = {
             'mode': 'batch',
             'start_index': args.start_index,
@@ -264,10 +583,27 @@ def main() -> None:
             'skipped': skipped,
             'manifest': manifest_path,
         }
+    if budget is not None:
+        # what is left stays unprocessed in the manifest; the next run resumes there
+        summary['budget'] = budget.summary()
+        summary['remaining'] = sum(1 for it in load_manifest(manifest_path).get('items', []) if not it.get('processed'))
+    if not any(v is not None for v in filters.values()) and not args.shard:
+        # only a run over the whole DB can tell that a thread is gone from it
+        summary['deleted_from_db'] = record_db_deletions(conn, args.out, run_id)
+    summary['run'] = run_id
+    if writers:
+        for w in writers:
+            w.close()
+        summary['formats'] = {w.name: w.summary() for w in writers}
+    if args.shard:
+        summary['shard'] = f'{args.shard[0]}/{args.shard[1]}'
+    if redactor is not None:
+        summary['redactions'] = redactor.summary()
+    final = progress.finish()
+    summary['elapsed_s'] = final['elapsed_s']
+    summary['threads_per_s'] = final['threads_per_s']
     print(json.dumps(summary, ensure_ascii=False, indent=2))
 
 
 if __name__ == '__main__':
     main()
-
-
@@ -0,0 +1,155 @@
+import os
+import sys
+import threading
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+if sys.platform.startswith('win'):
+    import msvcrt
+else:
+    import fcntl
+
+LOCK_NAME = '.chat_history.lock'
+
+# Advisory byte-range locks in a single <root>/.chat_history.lock file:
+#   byte 0          root lock: shared by exporters/rebuilders, exclusive for
+#                   whole-tree operations (layout migration, moving to Flow)
+#   byte 1 + h(d)   date lock: exclusive while the folders of date d are
+#                   written or cleared (different dates rarely share a byte)
+#   byte 1 + h(m)   month lock (key 'month:YYYYMM', same slots): Flow
+#                   rebuilds hold it so a packed month is unpacked/repacked once
+#   byte 1 + h(j)   job lock (key 'job:<name>', same slots): at most one
+#                   background job of a kind (e.g. the export backfill) per root
+# POSIX record locks belong to the process and vanish when any fd of the file
+# is closed, so one fd per lock file is shared by all FileLock objects here.
+# They also do not exclude threads of the same process, so FileLocks do that
+# themselves (chat_workspaces.py exports on a thread pool): a byte is locked
+# by the first holder in the process and unlocked after the last one.
+# On Windows msvcrt has no shared mode, so shared locks are exclusive there.
+
+_DATE_SLOTS = 1 << 20
+_open_files: Dict[str, List[int]] = {}  # path -> [fd, users]
+_held: Dict[Tuple[str, int], List] = {}  # (path, offset) -> [shared, holding threads, OS lock pending]
+_guard = threading.Condition(threading.RLock())
+
+
+def _open(path: str) -> int:
+    with _guard:
+        entry = _open_files.get(path)
+        if entry is None:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            entry = _open_files[path] = [os.open(path, os.O_RDWR | os.O_CREAT, 0o644), 0]
+        entry[1] += 1
+        return entry[0]
+
+
+def _close(path: str) -> None:
+    with _guard:
+        entry = _open_files[path]
+        entry[1] -= 1
+        if entry[1] == 0:
+            os.close(entry[0])
+            del _open_files[path]
+
+
+class FileLock:
+    def __init__(self, path: str, offset: int = 0, shared: bool = False) -> None:
+        self.path = os.path.abspath(path)
+        self.offset = offset
+        self.shared = shared
+        self._fd: Optional[int] = None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        if self._fd is not None:
+            return True
+        key = (self.path, self.offset)
+        me = threading.get_ident()
+        with _guard:
+            while True:
+                st = _held.get(key)
+                if st is None:
+                    _held[key] = [self.shared, [], True]
+                    break
+                if not st[2] and (me in st[1] or (st[0] and self.shared)):
+                    # held shared by other threads, or by this one already (as the OS
+                    # allows it): join without touching the OS lock
+                    st[1].append(me)
+                    self._fd = _open(self.path)
+                    return True
+                if not blocking:
+                    return False
+                _guard.wait()
+        fd = _open(self.path)
+        try:
+            if sys.platform.startswith('win'):
+                os.lseek(fd, self.offset, os.SEEK_SET)
+                mode = msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK
+                while True:
+                    try:
+                        msvcrt.locking(fd, mode, 1)
+                        break
+                    except OSError:
+                        if not blocking:
+                            raise
+            else:
+                op = fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX
+                fcntl.lockf(fd, op if blocking else op | fcntl.LOCK_NB, 1, self.offset, os.SEEK_SET)
+        except OSError:
+            _close(self.path)
+            with _guard:
+                del _held[key]
+                _guard.notify_all()
+            return False
+        with _guard:
+            _held[key][1:] = [[me], False]
+            _guard.notify_all()
+        self._fd = fd
+        return True
+
+    def release(self) -> None:
+        if self._fd is None:
+            return
+        key = (self.path, self.offset)
+        try:
+            with _guard:
+                st = _held[key]
+                me = threading.get_ident()
+                st[1].remove(me if me in st[1] else st[1][-1])
+                if not st[1]:
+                    del _held[key]
+                    _guard.notify_all()
+                    if sys.platform.startswith('win'):
+                        os.lseek(self._fd, self.offset, os.SEEK_SET)
+                        msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+                    else:
+                        fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, self.offset, os.SEEK_SET)
+        finally:
+            self._fd = None
+            _close(self.path)
+
+    @property
+    def locked(self) -> bool:
+        return self._fd is not None
+
+    def __enter__(self) -> 'FileLock':
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+
+def root_lock(root: str, shared: bool = True) -> FileLock:
+    return FileLock(os.path.join(root, LOCK_NAME), 0, shared=shared)
+
+
+def date_lock(root: str, date: str) -> FileLock:
+    return FileLock(os.path.join(root, LOCK_NAME), 1 + zlib.crc32(date.encode('utf-8')) % _DATE_SLOTS)
+
+
+def month_lock(root: str, ym: str) -> FileLock:
+    return date_lock(root, 'month:' + ym)
+
+
+def job_lock(root: str, name: str) -> FileLock:
+    return date_lock(root, 'job:' + name)
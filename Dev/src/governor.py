@@ -0,0 +1,127 @@
+import os
+import sys
+import time
+from typing import Any, Callable, Dict, Optional
+
+# --time-budget / --max-rss: a run measures what each thread (or date) costs
+# and stops at a checkpoint before the next one could push it past either
+# limit. Whatever is left stays unprocessed in the manifest for the next run.
+
+RESERVE = 0.05  # share of the time budget kept for the final checkpoint and summary
+EWMA_WEIGHT = 0.2
+
+
+def current_rss() -> Optional[int]:
+    """Resident set size of this process in bytes (None where it cannot be read)."""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # the peak, not the current size: kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class Budget:
+    """Wall-clock and RSS ceilings for one run.
+
+    Call next() before every unit of work (a thread, a date) and stop when
+    it returns False: one more unit is then expected not to fit, judging by
+    the slowest unit and the largest RSS growth seen so far. fit()
+    estimates how many units the rest of the time budget holds (from the
+    average cost), for sizing prefetch windows.
+    """
+
+    def __init__(
+        self,
+        time_budget: Optional[float] = None,
+        max_rss_mb: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+        rss: Callable[[], Optional[int]] = current_rss,
+    ) -> None:
+        self.time_budget = time_budget
+        self.max_rss = int(max_rss_mb * 1024 * 1024) if max_rss_mb else None
+        self.clock = clock
+        self.rss = rss
+        self.started = clock()
+        self.units = 0
+        self.avg_s: Optional[float] = None
+        self.max_s = 0.0
+        self.max_growth = 0
+        self.peak_rss = rss() or 0
+        self.stopped: Optional[str] = None
+        self._mark = (self.started, self.peak_rss)
+        self._open = False
+
+    def elapsed(self) -> float:
+        return self.clock() - self.started
+
+    def next(self) -> bool:
+        """Close the unit in progress (if any) and tell whether another one fits; if so it starts now."""
+        if self._open:
+            self.finish()
+        if not self._allows():
+            return False
+        self._mark = (self.clock(), self.rss() or 0)
+        self._open = True
+        return True
+
+    def finish(self) -> None:
+        """Account for the unit in progress."""
+        if not self._open:
+            return
+        self._open = False
+        now, rss = self.clock(), self.rss() or 0
+        took = now - self._mark[0]
+        self.units += 1
+        self.avg_s = took if self.avg_s is None else (1 - EWMA_WEIGHT) * self.avg_s + EWMA_WEIGHT * took
+        self.max_s = max(self.max_s, took)
+        self.max_growth = max(self.max_growth, rss - self._mark[1])
+        self.peak_rss = max(self.peak_rss, rss)
+
+    def _allows(self) -> bool:
+        if self.stopped is not None:
+            return False
+        if self.time_budget is not None:
+            if self.elapsed() + self.max_s > self.time_budget * (1 - RESERVE):
+                self.stopped = 'time'
+                return False
+        if self.max_rss is not None:
+            rss = self.rss()
+            if rss is not None and rss + self.max_growth > self.max_rss:
+                self.stopped = 'rss'
+                return False
+        return True
+
+    def fit(self) -> Optional[int]:
+        if self.time_budget is None or not self.avg_s:
+            return None
+        left = self.time_budget * (1 - RESERVE) - self.elapsed()
+        return max(1, int(left / self.avg_s))
+
+    def summary(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {'stopped': self.stopped, 'elapsed_s': round(self.elapsed(), 1), 'units': self.units}
+        if self.avg_s is not None:
+            out['avg_ms'] = round(self.avg_s * 1000, 1)
+            out['max_ms'] = round(self.max_s * 1000, 1)
+        if self.peak_rss:
+            out['peak_rss_mb'] = round(self.peak_rss / 1024 / 1024, 1)
+        return out
+
+
+def add_budget_args(parser: Any, unit: str = 'thread') -> None:
+    parser.add_argument('--time-budget', type=float, metavar='SECONDS',
+                        help=f'Stop at a checkpoint before this many seconds have passed (the next {unit} is assumed to take as long as the slowest so far)')
+    parser.add_argument('--max-rss', type=float, metavar='MB',
+                        help='Stop at a checkpoint before the resident memory would exceed this many MB')
+
+
+def budget_from_args(args: Any) -> Optional[Budget]:
+    if args.time_budget is None and args.max_rss is None:
+        return None
+    return Budget(args.time_budget, args.max_rss)
@@ -3,20 +3,12 @@ import argparse
 import os
 import re
 import shutil
-from typing import Dict, Tuple
+from typing import Dict, Optional, Tuple
 
-
-def default_flow_root() -> str:
-    # default to ./Flow relative to cwd if exists, else ~/Flow
-    cwd_flow = os.path.abspath(os.path.join(os.getcwd(), 'Flow'))
-    if os.path.isdir(cwd_flow):
-        return cwd_flow
-    return os.path.expanduser('~/Flow')
-
-
-def default_src_root() -> str:
-    # default to ./@chat_history relative to cwd
-    return os.path.abspath(os.path.join(os.getcwd(), '@chat_history'))
+from chat_catalog import abs_folder, catalog_layout, index_tree, move_folder, open_catalog, rel_folder
+from chat_core import default_flow_root, default_out_root
+from chat_feed import ChangeFeed, new_run_id
+from file_lock import root_lock
 
 
 def parse_folder_date(name: str) -> Tuple[str, str]:
@@ -27,14 +19,21 @@ def parse_folder_date(name: str) -> Tuple[str, str]:
     return (f"{yyyy}{mm}", f"{yyyy}-{mm}-{dd}")
 
 
-def move_exported_to_flow(src_root: str, flow_root: str) -> Dict[str, int]:
+def move_exported_to_flow(src_root: str, flow_root: str, run_id: Optional[str] = None) -> Dict[str, int]:
     moved = 0
     skipped = 0
     errors = 0
     if not os.path.isdir(src_root):
         return {'moved': 0, 'skipped': 0, 'errors': 0}
-    for name in sorted(os.listdir(src_root)):
-        src_path = os.path.join(src_root, name)
+    src_cat = open_catalog(src_root)
+    # folders exported before the catalog existed (or copied in by hand) have no row yet
+    index_tree(src_cat, src_root, catalog_layout(src_cat), missing_only=True)
+    flow_cat = open_catalog(flow_root, 'flow')
+    src_feed, flow_feed = ChangeFeed(src_root, run_id), ChangeFeed(flow_root, run_id)
+    for row in src_cat.execute('SELECT folder, cid, sha256 FROM threads ORDER BY folder').fetchall():
+        rel = row['folder']
+        src_path = abs_folder(src_root, rel)
+        name = os.path.basename(src_path)
         if not os.path.isdir(src_path):
             continue
         ym, date = parse_folder_date(name)
@@ -51,45 +50,53 @@ def move_exported_to_flow(src_root: str, flow_root: str) -> Dict[str, int]:
             k += 1
         try:
             shutil.move(src_path, dest_path)
+            new_rel = rel_folder(flow_root, dest_path)
+            move_folder(src_cat, rel, flow_cat, new_rel)
+            src_feed.add('removed', row['cid'], rel, row['sha256'])
+            flow_feed.add('created', row['cid'], new_rel, row['sha256'])
             moved += 1
         except Exception:
             errors += 1
+    src_feed.flush()
+    flow_feed.flush()
+    src_cat.close()
+    flow_cat.close()
     return {'moved': moved, 'skipped': skipped, 'errors': errors}
 
 
-def organize_chats_subfolders(flow_root: str) -> Dict[str, int]:
+def organize_chats_subfolders(flow_root: str, run_id: Optional[str] = None) -> Dict[str, int]:
     totals: Dict[str, int] = {}
     if not os.path.isdir(flow_root):
         return {'total_dates_updated': 0, 'moved_by_date': totals}
-    for ym in sorted(os.listdir(flow_root)):
-        ym_path = os.path.join(flow_root, ym)
-        if not os.path.isdir(ym_path) or not re.fullmatch(r"\d{6}", ym):
+    catalog = open_catalog(flow_root, 'flow')
+    feed = ChangeFeed(flow_root, run_id)
+    # Threads still sitting directly under Flow/YYYYMM/YYYY-MM-DD/ (not yet in chats/)
+    pending = catalog.execute(
+        "SELECT folder, date, cid, sha256 FROM threads WHERE folder NOT LIKE '%/chats/%' ORDER BY folder"
+    ).fetchall()
+    for row in pending:
+        rel, date = row['folder'], row['date']
+        src = abs_folder(flow_root, rel)
+        name = os.path.basename(src)
+        if not os.path.isdir(src) or not name.startswith(date + '_'):
             continue
-        for date in sorted(os.listdir(ym_path)):
-            date_path = os.path.join(ym_path, date)
-            if not os.path.isdir(date_path) or not re.fullmatch(r"\d{4}-\d{2}-\d{2}", date):
-                continue
-            chats_dir = os.path.join(date_path, 'chats')
-            os.makedirs(chats_dir, exist_ok=True)
-            moved = 0
-            for name in os.listdir(date_path):
-                if name == 'chats':
-                    continue
-                src = os.path.join(date_path, name)
-                if not os.path.isdir(src):
-                    continue
-                if not name.startswith(date + '_'):
-                    continue
-                dest = os.path.join(chats_dir, name)
-                base = dest
-                k = 1
-                while os.path.exists(dest):
-                    dest = base + f"-{k}"
-                    k += 1
-                shutil.move(src, dest)
-                moved += 1
-            if moved:
-                totals[os.path.join(ym, date)] = moved
+        date_path = os.path.dirname(src)
+        chats_dir = os.path.join(date_path, 'chats')
+        os.makedirs(chats_dir, exist_ok=True)
+        dest = os.path.join(chats_dir, name)
+        base = dest
+        k = 1
+        while os.path.exists(dest):
+            dest = base + f"-{k}"
+            k += 1
+        shutil.move(src, dest)
+        new_rel = rel_folder(flow_root, dest)
+        move_folder(catalog, rel, catalog, new_rel)
+        feed.add('renamed', row['cid'], new_rel, row['sha256'], prev_folder=rel)
+        key = os.path.relpath(date_path, flow_root)
+        totals[key] = totals.get(key, 0) + 1
+    feed.flush()
+    catalog.close()
     return {
         'total_dates_updated': len(totals),
         'moved_by_date': totals,
@@ -98,12 +105,16 @@ def organize_chats_subfolders(flow_root: str) -> Dict[str, int]:
 
 def main() -> None:
     parser = argparse.ArgumentParser(description='Move exported chats to Flow and organize into chats/ subfolders.')
-    parser.add_argument('--src', default=default_src_root(), help='Source folder (exported @chat_history)')
+    parser.add_argument('--src', default=default_out_root(), help='Source folder (exported @chat_history)')
     parser.add_argument('--flow', default=default_flow_root(), help='Flow root folder')
     args = parser.parse_args()
 
-    move_stats = move_exported_to_flow(args.src, args.flow)
-    org_stats = organize_chats_subfolders(args.flow)
+    # Whole-tree moves: wait for running exports/rebuilds on both roots
+    os.makedirs(args.flow, exist_ok=True)
+    with root_lock(args.src, shared=False), root_lock(args.flow, shared=False):
+        run_id = new_run_id()
+        move_stats = move_exported_to_flow(args.src, args.flow, run_id)
+        org_stats = organize_chats_subfolders(args.flow, run_id)
     print({'move': move_stats, 'organize': org_stats, 'flow_root': args.flow})
 
 
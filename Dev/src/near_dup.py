@@ -0,0 +1,177 @@
+import random
+import re
+import sqlite3
+import struct
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+# MinHash signatures and LSH buckets live next to the thread rows in
+# chat_catalog.sqlite. Rows are keyed by cid so they survive folder moves.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS near_dup_sig (
+    cid TEXT PRIMARY KEY,
+    sig BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS near_dup_band (
+    band INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    cid TEXT NOT NULL,
+    PRIMARY KEY (band, bucket, cid)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS near_dup_band_cid ON near_dup_band(cid);
+"""
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS  # candidates from J ~ (1/BANDS)**(1/ROWS) = 0.5 upwards
+SHINGLE = 4
+DEFAULT_THRESHOLD = 0.8
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(0x5EED)
+_PERMS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+# ASCII words, or single characters for scripts written without spaces (e.g. Japanese)
+_TOKEN = re.compile(r'[0-9A-Za-z_]+|[^\s0-9A-Za-z_]')
+_SIG = struct.Struct(f'<{NUM_PERM}I')
+
+
+def thread_text(grouped: Iterable[Dict[str, Any]]) -> str:
+    """Text of grouped messages (exporter 'texts' lists or chat_reader 'content')."""
+    parts: List[str] = []
+    for g in grouped:
+        parts.extend(g['texts'] if 'texts' in g else [g.get('content', '')])
+    return '\n'.join(parts)
+
+
+def shingles(text: str) -> Set[int]:
+    tokens = _TOKEN.findall(text.lower())
+    if len(tokens) < SHINGLE:
+        return {zlib.crc32(' '.join(tokens).encode('utf-8'))} if tokens else set()
+    return {
+        zlib.crc32(' '.join(tokens[i:i + SHINGLE]).encode('utf-8'))
+        for i in range(len(tokens) - SHINGLE + 1)
+    }
+
+
+def signature(text: str) -> Optional[Tuple[int, ...]]:
+    hs = shingles(text)
+    if not hs:
+        return None
+    return tuple(min((a * h + b) % _PRIME for h in hs) & 0xFFFFFFFF for a, b in _PERMS)
+
+
+def similarity(a: Tuple[int, ...], b: Tuple[int, ...]) -> float:
+    """Estimated Jaccard similarity of the shingle sets behind two signatures."""
+    return sum(1 for x, y in zip(a, b) if x == y) / NUM_PERM
+
+
+def band_buckets(sig: Tuple[int, ...]) -> List[Tuple[int, int]]:
+    packed = _SIG.pack(*sig)
+    width = ROWS * 4
+    return [(band, zlib.crc32(packed[band * width:(band + 1) * width])) for band in range(BANDS)]
+
+
+def enable(cat: sqlite3.Connection) -> None:
+    cat.executescript(SCHEMA)
+    with cat:
+        cat.execute("INSERT OR REPLACE INTO meta(key, value) VALUES ('near_dup', '1')")
+
+
+def index_thread(cat: sqlite3.Connection, cid: str, grouped: Iterable[Dict[str, Any]]) -> bool:
+    """(Re)index one thread; returns False when it has no text to sign."""
+    sig = signature(thread_text(grouped))
+    with cat:
+        cat.execute('DELETE FROM near_dup_band WHERE cid = ?', (cid,))
+        if sig is None:
+            cat.execute('DELETE FROM near_dup_sig WHERE cid = ?', (cid,))
+            return False
+        cat.execute('INSERT OR REPLACE INTO near_dup_sig(cid, sig) VALUES (?, ?)', (cid, _SIG.pack(*sig)))
+        cat.executemany(
+            'INSERT OR IGNORE INTO near_dup_band(band, bucket, cid) VALUES (?, ?, ?)',
+            [(band, bucket, cid) for band, bucket in band_buckets(sig)],
+        )
+    return True
+
+
+def copy_thread(src: sqlite3.Connection, dest: sqlite3.Connection, cid: str) -> None:
+    """Carry a thread's signature over to another catalog that also has the index."""
+    row = src.execute('SELECT sig FROM near_dup_sig WHERE cid = ?', (cid,)).fetchone()
+    if row is None:
+        return
+    sig = _SIG.unpack(row[0])
+    with dest:
+        dest.execute('DELETE FROM near_dup_band WHERE cid = ?', (cid,))
+        dest.execute('INSERT OR REPLACE INTO near_dup_sig(cid, sig) VALUES (?, ?)', (cid, row[0]))
+        dest.executemany(
+            'INSERT OR IGNORE INTO near_dup_band(band, bucket, cid) VALUES (?, ?, ?)',
+            [(band, bucket, cid) for band, bucket in band_buckets(sig)],
+        )
+
+
+def _signatures(cat: sqlite3.Connection, cids: Iterable[str]) -> Dict[str, Tuple[int, ...]]:
+    out: Dict[str, Tuple[int, ...]] = {}
+    for cid in cids:
+        row = cat.execute('SELECT sig FROM near_dup_sig WHERE cid = ?', (cid,)).fetchone()
+        if row is not None:
+            out[cid] = _SIG.unpack(row[0])
+    return out
+
+
+def similar(cat: sqlite3.Connection, cid: str, threshold: float = DEFAULT_THRESHOLD) -> List[Tuple[str, float]]:
+    """Threads sharing an LSH bucket with cid whose estimated similarity reaches threshold."""
+    sigs = _signatures(cat, [cid])
+    if cid not in sigs:
+        return []
+    candidates = {
+        r[0] for band, bucket in band_buckets(sigs[cid])
+        for r in cat.execute(
+            'SELECT cid FROM near_dup_band WHERE band = ? AND bucket = ? AND cid != ?', (band, bucket, cid)
+        )
+    }
+    scored = [(other, similarity(sigs[cid], sig)) for other, sig in _signatures(cat, candidates).items()]
+    return sorted([s for s in scored if s[1] >= threshold], key=lambda s: (-s[1], s[0]))
+
+
+def clusters(cat: sqlite3.Connection, threshold: float = DEFAULT_THRESHOLD) -> List[List[str]]:
+    """Groups of near-duplicate cids (size >= 2), largest first.
+
+    Only threads that collide in some LSH band are compared, so the cost
+    follows the number of candidate pairs rather than all pairs.
+    """
+    parent: Dict[str, str] = {}
+
+    def find(x: str) -> str:
+        parent.setdefault(x, x)
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    checked: Set[Tuple[str, str]] = set()
+    sigs: Dict[str, Tuple[int, ...]] = {}
+    rows = cat.execute(
+        'SELECT group_concat(cid, char(10)) FROM near_dup_band GROUP BY band, bucket HAVING COUNT(*) > 1'
+    )
+    for (members,) in rows:
+        group = sorted(members.split('\n'))
+        missing = [c for c in group if c not in sigs]
+        sigs.update(_signatures(cat, missing))
+        for i, a in enumerate(group):
+            for b in group[i + 1:]:
+                if (a, b) in checked or find(a) == find(b):
+                    continue
+                checked.add((a, b))
+                if a in sigs and b in sigs and similarity(sigs[a], sigs[b]) >= threshold:
+                    parent[find(b)] = find(a)
+    groups: Dict[str, List[str]] = {}
+    for cid in parent:
+        groups.setdefault(find(cid), []).append(cid)
+    result = [sorted(g) for g in groups.values() if len(g) > 1]
+    return sorted(result, key=lambda g: (-len(g), g[0]))
+
+
+def prune(cat: sqlite3.Connection) -> int:
+    """Drop signatures of threads no longer listed in the catalog."""
+    with cat:
+        cat.execute('DELETE FROM near_dup_band WHERE cid NOT IN (SELECT cid FROM threads)')
+        return cat.execute('DELETE FROM near_dup_sig WHERE cid NOT IN (SELECT cid FROM threads)').rowcount
@@ -0,0 +1,120 @@
+import json
+import os
+import sys
+import time
+from typing import Any, Callable, Dict, Optional, TextIO
+
+from durable_io import atomic_write_text
+
+METRIC_PREFIX = 'cursor_history_export'
+
+
+class ExportProgress:
+    """Throughput/ETA bookkeeping for long exports.
+
+    Reports one JSON line to stderr every `interval` seconds and, when
+    metrics_path is set, rewrites a Prometheus textfile-collector file
+    (atomically) every `metrics_interval` seconds.
+    """
+
+    def __init__(
+        self,
+        total: int,
+        interval: float = 30.0,
+        metrics_path: Optional[str] = None,
+        metrics_interval: float = 15.0,
+        job: str = 'export',
+        stream: Optional[TextIO] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.total = total
+        self.interval = interval
+        self.metrics_path = metrics_path
+        self.metrics_interval = metrics_interval
+        self.job = job
+        self.stream = stream if stream is not None else sys.stderr
+        self.clock = clock
+        self.started = clock()
+        self.started_wall = time.time()
+        self.last_progress_wall = self.started_wall
+        self.exported = 0
+        self.skipped = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self._next_report = self.started + interval if interval > 0 else None
+        self._next_metrics = self.started if metrics_path else None
+
+    def thread_done(self, bytes_read: int, bytes_written: int = 0, skipped: bool = False) -> None:
+        if skipped:
+            self.skipped += 1
+        else:
+            self.exported += 1
+        self.bytes_read += bytes_read
+        self.bytes_written += bytes_written
+        self.last_progress_wall = time.time()
+        self.tick()
+
+    def tick(self) -> None:
+        now = self.clock()
+        if self._next_report is not None and now >= self._next_report:
+            self.report()
+            self._next_report = now + self.interval
+        if self._next_metrics is not None and now >= self._next_metrics:
+            self.write_metrics()
+            self._next_metrics = now + self.metrics_interval
+
+    def snapshot(self) -> Dict[str, Any]:
+        elapsed = max(self.clock() - self.started, 1e-9)
+        handled = self.exported + self.skipped
+        rate = handled / elapsed
+        remaining = max(self.total - handled, 0)
+        return {
+            'job': self.job,
+            'done': handled,
+            'exported': self.exported,
+            'skipped': self.skipped,
+            'total': self.total,
+            'remaining': remaining,
+            'elapsed_s': round(elapsed, 1),
+            'threads_per_s': round(rate, 2),
+            'read_mb_per_s': round(self.bytes_read / elapsed / 1e6, 3),
+            'written_mb_per_s': round(self.bytes_written / elapsed / 1e6, 3),
+            'eta_s': round(remaining / rate, 1) if rate > 0 else None,
+        }
+
+    def report(self) -> None:
+        self.stream.write('progress ' + json.dumps(self.snapshot(), ensure_ascii=False) + '\n')
+        self.stream.flush()
+
+    def write_metrics(self, running: bool = True) -> None:
+        if not self.metrics_path:
+            return
+        snap = self.snapshot()
+        label = f'{{job="{self.job}"}}'
+        lines = []
+
+        def metric(name: str, kind: str, help_text: str, value: Any, labels: str = label) -> None:
+            full = f'{METRIC_PREFIX}_{name}'
+            if not any(line.startswith(f'# TYPE {full} ') for line in lines):
+                lines.append(f'# HELP {full} {help_text}')
+                lines.append(f'# TYPE {full} {kind}')
+            lines.append(f'{full}{labels} {value}')
+
+        metric('threads_total', 'counter', 'Threads handled by this run.', self.exported, f'{{job="{self.job}",state="exported"}}')
+        metric('threads_total', 'counter', 'Threads handled by this run.', self.skipped, f'{{job="{self.job}",state="skipped"}}')
+        metric('threads_remaining', 'gauge', 'Threads left in the selected range.', snap['remaining'])
+        metric('read_bytes_total', 'counter', 'Bubble bytes read from state.vscdb.', self.bytes_read)
+        metric('written_bytes_total', 'counter', 'Bytes written to chat.yaml files.', self.bytes_written)
+        metric('threads_per_second', 'gauge', 'Average thread throughput of this run.', snap['threads_per_s'])
+        metric('eta_seconds', 'gauge', 'Estimated seconds to finish (-1 if unknown).', -1 if snap['eta_s'] is None else snap['eta_s'])
+        metric('start_time_seconds', 'gauge', 'Unix time the run started.', round(self.started_wall, 3))
+        metric('last_progress_time_seconds', 'gauge', 'Unix time the last thread finished.', round(self.last_progress_wall, 3))
+        metric('running', 'gauge', '1 while the run is in progress.', 1 if running else 0)
+        os.makedirs(os.path.dirname(os.path.abspath(self.metrics_path)), exist_ok=True)
+        atomic_write_text(self.metrics_path, '\n'.join(lines) + '\n')
+
+    def finish(self) -> Dict[str, Any]:
+        if self.interval > 0:
+            self.report()
+        self.write_metrics(running=False)
+        return self.snapshot()
@@ -0,0 +1,185 @@
+import argparse
+import json
+import re
+from typing import Any, Dict, List, Optional
+
+# Keywords whose assigned value is treated as a secret (KEY=..., "key": ...).
+_ASSIGNED = ('apikey', 'api[_-]key', 'secretkey', 'secret[_-]key', 'clientsecret', 'client[_-]secret',
+             'accesstoken', 'access[_-]token', 'authtoken', 'auth[_-]token', 'password', 'passwd')
+
+
+def _assignment_rule() -> str:
+    # Anchored on the ':'/'=' with fixed-width lookbehinds for the keyword, so
+    # the scan only stops at separators; the last keyword letter is checked first.
+    quotes = ('', '["\']', ' ', '["\'] ')
+    last = '|'.join(f'(?<=[dnty]{q}[:=])' for q in quotes)
+    keyword = '|'.join(f'(?<={k}{q}[:=])' for k in _ASSIGNED for q in quotes)
+    tail = rf'''(?i:{last})(?i:{keyword})\s*["']?([^\s"'`]{{8,}})'''
+    return f'={tail}|:{tail}'
+
+
+# name -> pattern. If a pattern has a capturing group only that part (of the
+# last group taking part in the match) is replaced by [REDACTED:<name>],
+# otherwise the whole match. Rules are joined
+# into one alternation, so every default rule starts with a literal character:
+# re then jumps between candidate positions instead of trying each rule at
+# every offset. For the same reason rules may not use global flags such as a
+# leading (?i) (use the scoped (?i:...)) or refer to groups by number (\1,
+# (?(1)...)): group numbers shift once rules are joined. Named groups work,
+# as long as no two rules use the same group name.
+DEFAULT_RULES: Dict[str, str] = {
+    'private_key': r'-----BEGIN (?:[A-Z]+ )*PRIVATE KEY-----[\s\S]*?-----END (?:[A-Z]+ )*PRIVATE KEY-----',
+    'aws_access_key': r'A(?:KIA|SIA)(?<![A-Za-z0-9]....)[0-9A-Z]{16}(?![0-9A-Za-z])',
+    'github_token': r'g(?:h[pousr]_[A-Za-z0-9]{36,}|ithub_pat_[A-Za-z0-9_]{40,})',
+    'openai_key': r'sk-(?<![A-Za-z0-9]sk-)(?:proj-|ant-)?[A-Za-z0-9_-]{20,}',
+    'slack_token': r'xox[abprs]-[A-Za-z0-9-]{10,}',
+    'google_api_key': r'AIza[0-9A-Za-z_-]{35}',
+    'jwt': r'eyJ[A-Za-z0-9_-]{8,}\.eyJ[A-Za-z0-9_-]{8,}\.[A-Za-z0-9_-]{8,}',
+    'bearer': r'earer(?<=[Bb]earer)\s+([A-Za-z0-9._~+/-]{20,}=*)',
+    'assignment': _assignment_rule(),
+}
+
+
+_GLOBAL_FLAGS = re.compile(r'\(\?[aiLmsux]+\)')
+_GROUP_CONDITION = re.compile(r'\(\?\(\d+\)')
+
+
+def unjoinable(pattern: str) -> Optional[str]:
+    """Why pattern cannot be part of the combined regex, or None if it can."""
+    i, n = 0, len(pattern)
+    in_class = False
+    while i < n:
+        c = pattern[i]
+        if c == '\\':
+            # \1-\99 refer to groups; a 0 or three octal digits make a character escape
+            ref = pattern[i + 1:i + 2]
+            if not in_class and ref.isdigit() and ref != '0' and not re.match(r'[0-7]{3}', pattern[i + 1:i + 4]):
+                return f'numbered backreference {pattern[i:i + 2]!r}'
+            i += 2
+        elif in_class:
+            in_class = c != ']'
+            i += 1
+        elif c == '[':
+            in_class = True
+            # a ']' right after '[' or '[^' is a literal
+            i += 2 if pattern.startswith(']', i + 1) else 3 if pattern.startswith('^]', i + 1) else 1
+        else:
+            for rx, what in ((_GLOBAL_FLAGS, 'global flags'), (_GROUP_CONDITION, 'group number condition')):
+                m = rx.match(pattern, i)
+                if m:
+                    return f'{what} {m.group()!r}'
+            i += 1
+    return None
+
+
+class Redactor:
+    """Replace secrets in message text using one combined regex (one pass per block).
+
+    The rule behind a hit is found by re-matching the rules at its position,
+    which only runs on hits, so the scan itself needs no group bookkeeping.
+    """
+
+    def __init__(self, rules: Optional[Dict[str, str]] = None) -> None:
+        self.rules = dict(DEFAULT_RULES if rules is None else rules)
+        self.compiled = []
+        owners: Dict[str, str] = {}
+        for name, p in self.rules.items():
+            why = unjoinable(p)
+            if why is not None:
+                raise ValueError(f'rule {name!r}: {why} (rules are combined into one regex)')
+            try:
+                rule = re.compile(p)
+            except re.error as e:
+                raise ValueError(f'rule {name!r}: {e}')
+            for group in rule.groupindex:
+                if group in owners:
+                    raise ValueError(f'rules {owners[group]!r} and {name!r} both define group {group!r}'
+                                     ' (rules are combined into one regex)')
+                owners[group] = name
+            self.compiled.append((name, rule))
+        # joined without wrapping groups: alternatives stay literal-first
+        try:
+            self.pattern = re.compile('|'.join(self.rules.values())) if self.rules else None
+        except re.error as e:
+            raise ValueError(f'rules cannot be combined into one regex: {e}')
+        self.totals: Dict[str, int] = {}
+        self.threads: Dict[str, Dict[str, int]] = {}
+
+    def redact(self, text: str, counts: Optional[Dict[str, int]] = None) -> str:
+        if self.pattern is None or not text:
+            return text
+        compiled = self.compiled
+
+        def repl(m: Any) -> str:
+            for name, rule in compiled:
+                r = rule.match(text, m.start())
+                if r is not None and r.end() == m.end():
+                    break
+            else:
+                return m.group()
+            if counts is not None:
+                counts[name] = counts.get(name, 0) + 1
+            if r.lastindex is None:
+                return f'[REDACTED:{name}]'
+            return text[m.start():r.start(r.lastindex)] + f'[REDACTED:{name}]' + text[r.end(r.lastindex):m.end()]
+
+        return self.pattern.sub(repl, text)
+
+    def redact_thread(self, cid: str, grouped: List[Dict[str, Any]]) -> Dict[str, int]:
+        """Redact grouped messages in place; returns (and records) the matches per rule."""
+        counts: Dict[str, int] = {}
+        for g in grouped:
+            g['texts'] = [self.redact(t, counts) for t in g['texts']]
+        if counts:
+            self.threads[cid] = counts
+            for name, n in counts.items():
+                self.totals[name] = self.totals.get(name, 0) + n
+        return counts
+
+    def merge(self, other: 'Redactor') -> None:
+        """Add the counts of another Redactor (e.g. one used by a worker thread)."""
+        self.threads.update(other.threads)
+        for name, n in other.totals.items():
+            self.totals[name] = self.totals.get(name, 0) + n
+
+    def summary(self) -> Dict[str, Any]:
+        return {'matches': dict(sorted(self.totals.items())), 'threads': self.threads}
+
+
+def load_rules(path: Optional[str]) -> Dict[str, str]:
+    """Default rules updated from a JSON object {name: pattern}; a null pattern disables a rule."""
+    rules = dict(DEFAULT_RULES)
+    if path:
+        with open(path, 'r', encoding='utf-8') as f:
+            extra = json.load(f)
+        if not isinstance(extra, dict):
+            raise ValueError(f'{path}: expected a JSON object of name -> pattern')
+        for name, pattern in extra.items():
+            if pattern is None:
+                rules.pop(name, None)
+            else:
+                try:
+                    re.compile(pattern)  # report bad rules by name before combining
+                except re.error as e:
+                    raise ValueError(f'{path}: rule {name!r}: {e}')
+                why = unjoinable(pattern)
+                if why is not None:
+                    raise ValueError(f'{path}: rule {name!r}: {why} (rules are combined into one regex)')
+                rules[name] = pattern
+    return rules
+
+
+def add_redaction_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('--redact', action='store_true', help='Replace API keys, tokens and other secrets with [REDACTED:<rule>]')
+    parser.add_argument('--redact-rules', metavar='JSON', help='JSON object {name: regex} added to the default rules (null disables a rule); implies --redact')
+
+
+def redactor_from_args(args: argparse.Namespace) -> Optional[Redactor]:
+    if not (args.redact or args.redact_rules):
+        return None
+    return Redactor(load_rules(args.redact_rules))
+
+
+def redact_head(redactor: Optional[Redactor], head: str) -> str:
+    # titles come from the first message and must not leak what the body hides
+    return head if redactor is None else redactor.redact(head)
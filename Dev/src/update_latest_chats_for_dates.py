@@ -1,34 +1,51 @@
 #!/usr/bin/env python3
 import argparse
-import subprocess
-import sys
+
+from chat_core import connect_db_readonly, default_db_path, default_flow_root, valid_date
+from chat_feed import new_run_id
+from update_latest_chat_per_date import rebuild_date
 
 
 def main() -> None:
+    from governor import add_budget_args, budget_from_args
+    from redaction import add_redaction_args, redactor_from_args
+
     parser = argparse.ArgumentParser(description='Rebuild chats for multiple dates (loop).')
-    parser.add_argument('--dates', nargs='+', required=True, help='List of dates YYYY-MM-DD')
+    parser.add_argument('--dates', nargs='+', required=True, type=valid_date, help='List of dates YYYY-MM-DD')
     parser.add_argument('--db', default=None, help='Optional DB path override')
     parser.add_argument('--flow', default=None, help='Optional Flow root override')
+    add_redaction_args(parser)
+    add_budget_args(parser, unit='date')
     args = parser.parse_args()
+    budget = budget_from_args(args)
+    try:
+        redactor = redactor_from_args(args)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
 
+    # One process and one read-only connection for all dates
+    conn = connect_db_readonly(args.db or default_db_path())
+    flow_root = args.flow or default_flow_root()
+    run_id = new_run_id()  # one run in the change feed for all dates
     updated = 0
     for d in args.dates:
-        cmd = [
-            sys.executable,
-            'update_latest_chat_per_date.py',
-            '--date', d,
-        ]
-        if args.db:
-            cmd += ['--db', args.db]
-        if args.flow:
-            cmd += ['--flow', args.flow]
-        print('Running:', ' '.join(cmd))
-        subprocess.run(cmd, check=False)
+        # a date is rebuilt as a whole, so the budget is checked between dates
+        if budget is not None and not budget.next():
+            break
+        try:
+            print(rebuild_date(conn, flow_root, d, redactor=redactor, run_id=run_id))
+        except Exception as e:
+            # keep going like the former per-date subprocess loop did
+            print({'date': d, 'error': str(e)})
         updated += 1
-    print({'dates_processed': updated})
+    conn.close()
+    summary = {'dates_processed': updated}
+    if budget is not None:
+        budget.finish()  # no-op after a stop
+        summary['budget'] = budget.summary()
+        summary['dates_remaining'] = args.dates[updated:]
+    print(summary)
 
 
 if __name__ == '__main__':
     main()
-
-
@@ -37,14 +37,19 @@ def mock_db(temp_dir):
             'key': 'composerData:test-thread-1',
             'value': json.dumps({
                 'createdAt': int(datetime(2025, 1, 15, 10, 30).timestamp() * 1000),
-                'title': 'Test Thread 1'
+                'title': 'Test Thread 1',
+                'fullConversationHeadersOnly': [
+                    {'bubbleId': 'bubble-1', 'type': 1},
+                    {'bubbleId': 'bubble-2', 'type': 2},
+                ],
             })
         },
         {
             'key': 'composerData:test-thread-2', 
             'value': json.dumps({
                 'createdAt': int(datetime(2025, 1, 15, 14, 45).timestamp() * 1000),
-                'title': 'Test Thread 2'
+                'title': 'Test Thread 2',
+                'fullConversationHeadersOnly': [{'bubbleId': 'bubble-1', 'type': 1}],
             })
         }
     ]
@@ -92,3 +97,83 @@ def output_dir(temp_dir):
     os.makedirs(output_path, exist_ok=True)
     return output_path
 
+@pytest.fixture
+def export_all():
+    """Return export(db, out, run_id=None): export every thread afresh and return {folder: chat.yaml text}."""
+    from export_cursor_history import connect_db_readonly, ensure_manifest, export_batch
+
+    def export(db, out, run_id=None):
+        os.makedirs(out, exist_ok=True)
+        manifest_path = os.path.join(out, 'export_manifest.json')
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+        conn = connect_db_readonly(db)
+        total = len(ensure_manifest(manifest_path, conn, order_desc=False)['items'])
+        export_batch(conn, out, manifest_path, 0, total, throttle=0, run_id=run_id)
+        conn.close()
+        texts = {}
+        for dirpath, _, files in os.walk(out):
+            if 'chat.yaml' in files:
+                with open(os.path.join(dirpath, 'chat.yaml'), encoding='utf-8') as f:
+                    texts[os.path.relpath(dirpath, out)] = f.read()
+        return texts
+
+    return export
+
+@pytest.fixture
+def exported(mock_db, output_dir, export_all):
+    """Output directory holding a fresh export of every mock_db thread."""
+    export_all(mock_db, output_dir)
+    return output_dir
+
+
+class QueryRecorder:
+    """Record statements issued on source DB connections and explain them afterwards."""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.statements = []
+
+    def attach(self, conn):
+        conn.set_trace_callback(self._record)
+        return conn
+
+    def _record(self, sql):
+        if sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+            self.statements.append(sql.strip())
+
+    def reset(self):
+        self.statements = []
+
+    def plans(self):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            return [
+                (sql, [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql)])
+                for sql in self.statements
+            ]
+        finally:
+            conn.close()
+
+    def full_scans(self):
+        return [
+            (sql, d) for sql, details in self.plans() for d in details
+            if d.startswith('SCAN ') and 'CONSTANT ROW' not in d
+        ]
+
+    def temp_sorts(self):
+        return [(sql, d) for sql, details in self.plans() for d in details if 'TEMP B-TREE' in d]
+
+
+@pytest.fixture
+def query_recorder(mock_db, monkeypatch):
+    """QueryRecorder bound to mock_db; use .patch(module, ...) to trace connections a module opens."""
+    recorder = QueryRecorder(mock_db)
+
+    def patch(*modules):
+        for module in modules:
+            real = module.connect_db_readonly
+            monkeypatch.setattr(module, 'connect_db_readonly', lambda p, real=real: recorder.attach(real(p)))
+
+    recorder.patch = patch
+    return recorder
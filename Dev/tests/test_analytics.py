@@ -0,0 +1,122 @@
+import json
+import os
+import sqlite3
+
+import pytest
+
+from chat_analytics import HEADER, aggregate, analytics_path, append_rows, build, load, report
+from chat_catalog import COLUMNS, forget_date, forget_folder, open_catalog, upsert_threads
+
+
+def grow(db, cid, *bubbles):
+    conn = sqlite3.connect(db)
+    key = f'composerData:{cid}'
+    value = json.loads(conn.execute('SELECT value FROM cursorDiskKV WHERE key = ?', (key,)).fetchone()[0])
+    for bid, role, text in bubbles:
+        value['fullConversationHeadersOnly'].append({'bubbleId': bid, 'type': role})
+        conn.execute('INSERT INTO cursorDiskKV VALUES (?, ?)',
+                     (f'bubbleId:{cid}:{bid}', json.dumps({'type': role, 'content': text})))
+    value['lastUpdatedAt'] = value.get('lastUpdatedAt', 0) + 1
+    conn.execute('UPDATE cursorDiskKV SET value = ? WHERE key = ?', (json.dumps(value), key))
+    conn.commit()
+    conn.close()
+
+
+def row(cid, date, messages, user_chars, assistant_chars=0):
+    return {'cid': cid, 'date': date, 'created_at_ms': 0, 'messages': messages, 'user_messages': messages,
+            'assistant_messages': 0, 'user_chars': user_chars, 'assistant_chars': assistant_chars, 'bytes': 100}
+
+
+class TestAnalytics:
+    """Test chat_analytics.bin upkeep and its aggregates."""
+
+    def test_export_keeps_the_file_up_to_date(self, mock_db, temp_dir, output_dir, export_all):
+        assert build(output_dir)['threads'] == 0
+        export_all(mock_db, output_dir)
+        first = report(output_dir)
+        assert first['periods'] == [{
+            'day': '2025-01-15', 'threads': 2, 'messages': 3, 'user_messages': 2, 'assistant_messages': 1,
+            'user_chars': len('Hello, this is a test message from user.') + len('Another test message.'),
+            'assistant_chars': len('Hello! This is a test response from assistant.'),
+        }]
+
+        # appended threads get the same metrics as a full rewrite
+        grow(mock_db, 'test-thread-1', ('bubble-3', 2, 'More.'), ('bubble-4', 1, 'Thanks!'))
+        export_all(mock_db, output_dir)
+        full = os.path.join(temp_dir, 'full')
+        os.makedirs(full)
+        build(full)
+        export_all(mock_db, full)
+        cat = open_catalog(output_dir)
+        assert cat.execute("SELECT tail_offset FROM threads WHERE cid = 'test-thread-1'").fetchone()[0]
+        cat.close()
+        appended, rewritten = report(output_dir), report(full)
+        assert appended['totals'] == rewritten['totals']
+        assert appended['totals']['assistant_chars'] == first['totals']['assistant_chars'] + len('More.')
+        assert appended['totals']['threads'] == 2
+
+        # build compacts the superseded records away
+        size = os.path.getsize(analytics_path(output_dir))
+        assert build(output_dir)['bytes'] < size
+        assert report(output_dir)['totals'] == appended['totals']
+
+    def test_threads_removed_from_the_catalog_stop_counting(self, output_dir):
+        cat = open_catalog(output_dir)
+        for folder, r in (('a', row('t1', '2025-09-01', 2, 10)), ('b', row('t2', '2025-09-02', 3, 20))):
+            upsert_threads(cat, dict(dict.fromkeys(COLUMNS), **r, folder=folder, created_at='', title20='', sha256=''))
+        build(output_dir)
+        assert report(output_dir)['totals']['threads'] == 2
+
+        assert forget_date(cat, '2025-09-01') == 1
+        for use_numpy in (True, False):
+            assert report(output_dir, use_numpy=use_numpy)['totals'] == {
+                'threads': 1, 'messages': 3, 'user_messages': 3, 'assistant_messages': 0,
+                'user_chars': 20, 'assistant_chars': 0,
+            }
+        # a thread written again after its tombstone counts again
+        append_rows(output_dir, [row('t1', '2025-09-01', 2, 10)])
+        assert report(output_dir)['totals']['threads'] == 2
+        forget_folder(cat, 'b')
+        cat.close()
+        assert [p['day'] for p in report(output_dir, use_numpy=False)['periods']] == ['2025-09-01']
+        assert build(output_dir)['threads'] == 0
+
+    def test_weeks_filters_and_percentiles(self, output_dir):
+        rows = [row(f't{i}', '2025-09-0%d' % (1 + i % 9), 1 + i, 10 * (i + 1)) for i in range(9)]
+        rows.append(row('t0', '2025-09-01', 100, 5))  # t0 again: its last record counts
+        append_rows(output_dir, rows)
+        with open(analytics_path(output_dir), 'ab') as f:
+            f.write(b'\0' * 20)  # a record cut short by a crash
+
+        table = load(output_dir, use_numpy=False)
+        assert len(table) == 9
+        weeks = aggregate(table, by='week')
+        # 2025-09-01 is a Monday
+        assert [(p['week'], p['threads']) for p in weeks['periods']] == [('2025-09-01', 7), ('2025-09-08', 2)]
+        assert weeks['totals']['messages'] == 100 + sum(range(2, 10))
+        assert weeks['thread_sizes']['messages'] == {'p50': 6, 'p90': 100, 'p99': 100, 'max': 100}
+
+        days = aggregate(table, since='2025-09-03', until='2025-09-04')
+        assert [(p['day'], p['user_chars']) for p in days['periods']] == [('2025-09-03', 30), ('2025-09-04', 40)]
+        with pytest.raises(ValueError, match='2025-13-01'):
+            aggregate(table, since='2025-13-01')
+
+    def test_numpy_and_array_agree(self, output_dir):
+        np = pytest.importorskip('numpy')
+        rows = [row(f't{i % 700}', '2025-%02d-%02d' % (1 + i % 12, 1 + i % 28), i % 37, i * 7 % 1001) for i in range(1000)]
+        append_rows(output_dir, rows)
+        with_numpy, plain = load(output_dir), load(output_dir, use_numpy=False)
+        assert with_numpy.engine == 'numpy' and plain.engine == 'array'
+        assert np.array_equal(with_numpy['cid_key'], np.array(plain['cid_key']))
+        for by in ('day', 'week'):
+            assert aggregate(with_numpy, by, since='2025-03-01') == aggregate(plain, by, since='2025-03-01')
+
+    def test_header_is_checked(self, output_dir):
+        with open(analytics_path(output_dir), 'wb') as f:
+            f.write(HEADER.pack(b'NOTMINE!', 9, 0))
+        with pytest.raises(ValueError):
+            load(output_dir)
+        with open(analytics_path(output_dir), 'wb') as f:
+            f.write(HEADER.pack(b'NOTMINE!', 9, 0)[:7])  # cut inside the header
+        with pytest.raises(ValueError, match='run build again'):
+            load(output_dir)
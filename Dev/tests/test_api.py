@@ -0,0 +1,69 @@
+import datetime
+import json
+import sqlite3
+
+import pytest
+
+from chat_api import Message, Thread, group_roles, iter_messages, iter_threads
+from export_cursor_history import connect_db_readonly, fetch_bubbles, group_messages_by_role
+
+
+class TestChatApi:
+    """Test the in-process generator API."""
+
+    def test_iter_threads_from_path(self, mock_db):
+        """Test threads come oldest first with headers, and the path is opened and closed by the generator."""
+        threads = list(iter_threads(mock_db))
+        assert [t.cid for t in threads] == ['test-thread-1', 'test-thread-2']
+        assert threads[0].bubble_ids == ['bubble-1', 'bubble-2']
+        assert threads[0].created_dt == '2025-01-15_10-30-00'
+        with pytest.raises(sqlite3.ProgrammingError):
+            threads[0].conn.execute('SELECT 1')
+
+    def test_since_until(self, mock_db):
+        """Test dates, datetimes and epoch ms bound the creation time."""
+        conn = connect_db_readonly(mock_db)
+        noon = datetime.datetime(2025, 1, 15, 12, 0)
+        assert [t.cid for t in iter_threads(conn, since=noon)] == ['test-thread-2']
+        assert [t.cid for t in iter_threads(conn, until=int(noon.timestamp() * 1000))] == ['test-thread-1']
+        assert list(iter_threads(conn, since=datetime.date(2025, 1, 16))) == []
+        conn.execute('SELECT 1')  # a passed-in connection stays open
+        conn.close()
+
+    def test_messages_match_writers(self, mock_db):
+        """Test messages are lazy slotted records that group exactly like the old tuple path."""
+        conn = connect_db_readonly(mock_db)
+        thread = next(iter_threads(conn))
+        messages = thread.messages()
+        assert thread.read_bytes == 0
+        first = next(messages)
+        assert isinstance(first, Message) and not hasattr(first, '__dict__')
+        assert (first.role, first.key) == ('user', 'bubbleId:test-thread-1:bubble-1')
+        assert group_roles([first] + list(messages)) == group_messages_by_role(fetch_bubbles(conn, thread.cid))
+        assert thread.read_bytes == sum(len(v) for _, v in fetch_bubbles(conn, thread.cid))
+        conn.close()
+
+    def test_read_bytes_counts_utf8_bytes(self, mock_db):
+        """Test that read_bytes counts stored bytes, not characters, for text and blob values."""
+        conn = sqlite3.connect(mock_db)
+        text = json.dumps({'type': 1, 'content': 'こんにちは'}, ensure_ascii=False)
+        conn.execute("UPDATE cursorDiskKV SET value = ? WHERE key = 'bubbleId:test-thread-2:bubble-1'", (text,))
+        conn.commit()
+        thread = Thread(conn, 'test-thread-2', 0, bubble_ids=['bubble-1'])
+        assert [m.text for m in iter_messages(thread)] == ['こんにちは']
+        assert thread.read_bytes == len(text.encode('utf-8')) > len(text)
+        conn.execute("UPDATE cursorDiskKV SET value = ? WHERE key = 'bubbleId:test-thread-2:bubble-1'", (text.encode('utf-8'),))
+        thread = Thread(conn, 'test-thread-2', 0, bubble_ids=['bubble-1'])
+        assert [m.text for m in iter_messages(thread)] == ['こんにちは']
+        assert thread.read_bytes == len(text.encode('utf-8'))
+        conn.close()
+
+    def test_fallback_scan_and_empty_bubbles(self, mock_db):
+        """Test threads without headers are read by key range and empty bubbles are skipped."""
+        conn = sqlite3.connect(mock_db)
+        conn.execute("INSERT INTO cursorDiskKV VALUES ('bubbleId:test-thread-2:bubble-0', ?)",
+                     (json.dumps({'type': 2, 'content': '  ', 'createdAt': 0}),))
+        conn.commit()
+        thread = Thread(conn, 'test-thread-2', 0, bubble_ids=[])
+        assert [(m.role, m.text) for m in iter_messages(thread)] == [('user', 'Another test message.')]
+        conn.close()
@@ -0,0 +1,239 @@
+import datetime
+import json
+import os
+import random
+import sqlite3
+
+import near_dup
+from chat_catalog import (
+    CATALOG_NAME,
+    abs_folder,
+    catalog_layout,
+    find_thread,
+    index_near_dups,
+    migrate_layout,
+    near_dup_clusters,
+    open_catalog,
+    threads_for_date,
+)
+from export_cursor_history import connect_db_readonly, ensure_manifest, export_batch
+from move_and_organize_chats import move_exported_to_flow, organize_chats_subfolders
+from update_standalone_chat_per_date import rebuild_date as standalone_rebuild
+
+
+class TestCatalog:
+    """Test the catalog maintained by the writers."""
+
+    def test_export_records_threads(self, exported):
+        """Test that export_batch records every written thread."""
+        assert os.path.exists(os.path.join(exported, CATALOG_NAME))
+        cat = open_catalog(exported)
+        rows = threads_for_date(cat, '2025-01-15')
+        assert len(rows) == 2
+        for row in rows:
+            yaml_file = os.path.join(abs_folder(exported, row['folder']), 'chat.yaml')
+            assert os.path.getsize(yaml_file) == row['bytes']
+            assert len(row['sha256']) == 64
+        by_cid = {r['cid']: r for r in rows}
+        assert by_cid['test-thread-1']['user_messages'] == 1
+        assert by_cid['test-thread-1']['assistant_messages'] == 1
+        cat.close()
+
+    def test_find_thread_by_prefix(self, exported):
+        """Test cid lookups by full id and by the 8-char folder prefix."""
+        cat = open_catalog(exported)
+        assert [r['cid'] for r in find_thread(cat, 'test-thread-2')] == ['test-thread-2']
+        assert len(find_thread(cat, 'test-thr')) == 2
+        assert find_thread(cat, 'nope') == []
+        cat.close()
+
+    def test_catalog_built_from_existing_tree(self, temp_dir):
+        """Test that opening a catalog over a legacy archive indexes it once."""
+        root = os.path.join(temp_dir, 'legacy')
+        folder = os.path.join(root, '2025-01-15_10-00-00_legacy_abcdef12')
+        os.makedirs(folder)
+        with open(os.path.join(folder, 'chat.yaml'), 'w', encoding='utf-8') as f:
+            f.write('---\nthreadId: "abcdef12-0000"\ncreated_at: "2025-01-15_10-00-00"\n'
+                    'title20: "legacy"\nmessages:\n  - role: "user"\n    content: |-\n      hi\n')
+        cat = open_catalog(root)
+        rows = threads_for_date(cat, '2025-01-15')
+        assert len(rows) == 1
+        assert rows[0]['cid'] == 'abcdef12-0000'
+        assert rows[0]['messages'] == 1
+        cat.close()
+
+    def test_move_to_flow_carries_catalog_rows(self, exported, temp_dir):
+        """Test that moving to Flow updates both catalogs."""
+        flow_root = os.path.join(temp_dir, 'Flow')
+        assert move_exported_to_flow(exported, flow_root)['moved'] == 2
+        organize_chats_subfolders(flow_root)
+
+        src_cat = open_catalog(exported)
+        assert threads_for_date(src_cat, '2025-01-15') == []
+        src_cat.close()
+
+        flow_cat = open_catalog(flow_root, 'flow')
+        rows = threads_for_date(flow_cat, '2025-01-15')
+        assert len(rows) == 2
+        for row in rows:
+            assert row['folder'].startswith('202501/2025-01-15/chats/')
+            assert os.path.isdir(abs_folder(flow_root, row['folder']))
+        flow_cat.close()
+
+    def test_move_to_flow_picks_up_uncataloged_folders(self, exported, temp_dir):
+        """Test that a folder copied in without a catalog row is indexed and moved too."""
+        folder = os.path.join(exported, '2025-01-16_09-00-00_copied_abcdef12')
+        os.makedirs(folder)
+        with open(os.path.join(folder, 'chat.yaml'), 'w', encoding='utf-8') as f:
+            f.write('---\nthreadId: "abcdef12-0000"\ncreated_at: "2025-01-16_09-00-00"\n'
+                    'title20: "copied"\nmessages:\n  - role: "user"\n    content: |-\n      hi\n')
+        flow_root = os.path.join(temp_dir, 'Flow')
+        assert move_exported_to_flow(exported, flow_root)['moved'] == 3
+        assert not os.path.exists(folder)
+
+        flow_cat = open_catalog(flow_root, 'flow')
+        rows = threads_for_date(flow_cat, '2025-01-16')
+        assert [(r['cid'], r['folder']) for r in rows] == [('abcdef12-0000', '202501/2025-01-16/2025-01-16_09-00-00_copied_abcdef12')]
+        assert len(threads_for_date(flow_cat, '2025-01-15')) == 2
+        flow_cat.close()
+
+    def test_standalone_rebuild_clears_uncataloged_folders(self, exported, mock_db):
+        """Test that a rebuild also replaces folders of the date that had no catalog row."""
+        folder = os.path.join(exported, '2025-01-15_09-00-00_old title_test-thr')
+        os.makedirs(folder)
+        with open(os.path.join(folder, 'chat.yaml'), 'w', encoding='utf-8') as f:
+            f.write('---\nthreadId: "test-thread-1"\ncreated_at: "2025-01-15_09-00-00"\n'
+                    'title20: "old title"\nmessages:\n  - role: "user"\n    content: |-\n      hi\n')
+        conn = connect_db_readonly(mock_db)
+        result = standalone_rebuild(conn, exported, '2025-01-15')
+        conn.close()
+        assert result['removed'] == 3 and result['created'] == 2
+        assert not os.path.exists(folder)
+        assert len([n for n in os.listdir(exported) if n.startswith('2025-01-15_')]) == 2
+        cat = open_catalog(exported)
+        assert sorted(r['cid'] for r in threads_for_date(cat, '2025-01-15')) == ['test-thread-1', 'test-thread-2']
+        cat.close()
+
+
+class TestShardedLayout:
+    """Test sharded output layouts and in-place migration."""
+
+    def test_export_with_date_layout(self, mock_db, output_dir):
+        """Test that a date-sharded root places folders under YYYY/MM/DD."""
+        manifest_path = os.path.join(output_dir, 'export_manifest.json')
+        conn = connect_db_readonly(mock_db)
+        ensure_manifest(manifest_path, conn, order_desc=True)
+        export_batch(conn, output_dir, manifest_path, 0, 2, layout='date')
+        conn.close()
+
+        shard = os.path.join(output_dir, '2025', '01', '15')
+        assert len([d for d in os.listdir(shard) if d.startswith('2025-01-15')]) == 2
+        assert not [d for d in os.listdir(output_dir) if d.startswith('2025-01-15')]
+
+    def test_migrate_flat_archive(self, exported):
+        """Test converting a flat archive to hash and then date layout in place."""
+        cat = open_catalog(exported)
+        before = {r['cid']: r['sha256'] for r in threads_for_date(cat, '2025-01-15')}
+
+        assert migrate_layout(cat, exported, 'hash') == {'moved': 2, 'missing': 0}
+        for row in threads_for_date(cat, '2025-01-15'):
+            assert len(row['folder'].split('/')[0]) == 2
+            assert os.path.isdir(abs_folder(exported, row['folder']))
+
+        migrate_layout(cat, exported, 'date')
+        assert catalog_layout(cat) == 'date'
+        rows = threads_for_date(cat, '2025-01-15')
+        assert {r['cid']: r['sha256'] for r in rows} == before
+        assert all(r['folder'].startswith('2025/01/15/') for r in rows)
+        # emptied hash shards are pruned
+        assert not [n for n in os.listdir(exported) if len(n) == 2]
+        cat.close()
+
+    def test_standalone_rebuild_in_sharded_root(self, mock_db, temp_dir):
+        """Test that the standalone rebuilder finds and replaces sharded folders."""
+        out_root = os.path.join(temp_dir, 'chat_history')
+        conn = connect_db_readonly(mock_db)
+        first = standalone_rebuild(conn, out_root, '2025-01-15', layout='hash')
+        second = standalone_rebuild(conn, out_root, '2025-01-15')
+        conn.close()
+        assert first['created'] == 2
+        assert second['removed'] == 2 and second['created'] == 2
+        cat = open_catalog(out_root)
+        assert len(threads_for_date(cat, '2025-01-15')) == 2
+        cat.close()
+
+
+def _add_thread(db_path, cid, created_ms, texts):
+    conn = sqlite3.connect(db_path)
+    headers = [{'bubbleId': f'b{i}'} for i in range(len(texts))]
+    conn.execute('INSERT INTO cursorDiskKV VALUES (?, ?)', (
+        f'composerData:{cid}', json.dumps({'createdAt': created_ms, 'fullConversationHeadersOnly': headers})))
+    conn.executemany('INSERT INTO cursorDiskKV VALUES (?, ?)', [
+        (f'bubbleId:{cid}:b{i}', json.dumps({'type': 1 + i % 2, 'content': t})) for i, t in enumerate(texts)
+    ])
+    conn.commit()
+    conn.close()
+
+
+class TestNearDuplicates:
+    """Test the MinHash/LSH near-duplicate index."""
+
+    WORDS = ('please refactor the export module so that every chat is written once and the manifest '
+             'records progress after each thread while errors are logged with the thread id ').split()
+
+    def _texts(self, seed):
+        rng = random.Random(seed)
+        return [' '.join(rng.choice(self.WORDS) + str(rng.randrange(50)) for _ in range(150)) for _ in range(2)]
+
+    def test_signature_similarity(self):
+        """Test that near-identical texts score high and unrelated ones low."""
+        a = ' '.join(self._texts(1))
+        b = a.replace(a.split()[40], 'changed', 1)
+        assert near_dup.similarity(near_dup.signature(a), near_dup.signature(b)) >= 0.8
+        assert near_dup.similarity(near_dup.signature(a), near_dup.signature(' '.join(self._texts(2)))) < 0.3
+        assert near_dup.signature('') is None
+
+    def test_export_updates_index_incrementally(self, mock_db, output_dir):
+        """Test that exported threads are signed and a retried thread clusters with its original."""
+        base = int(datetime.datetime(2025, 1, 16, 9, 0).timestamp() * 1000)
+        texts = self._texts(3)
+        retry = [texts[0], texts[1].replace(texts[1].split()[7], 'other', 1)]
+        _add_thread(mock_db, 'orig-thread', base, texts)
+        _add_thread(mock_db, 'retry-thread', base + 60000, retry)
+        _add_thread(mock_db, 'other-thread', base + 120000, self._texts(4))
+
+        cat = open_catalog(output_dir)
+        index_near_dups(cat, output_dir)
+        cat.close()
+
+        manifest_path = os.path.join(output_dir, 'export_manifest.json')
+        conn = connect_db_readonly(mock_db)
+        ensure_manifest(manifest_path, conn, order_desc=True)
+        export_batch(conn, output_dir, manifest_path, 0, 10)
+        conn.close()
+
+        cat = open_catalog(output_dir)
+        assert cat.execute('SELECT COUNT(*) FROM near_dup_sig').fetchone()[0] == 5
+        assert near_dup.clusters(cat) == [['orig-thread', 'retry-thread']]
+        assert [c for c, _ in near_dup.similar(cat, 'retry-thread')] == ['orig-thread']
+        groups = near_dup_clusters(cat, near_dup.DEFAULT_THRESHOLD)
+        assert sorted(r['cid'] for r in groups[0]) == ['orig-thread', 'retry-thread']
+        cat.close()
+
+    def test_backfill_and_move_to_flow(self, exported, temp_dir):
+        """Test building the index from existing files and carrying it into Flow."""
+        cat = open_catalog(exported)
+        assert index_near_dups(cat, exported) == {'indexed': 2, 'pruned': 0}
+        assert index_near_dups(cat, exported)['indexed'] == 0
+        cat.close()
+
+        flow_root = os.path.join(temp_dir, 'Flow')
+        flow_cat = open_catalog(flow_root, 'flow')
+        near_dup.enable(flow_cat)
+        flow_cat.close()
+        move_exported_to_flow(exported, flow_root)
+
+        flow_cat = open_catalog(flow_root, 'flow')
+        cids = [r[0] for r in flow_cat.execute('SELECT cid FROM near_dup_sig ORDER BY cid')]
+        assert cids == ['test-thread-1', 'test-thread-2']
+        flow_cat.close()
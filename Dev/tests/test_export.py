@@ -1,10 +1,14 @@
+import io
 import os
 import json
+import sqlite3
 import yaml
 import pytest
+from datetime import datetime
 from unittest.mock import patch, MagicMock
 
 # Import functions to test
+from progress import ExportProgress
 from export_cursor_history import (
     connect_db_readonly, 
     fetch_all_threads, 
@@ -13,7 +17,8 @@ from export_cursor_history import (
     derive_title20,
     write_yaml,
     ensure_manifest,
-    export_batch
+    export_batch,
+    select_threads,
 )
 
 class TestDatabaseFunctions:
@@ -54,6 +59,71 @@ class TestDatabaseFunctions:
         assert 'Hello! This is a test response from assistant.' in bubble_contents
         conn.close()
 
+    def test_fetch_bubbles_follows_headers(self, mock_db):
+        """Test that the composerData header order wins over createdAt."""
+        conn = sqlite3.connect(mock_db)
+        conn.execute(
+            "INSERT INTO cursorDiskKV VALUES ('composerData:ordered', ?)",
+            (json.dumps({'createdAt': 1, 'fullConversationHeadersOnly': [
+                {'bubbleId': 'b'}, {'bubbleId': 'a'}, {'bubbleId': 'gone'}, {'bubbleId': 'c'}]}),),
+        )
+        conn.executemany('INSERT INTO cursorDiskKV VALUES (?, ?)', [
+            ('bubbleId:ordered:a', json.dumps({'type': 2, 'content': 'A', 'createdAt': 5})),
+            ('bubbleId:ordered:b', json.dumps({'type': 1, 'content': 'B', 'createdAt': 9})),
+            ('bubbleId:ordered:c', json.dumps({'type': 1, 'content': 'C'})),
+        ])
+        conn.commit()
+        conn.close()
+
+        conn = connect_db_readonly(mock_db)
+        assert [k for k, _ in fetch_bubbles(conn, 'ordered')] == [
+            'bubbleId:ordered:b', 'bubbleId:ordered:a', 'bubbleId:ordered:c']
+        conn.close()
+
+    def test_fetch_bubbles_without_headers(self, mock_db):
+        """Test the range-scan fallback for threads whose composerData has no header list."""
+        conn = sqlite3.connect(mock_db)
+        conn.execute("INSERT INTO cursorDiskKV VALUES ('composerData:old', ?)", (json.dumps({'createdAt': 1}),))
+        conn.executemany('INSERT INTO cursorDiskKV VALUES (?, ?)', [
+            ('bubbleId:old:x', json.dumps({'type': 2, 'content': 'later', 'createdAt': 20})),
+            ('bubbleId:old:y', json.dumps({'type': 1, 'content': 'first', 'createdAt': 10})),
+        ])
+        conn.commit()
+        conn.close()
+
+        conn = connect_db_readonly(mock_db)
+        assert [k for k, _ in fetch_bubbles(conn, 'old')] == ['bubbleId:old:y', 'bubbleId:old:x']
+        conn.close()
+
+class TestThreadFilters:
+    """Test SQL-side thread selection filters."""
+
+    def _ms(self, *args):
+        return int(datetime(*args).timestamp() * 1000)
+
+    def test_date_range(self, mock_db):
+        """Test --since/--until style createdAt bounds."""
+        conn = connect_db_readonly(mock_db)
+        assert [c for c, _ in select_threads(conn, False, since_ms=self._ms(2025, 1, 15, 12))] == ['test-thread-2']
+        assert [c for c, _ in select_threads(conn, False, until_ms=self._ms(2025, 1, 15, 12))] == ['test-thread-1']
+        assert select_threads(conn, False, since_ms=self._ms(2025, 1, 16)) == []
+        conn.close()
+
+    def test_cid_point_lookups(self, mock_db):
+        """Test selecting explicit cids, ignoring unknown ones and duplicates."""
+        conn = connect_db_readonly(mock_db)
+        threads = select_threads(conn, True, cids=['test-thread-1', 'missing', 'test-thread-1'])
+        assert [c for c, _ in threads] == ['test-thread-1']
+        conn.close()
+
+    def test_bubble_count_and_size(self, mock_db):
+        """Test --min-messages and --max-bytes over the bubble key range."""
+        conn = connect_db_readonly(mock_db)
+        assert [c for c, _ in select_threads(conn, True, min_messages=2)] == ['test-thread-1']
+        assert [c for c, _ in select_threads(conn, True, max_bytes=150)] == ['test-thread-2']
+        conn.close()
+
+
 class TestMessageProcessing:
     """Test message processing and formatting functions."""
     
@@ -168,6 +238,17 @@ class TestManifestOperations:
         
         conn.close()
 
+    def test_manifest_records_only_active_filters(self, mock_db, output_dir):
+        """Test that an unfiltered run (all filters None, as main() passes them) stores no filter set."""
+        conn = connect_db_readonly(mock_db)
+        plain = ensure_manifest(os.path.join(output_dir, 'a.json'), conn, order_desc=True,
+                                filters={'since_ms': None, 'cids': None})
+        only = ensure_manifest(os.path.join(output_dir, 'b.json'), conn, order_desc=True,
+                               filters={'since_ms': None, 'cids': ['test-thread-2']})
+        conn.close()
+        assert 'filters' not in plain
+        assert only['filters'] == {'cids': ['test-thread-2']} and only['total'] == 1
+
 class TestExportBatch:
     """Test batch export functionality."""
     
@@ -218,6 +299,57 @@ class TestExportBatch:
         
         conn.close()
 
+    def test_export_batch_progress(self, mock_db, output_dir):
+        """Test progress lines on the stream and the Prometheus textfile."""
+        manifest_path = os.path.join(output_dir, 'export_manifest.json')
+        metrics_path = os.path.join(output_dir, 'metrics', 'export.prom')
+        conn = connect_db_readonly(mock_db)
+        ensure_manifest(manifest_path, conn, order_desc=True)
+
+        ticks = iter(range(1000))
+        stream = io.StringIO()
+        progress = ExportProgress(0, interval=1.0, metrics_path=metrics_path,
+                                  stream=stream, clock=lambda: float(next(ticks)))
+        export_batch(conn, output_dir, manifest_path, 0, 2, progress=progress)
+        conn.close()
+        final = progress.finish()
+
+        lines = [json.loads(l.split(' ', 1)[1]) for l in stream.getvalue().splitlines()]
+        assert lines[0]['total'] == 2 and lines[0]['done'] == 1 and lines[0]['eta_s'] is not None
+        assert final['done'] == 2 and final['remaining'] == 0 and final['skipped'] == 0
+
+        with open(metrics_path, 'r', encoding='utf-8') as f:
+            metrics = f.read()
+        assert 'cursor_history_export_threads_total{job="export",state="exported"} 2' in metrics
+        assert 'cursor_history_export_running{job="export"} 0' in metrics
+        written = [l for l in metrics.splitlines() if l.startswith('cursor_history_export_written_bytes_total')]
+        assert int(written[0].split()[-1]) > 0
+        assert not os.path.exists(metrics_path + '.tmp')
+
+    def test_failed_batch_releases_its_locks(self, mock_db, output_dir):
+        """Test that an exception mid-batch releases the locks a later batch needs."""
+        import threading
+        import file_lock
+
+        manifest_path = os.path.join(output_dir, 'export_manifest.json')
+        conn = connect_db_readonly(mock_db)
+        ensure_manifest(manifest_path, conn, order_desc=False)
+        with patch('export_cursor_history.write_yaml', side_effect=OSError('disk full')):
+            with pytest.raises(OSError):
+                export_batch(conn, output_dir, manifest_path, 0, 2, throttle=0)
+        assert not file_lock._held
+
+        # the same root and date from another thread of this process
+        result = []
+        worker = threading.Thread(target=lambda: result.append(
+            export_batch(connect_db_readonly(mock_db), output_dir, manifest_path, 0, 2, throttle=0)))
+        worker.start()
+        worker.join(timeout=30)
+        conn.close()
+        assert not worker.is_alive()
+        assert result == [(2, 0)]
+
+
 class TestIntegration:
     """Integration tests for the full export process."""
     
@@ -256,3 +388,387 @@ class TestIntegration:
                        if os.path.isdir(os.path.join(output_dir, d)) and d.startswith('2025-01-15')]
         assert len(chat_folders) == 2
 
+    def test_main_function_cid_filter(self, mock_db, output_dir, capsys):
+        """Test that a filtered export uses its own manifest and only the selection."""
+        test_args = [
+            'export_cursor_history.py',
+            '--db', mock_db,
+            '--out', output_dir,
+            '--all',
+            '--cid', 'test-thread-2',
+        ]
+
+        with patch('sys.argv', test_args):
+            from export_cursor_history import main
+            main()
+
+        output_json = json.loads(capsys.readouterr().out)
+        assert output_json['total_threads'] == 1
+        assert output_json['processed'] == 1
+        assert os.path.basename(output_json['manifest']) != 'export_manifest.json'
+        assert not os.path.exists(os.path.join(output_dir, 'export_manifest.json'))
+
+
+
+CRASH_SCRIPT = r'''
+import os, sys
+sys.path.insert(0, sys.argv[1])
+from export_cursor_history import connect_db_readonly, ensure_manifest, export_batch
+db, out = sys.argv[2], sys.argv[3]
+manifest_path = os.path.join(out, 'export_manifest.json')
+conn = connect_db_readonly(db)
+ensure_manifest(manifest_path, conn, order_desc=True)
+real_replace = os.replace
+calls = []
+def dying_replace(src, dst):
+    calls.append(dst)
+    if len(calls) == 2:
+        os._exit(9)  # simulate a crash in the middle of a commit group
+    real_replace(src, dst)
+os.replace = dying_replace
+export_batch(conn, out, manifest_path, 0, 2, durable=True, fsync_every=2)
+'''
+
+
+class TestDurability:
+    """Test crash consistency of --durable exports."""
+
+    def _yaml_files(self, root):
+        found = []
+        for dirpath, _, files in os.walk(root):
+            found += [os.path.join(dirpath, f) for f in files if f.startswith('chat.yaml')]
+        return found
+
+    def test_crash_mid_batch_then_resume(self, mock_db, output_dir):
+        """Kill the exporter mid-group and check that resume leaves no partial files."""
+        import subprocess
+        import sys
+        src = os.path.join(os.path.dirname(__file__), '..', 'src')
+        proc = subprocess.run([sys.executable, '-c', CRASH_SCRIPT, src, mock_db, output_dir])
+        assert proc.returncode == 9
+
+        # The crash happened before the checkpoint: a tmp file is left over,
+        # nothing is marked processed, and every chat.yaml that exists is complete.
+        assert any(p.endswith('.tmp') for p in self._yaml_files(output_dir))
+        with open(os.path.join(output_dir, 'export_manifest.json'), 'r', encoding='utf-8') as f:
+            assert not any(it['processed'] for it in json.load(f)['items'])
+        for p in self._yaml_files(output_dir):
+            if p.endswith('chat.yaml'):
+                with open(p, 'r', encoding='utf-8') as f:
+                    assert 'threadId' in yaml.safe_load(f)
+
+        manifest_path = os.path.join(output_dir, 'export_manifest.json')
+        conn = connect_db_readonly(mock_db)
+        done, skipped = export_batch(conn, output_dir, manifest_path, 0, 2, durable=True, fsync_every=2)
+        conn.close()
+        assert done == 2
+
+        files = self._yaml_files(output_dir)
+        assert len(files) == 2
+        assert all(p.endswith('chat.yaml') for p in files)
+        assert not os.path.exists(os.path.join(output_dir, '.durable_journal'))
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            assert all(it['processed'] for it in json.load(f)['items'])
+
+
+class TestShardedExport:
+    """Test --shard partitioning, per-shard checkpoints and merging."""
+
+    def test_shards_partition_and_merge(self, mock_db, output_dir, capsys):
+        """Run every shard concurrently, then merge their checkpoints."""
+        import subprocess
+        import sys
+        script = os.path.join(os.path.dirname(__file__), '..', 'src', 'export_cursor_history.py')
+        procs = [
+            subprocess.Popen([sys.executable, script, '--db', mock_db, '--out', output_dir, '--all', '--shard', f'{k}/3'],
+                             stdout=subprocess.PIPE)
+            for k in range(3)
+        ]
+        summaries = [json.loads(p.communicate()[0]) for p in procs]
+        assert all(p.returncode == 0 for p in procs)
+        assert sum(s['processed'] for s in summaries) == 2
+        assert sorted(s['shard'] for s in summaries) == ['0/3', '1/3', '2/3']
+
+        with patch('sys.argv', ['export_cursor_history.py', '--db', mock_db, '--out', output_dir, '--merge-shards', '3']):
+            from export_cursor_history import main
+            main()
+        merged = json.loads(capsys.readouterr().out)
+        assert merged['total_threads'] == 2
+        assert merged['processed'] == 2
+        assert merged['remaining'] == 0
+        with open(os.path.join(output_dir, 'export_manifest.json'), 'r', encoding='utf-8') as f:
+            assert all(it['processed'] for it in json.load(f)['items'])
+
+        chat_folders = [d for d in os.listdir(output_dir)
+                        if os.path.isdir(os.path.join(output_dir, d)) and d.startswith('2025-01-15')]
+        assert len(chat_folders) == 2
+
+    def test_date_lock_blocks_other_process(self, output_dir):
+        """Test that a date lock held by another process is seen as busy."""
+        import subprocess
+        import sys
+        from file_lock import date_lock
+        src = os.path.join(os.path.dirname(__file__), '..', 'src')
+        holder = subprocess.Popen(
+            [sys.executable, '-c',
+             'import sys; sys.path.insert(0, sys.argv[1]); from file_lock import date_lock; '
+             'lk = date_lock(sys.argv[2], "2025-01-15"); lk.acquire(); print("locked", flush=True); sys.stdin.read()',
+             src, output_dir],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+        )
+        try:
+            assert holder.stdout.readline().strip() == 'locked'
+            assert not date_lock(output_dir, '2025-01-15').acquire(blocking=False)
+            other = date_lock(output_dir, '2025-01-16')
+            assert other.acquire(blocking=False)
+            other.release()
+        finally:
+            holder.communicate('')
+        lk = date_lock(output_dir, '2025-01-15')
+        assert lk.acquire(blocking=False)
+        lk.release()
+
+
+class TestRecentFirst:
+    """Test --recent-days with the low-priority --backfill."""
+
+    @pytest.fixture
+    def db_with_recent(self, mock_db):
+        import time
+        now_ms = int(time.time() * 1000)
+        conn = sqlite3.connect(mock_db)
+        conn.execute("INSERT INTO cursorDiskKV VALUES ('composerData:recent-thread', ?)",
+                     (json.dumps({'createdAt': now_ms - 3600 * 1000, 'fullConversationHeadersOnly': [{'bubbleId': 'b'}]}),))
+        conn.execute("INSERT INTO cursorDiskKV VALUES ('bubbleId:recent-thread:b', ?)",
+                     (json.dumps({'type': 1, 'content': 'What did I ask yesterday?'}),))
+        conn.commit()
+        conn.close()
+        os.utime(mock_db, (0, 0))  # the DB looks idle to --backfill
+        return mock_db
+
+    def test_recent_then_background_backfill(self, db_with_recent, output_dir, capsys):
+        """Test that recent threads come first and the rest is left to a detached backfill."""
+        from export_cursor_history import main
+        argv = ['export_cursor_history.py', '--db', db_with_recent, '--out', output_dir, '--recent-days', '7']
+        with patch('sys.argv', argv), patch('backfill.spawn_backfill', return_value={'pid': 1}) as spawn:
+            main()
+        summary = json.loads(capsys.readouterr().out)
+        assert summary['recent'] == {'days': 7.0, 'processed': 1, 'skipped': 0, 'remaining': 2}
+        child_argv = spawn.call_args[0][1]
+        assert '--backfill' in child_argv and '--recent-days' not in child_argv
+
+        with patch('sys.argv', ['export_cursor_history.py'] + child_argv + ['--slice-size', '1', '--quiet-seconds', '60']), \
+                patch('backfill.lower_priority', return_value={'nice': 10}) as lower:
+            main()
+        backfill = json.loads(capsys.readouterr().out)['backfill']
+        lower.assert_called_once()
+        assert backfill['processed'] == 2 and backfill['slices'] == 2
+        with open(os.path.join(output_dir, 'export_manifest.json'), 'r', encoding='utf-8') as f:
+            assert all(it['processed'] for it in json.load(f)['items'])
+
+    def test_wait_for_quiet(self, temp_dir):
+        """Test that the backfill waits until the DB has been idle long enough."""
+        from backfill import wait_for_quiet
+        db = os.path.join(temp_dir, 'state.vscdb')
+        open(db, 'w').close()
+        os.utime(db, (1000, 1000))
+        clock = [1005.0]
+        sleeps = []
+
+        def sleep(s):
+            sleeps.append(s)
+            clock[0] += s
+
+        assert wait_for_quiet(db, 12, poll_s=5, clock=lambda: clock[0], sleep=sleep) == 7
+        assert sleeps == [5, 2]
+
+
+class TestAppendMode:
+    """Test that re-exporting a grown thread rewrites only the tail of chat.yaml."""
+
+    def grow(self, db, cid, *bubbles, headers=None):
+        conn = sqlite3.connect(db)
+        key = f'composerData:{cid}'
+        value = json.loads(conn.execute('SELECT value FROM cursorDiskKV WHERE key = ?', (key,)).fetchone()[0])
+        for bid, role, text in bubbles:
+            value['fullConversationHeadersOnly'].append({'bubbleId': bid, 'type': role})
+            conn.execute('INSERT OR REPLACE INTO cursorDiskKV VALUES (?, ?)',
+                         (f'bubbleId:{cid}:{bid}', json.dumps({'type': role, 'content': text})))
+        if headers is not None:
+            value['fullConversationHeadersOnly'] = headers
+        value['lastUpdatedAt'] = value.get('lastUpdatedAt', 0) + 1
+        conn.execute('UPDATE cursorDiskKV SET value = ? WHERE key = ?', (json.dumps(value), key))
+        conn.commit()
+        conn.close()
+
+    def export(self, db, out, **kwargs):
+        os.makedirs(out, exist_ok=True)
+        manifest_path = os.path.join(out, 'export_manifest.json')
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)  # what --rescan does
+        conn = connect_db_readonly(db)
+        ensure_manifest(manifest_path, conn, order_desc=False)
+        export_batch(conn, out, manifest_path, 0, 2, **kwargs)
+        conn.close()
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return {it['cid']: it for it in json.load(f)['items']}
+
+    def chat(self, item):
+        with open(os.path.join(item['folder'], 'chat.yaml'), 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def test_append_matches_full_rewrite(self, mock_db, output_dir, temp_dir):
+        """Test appended output equals a full export, costs only the tail and keeps verify quiet."""
+        from chat_catalog import file_digest, find_thread, open_catalog
+        from chat_verify import verify
+        self.grow(mock_db, 'test-thread-1', ('bubble-0', 1, 'x' * 200000), ('bubble-0b', 2, 'Ok.'))  # a large thread
+        first = self.export(mock_db, output_dir)['test-thread-1']
+        size = os.path.getsize(os.path.join(first['folder'], 'chat.yaml'))
+
+        self.grow(mock_db, 'test-thread-1', ('bubble-3', 2, 'And one more thing.'), ('bubble-4', 1, 'Thanks!'))
+        item = self.export(mock_db, output_dir)['test-thread-1']
+        full = self.export(mock_db, os.path.join(temp_dir, 'full'), append=False)['test-thread-1']
+        assert 0 < item['appended'] < 1000 and 'appended' not in full
+        assert self.chat(item) == self.chat(full)
+        assert os.path.getsize(os.path.join(item['folder'], 'chat.yaml')) > size
+
+        cat = open_catalog(output_dir)
+        row = find_thread(cat, 'test-thread-1')[0]
+        cat.close()
+        assert (row['messages'], row['user_messages'], row['assistant_messages']) == (5, 3, 2)
+        assert row['sha256'] == file_digest(os.path.join(item['folder'], 'chat.yaml'))[1] and row['tail_from'] == 'bubble-4'
+        conn = connect_db_readonly(mock_db)
+        assert verify(conn, output_dir)['ok']
+        os.utime(os.path.join(item['folder'], 'chat.yaml'), ns=(0, 0))
+        report = verify(conn, output_dir)
+        conn.close()
+        assert report['ok'] and report['hashed'] == 1
+
+    def test_unchanged_thread_is_not_written(self, mock_db, output_dir):
+        """Test a re-export of unchanged threads writes nothing."""
+        first = self.export(mock_db, output_dir)
+        mtimes = {cid: os.stat(os.path.join(it['folder'], 'chat.yaml')).st_mtime_ns for cid, it in first.items()}
+        again = self.export(mock_db, output_dir)
+        assert {cid: it['appended'] for cid, it in again.items()} == {'test-thread-1': 0, 'test-thread-2': 0}
+        assert {cid: os.stat(os.path.join(it['folder'], 'chat.yaml')).st_mtime_ns for cid, it in again.items()} == mtimes
+
+    def test_changed_prefix_rewrites_in_full(self, mock_db, output_dir):
+        """Test that removed earlier bubbles or a touched file fall back to a full rewrite."""
+        self.export(mock_db, output_dir)
+        self.grow(mock_db, 'test-thread-1', headers=[{'bubbleId': 'bubble-2', 'type': 2}])
+        item = self.export(mock_db, output_dir)['test-thread-1']
+        assert 'appended' not in item
+        assert 'test message from user' not in self.chat(item)
+
+        with open(os.path.join(item['folder'], 'chat.yaml'), 'a', encoding='utf-8') as f:
+            f.write('# edited by hand\n')
+        self.grow(mock_db, 'test-thread-1', ('bubble-3', 1, 'Next question.'))
+        item = self.export(mock_db, output_dir)['test-thread-1']
+        assert 'appended' not in item and '# edited by hand' not in self.chat(item)
+
+
+class TestBudget:
+    """Test --time-budget / --max-rss runs stop at a checkpoint and leave the rest for the next run."""
+
+    def run(self, db, out, budget):
+        manifest_path = os.path.join(out, 'export_manifest.json')
+        conn = connect_db_readonly(db)
+        ensure_manifest(manifest_path, conn, order_desc=False)
+        done = export_batch(conn, out, manifest_path, 0, 2, budget=budget)[0]
+        conn.close()
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return done, [it['processed'] for it in json.load(f)['items']]
+
+    def test_time_budget_resumes(self, mock_db, output_dir):
+        """Test a run stops before the next thread would overrun and the next run picks up the rest."""
+        from governor import Budget
+        ticks = iter(range(1000))
+        budget = Budget(time_budget=4, clock=lambda: float(next(ticks)), rss=lambda: None)
+        # every clock read is one second: the first thread takes 1 s, after it 4 s + 1 s would not fit
+        assert self.run(mock_db, output_dir, budget) == (1, [True, False])
+        assert budget.summary()['stopped'] == 'time' and budget.units == 1
+        assert self.run(mock_db, output_dir, Budget(time_budget=60)) == (1, [True, True])
+
+    def test_max_rss(self, mock_db, output_dir):
+        """Test the run stops once the next thread's expected growth would pass the ceiling."""
+        from governor import Budget
+        sizes = iter([10, 10, 10, 15, 18])  # start, check, first thread 10 -> 15 MB, check 18 + 5 > 20
+        budget = Budget(max_rss_mb=20, rss=lambda: next(sizes) * 1024 * 1024)
+        assert self.run(mock_db, output_dir, budget) == (1, [True, False])
+        assert budget.summary()['stopped'] == 'rss' and budget.summary()['peak_rss_mb'] == 15
+
+
+class TestFormats:
+    """Test extra output formats written from the same decoded threads."""
+
+    def test_fan_out_single_read(self, mock_db, output_dir, query_recorder):
+        """Test NDJSON and Markdown match chat.yaml and cost no extra DB statements."""
+        from chat_formats import open_writers
+        from chat_reader import load_chat
+        manifest_path = os.path.join(output_dir, 'export_manifest.json')
+        conn = connect_db_readonly(mock_db)
+        ensure_manifest(manifest_path, conn, order_desc=False)
+        query_recorder.attach(conn)
+        writers = open_writers(['ndjson', 'markdown', 'ndjson'], output_dir, 'run1')
+        export_batch(conn, output_dir, manifest_path, 0, 2, durable=True, fsync_every=1, writers=writers)
+        conn.close()
+        assert len(query_recorder.statements) == 3  # the same as for chat.yaml alone
+        ndjson, markdown = writers
+        with open(ndjson.path, 'r', encoding='utf-8') as f:
+            lines = [json.loads(line) for line in f]  # flushed at the durable checkpoints
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            folders = [it['folder'] for it in json.load(f)['items']]
+        assert lines == [load_chat(os.path.join(folder, 'chat.yaml')) for folder in folders]
+        for w in writers:
+            w.close()
+        page = os.path.join(markdown.dir, '2025-01-15', os.path.basename(folders[1]) + '.md')
+        with open(page, 'r', encoding='utf-8') as f:
+            assert f.read().endswith('\n## user\n\nAnother test message.\n')
+        assert markdown.summary()['threads'] == ndjson.summary()['threads'] == 2
+
+    def test_markdown_page_follows_a_rename(self, mock_db, output_dir):
+        """Test that a thread whose title changed leaves no page under its old folder name."""
+        from chat_formats import open_writers
+        manifest_path = os.path.join(output_dir, 'export_manifest.json')
+
+        def export():
+            if os.path.exists(manifest_path):
+                os.remove(manifest_path)
+            conn = connect_db_readonly(mock_db)
+            ensure_manifest(manifest_path, conn, order_desc=False)
+            writers = open_writers(['markdown'], output_dir, 'run')
+            export_batch(conn, output_dir, manifest_path, 0, 2, throttle=0, writers=writers)
+            conn.close()
+            return sorted(os.listdir(os.path.join(writers[0].dir, '2025-01-15')))
+
+        before = export()
+        db = sqlite3.connect(mock_db)
+        db.execute("UPDATE cursorDiskKV SET value = ? WHERE key = 'bubbleId:test-thread-2:bubble-1'",
+                   (json.dumps({'type': 1, 'content': 'Renamed question.'}),))
+        db.commit()
+        db.close()
+        after = export()
+        assert len(before) == len(after) == 2
+        assert [p for p in after if p not in before] == [p for p in after if 'Renamed question' in p]
+
+    def test_registry(self, output_dir):
+        """Test a registered format is selectable and unknown names are rejected."""
+        from chat_formats import FORMATS, Writer, open_writers, register
+
+        @register('titles')
+        class TitleWriter(Writer):
+            def write(self, thread):
+                self.threads += 1
+
+        try:
+            assert [w.name for w in open_writers(['titles'], output_dir, 'r')] == ['titles']
+            with pytest.raises(ValueError):
+                open_writers(['docx'], output_dir, 'r')
+
+            class NoWrite(Writer):
+                pass
+
+            with pytest.raises(TypeError):
+                NoWrite(output_dir, 'r')
+        finally:
+            del FORMATS['titles']
@@ -0,0 +1,90 @@
+import json
+import os
+import sqlite3
+from unittest.mock import patch
+
+import export_cursor_history
+from chat_catalog import abs_folder, file_digest, find_thread, open_catalog
+from chat_feed import FEED_NAME, read_changes
+from export_cursor_history import connect_db_readonly
+from update_standalone_chat_per_date import rebuild_date
+
+
+def edit_db(db, cid, add=(), drop_thread=False):
+    conn = sqlite3.connect(db)
+    key = f'composerData:{cid}'
+    if drop_thread:
+        conn.execute('DELETE FROM cursorDiskKV WHERE key = ?', (key,))
+    else:
+        value = json.loads(conn.execute('SELECT value FROM cursorDiskKV WHERE key = ?', (key,)).fetchone()[0])
+        for bid, role, text in add:
+            value['fullConversationHeadersOnly'].append({'bubbleId': bid, 'type': role})
+            conn.execute('INSERT INTO cursorDiskKV VALUES (?, ?)',
+                         (f'bubbleId:{cid}:{bid}', json.dumps({'type': role, 'content': text})))
+        value['lastUpdatedAt'] = value.get('lastUpdatedAt', 0) + 1
+        conn.execute('UPDATE cursorDiskKV SET value = ? WHERE key = ?', (json.dumps(value), key))
+    conn.commit()
+    conn.close()
+
+
+class TestChangeFeed:
+    """Test the change feed written to changes.ndjson."""
+
+    def test_export_records_only_changes(self, mock_db, output_dir, export_all):
+        """Test created, unchanged (no record), appended and renamed threads, read with offsets."""
+        export_all(mock_db, output_dir, run_id='r')
+        created, offset = read_changes(output_dir)
+        assert [(c['op'], c['cid']) for c in created] == [('created', 'test-thread-1'), ('created', 'test-thread-2')]
+        assert created[0]['run'] == 'r' and len(created[0]['sha256']) == 64
+        assert os.path.isdir(os.path.join(output_dir, created[0]['folder']))
+
+        export_all(mock_db, output_dir)  # same content: nothing to report
+        assert read_changes(output_dir, offset) == ([], offset)
+
+        edit_db(mock_db, 'test-thread-1', add=[('bubble-3', 1, 'More?')])
+        export_all(mock_db, output_dir)
+        changes, offset = read_changes(output_dir, offset)
+        assert [(c['op'], c['cid']) for c in changes] == [('updated', 'test-thread-1')]
+        assert changes[0]['offset'] > 0
+        cat = open_catalog(output_dir)
+        row = find_thread(cat, 'test-thread-1')[0]
+        cat.close()
+        # the whole file's hash, although only the bytes from offset on were written
+        assert changes[0]['sha256'] == row['sha256'] == file_digest(os.path.join(abs_folder(output_dir, row['folder']), 'chat.yaml'))[1]
+
+        with open(os.path.join(output_dir, FEED_NAME), 'ab') as f:
+            f.write(b'{"op": "crea')  # a line still being written is left for the next read
+        assert read_changes(output_dir, offset) == ([], offset)
+
+    def test_rebuild_and_db_deletions(self, mock_db, output_dir, export_all):
+        """Test a date rebuild reports removed threads and an export run reports DB deletions once."""
+        export_all(mock_db, output_dir)
+        _, offset = read_changes(output_dir)
+        edit_db(mock_db, 'test-thread-2', drop_thread=True)
+        argv = ['x', '--db', mock_db, '--out', output_dir, '--progress-interval', '0']
+        for _ in range(2):
+            with patch('sys.argv', argv):
+                export_cursor_history.main()
+        changes, offset = read_changes(output_dir, offset)
+        assert [(c['op'], c['cid']) for c in changes] == [('deleted', 'test-thread-2')]
+
+        conn = connect_db_readonly(mock_db)
+        result = rebuild_date(conn, output_dir, '2025-01-15', run_id='rb')
+        conn.close()
+        assert result['changes'] == {'removed': 1}
+        changes, _ = read_changes(output_dir, offset)
+        assert [(c['op'], c['cid'], c['run']) for c in changes] == [('removed', 'test-thread-2', 'rb')]
+
+    def test_organize_moves(self, mock_db, output_dir, temp_dir, export_all):
+        """Test moving threads into Flow is reported on both roots."""
+        from move_and_organize_chats import move_exported_to_flow, organize_chats_subfolders
+        export_all(mock_db, output_dir)
+        _, offset = read_changes(output_dir)
+        flow = os.path.join(temp_dir, 'Flow')
+        move_exported_to_flow(output_dir, flow, 'm')
+        organize_chats_subfolders(flow, 'm')
+        assert [c['op'] for c in read_changes(output_dir, offset)[0]] == ['removed', 'removed']
+        flow_changes = read_changes(flow)[0]
+        assert [c['op'] for c in flow_changes] == ['created', 'created', 'renamed', 'renamed']
+        assert flow_changes[2]['prev_folder'] == flow_changes[0]['folder']
+        assert flow_changes[2]['folder'].split('/')[2] == 'chats'
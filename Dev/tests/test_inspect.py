@@ -0,0 +1,77 @@
+import io
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+
+from chat_inspect import SizeHistogram, family, inspect
+from export_cursor_history import connect_db_readonly
+
+SRC = os.path.join(os.path.dirname(__file__), '..', 'src')
+
+
+def add_rows(db, rows):
+    conn = sqlite3.connect(db)
+    conn.executemany('INSERT INTO cursorDiskKV (key, value) VALUES (?, ?)', rows)
+    conn.commit()
+    conn.close()
+
+
+class TestInspect:
+    """Test the state.vscdb keyspace profiler."""
+
+    def test_families_threads_and_bubbles(self, mock_db):
+        """Test the per-family histogram, the largest threads and the bubble checks."""
+        add_rows(mock_db, [
+            ('bubbleId:test-thread-2:bubble-2', json.dumps({'type': 2, 'content': 'x' * 5000})),  # no createdAt
+            ('bubbleId:gone-thread:bubble-1', b'\x00not json'),
+            ('checkpointId:test-thread-1:c1', '{}'),
+            ('plainKey', 'v'),
+        ])
+        conn = connect_db_readonly(mock_db)
+        report = inspect(conn, top=2)
+        conn.close()
+        fams = report['families']
+        assert list(fams)[0] == 'bubbleId:' and fams['bubbleId:']['rows'] == 5
+        assert fams['composerData:']['rows'] == 2 and fams['checkpointId:']['rows'] == 1
+        assert fams['(no prefix)'] == dict(fams['(no prefix)'], rows=1, bytes=1)
+        assert report['db']['rows'] == 9 and report['db']['value_bytes'] == sum(f['bytes'] for f in fams.values())
+        assert [t['cid'] for t in report['largest_threads']] == ['test-thread-2', 'test-thread-1']
+        assert report['largest_threads'][0]['bubbles'] == 2
+        assert report['threads'] == {'composers': 2, 'with_bubbles': 3, 'orphaned_bubble_threads': 1}
+        assert report['bubbles_without_createdAt'] == 1 and report['bubbles_not_json'] == 1
+
+    def test_histogram_percentiles(self):
+        """Test percentiles are bucket upper bounds within 19% and capped at the max."""
+        hist = SizeHistogram()
+        for size in range(1, 1001):
+            hist.add(size)
+        s = hist.summary()
+        assert s['rows'] == 1000 and s['max'] == 1000 and s['avg'] == 500
+        assert 500 <= s['p50'] <= 500 * 1.19 and 990 <= s['p99'] <= 1000
+        assert family('bubbleId:a:b') == 'bubbleId:' and family(':x') == family('x') == '(no prefix)'
+
+    def test_cli_writes_history(self, mock_db, temp_dir):
+        """Test the command prints the report and appends one line per run to --history."""
+        history = os.path.join(temp_dir, 'trend.jsonl')
+        for _ in range(2):
+            proc = subprocess.run(
+                [sys.executable, 'cursor_history.py', 'inspect', '--db', mock_db, '--history', history],
+                cwd=SRC, capture_output=True, text=True, timeout=60,
+            )
+            assert proc.returncode == 0, proc.stderr
+        assert json.loads(proc.stdout)['db']['path'] == os.path.abspath(mock_db)
+        with open(history, 'r', encoding='utf-8') as f:
+            lines = [json.loads(line) for line in f]
+        assert len(lines) == 2 and lines[1]['families']['bubbleId:']['rows'] == 3
+
+    def test_progress_lines(self, mock_db):
+        """Test progress is reported on the given stream while scanning."""
+        add_rows(mock_db, [(f'itemTable:{i}', 'x') for i in range(20000)])
+        ticks = iter(range(100000))
+        stream = io.StringIO()
+        conn = connect_db_readonly(mock_db)
+        inspect(conn, progress_interval=1, stream=stream, clock=lambda: float(next(ticks)))
+        conn.close()
+        assert stream.getvalue().count('progress ') == 2
@@ -0,0 +1,99 @@
+import json
+import os
+import sqlite3
+
+from chat_mirror import open_mirror, sync, thread_digests
+from cursor_kv import select_threads
+from export_cursor_history import connect_db_readonly
+
+
+def chat_rows(db):
+    conn = sqlite3.connect(db)
+    rows = conn.execute(
+        "SELECT key, value FROM cursorDiskKV WHERE key >= 'bubbleId:' AND key < 'bubbleId;'"
+        " OR key >= 'composerData:' AND key < 'composerData;' ORDER BY key"
+    ).fetchall()
+    conn.close()
+    return rows
+
+
+class TestMirror:
+    """Test the slim mirror of the chat keyspace."""
+
+    def test_initial_sync_copies_only_chat_rows(self, mock_db, temp_dir, export_all):
+        conn = sqlite3.connect(mock_db)
+        conn.execute('CREATE TABLE ItemTable (key TEXT UNIQUE ON CONFLICT REPLACE, value BLOB)')
+        conn.execute("INSERT INTO ItemTable VALUES ('workbench.panel', ?)", ('x' * 10000,))
+        conn.execute("INSERT INTO cursorDiskKV VALUES ('checkpointId:abc', ?)", ('y' * 10000,))
+        conn.commit()
+        conn.close()
+        mirror = os.path.join(temp_dir, 'mirror.vscdb')
+
+        summary = sync(mock_db, mirror)
+
+        assert summary['initial'] and summary['threads'] == 2 and summary['copied_rows'] == 5
+        assert chat_rows(mirror) == chat_rows(mock_db)
+        m = sqlite3.connect(mirror)
+        assert m.execute("SELECT COUNT(*) FROM cursorDiskKV WHERE key = 'checkpointId:abc'").fetchone()[0] == 0
+        created = m.execute("SELECT created_at_ms FROM cursorDiskKV WHERE key = 'composerData:test-thread-1'").fetchone()[0]
+        m.close()
+        assert created == json.loads(chat_rows(mock_db)[-2][1])['createdAt']
+        # the exporters read the mirror like the original
+        assert export_all(mirror, os.path.join(temp_dir, 'a')) == export_all(mock_db, os.path.join(temp_dir, 'b'))
+
+    def test_later_syncs_copy_changed_threads_only(self, mock_db, temp_dir):
+        mirror = os.path.join(temp_dir, 'mirror.vscdb')
+        sync(mock_db, mirror)
+
+        conn = sqlite3.connect(mock_db)
+        key = 'composerData:test-thread-1'
+        value = json.loads(conn.execute('SELECT value FROM cursorDiskKV WHERE key = ?', (key,)).fetchone()[0])
+        value['fullConversationHeadersOnly'].append({'bubbleId': 'bubble-3', 'type': 1})
+        conn.execute('UPDATE cursorDiskKV SET value = ? WHERE key = ?', (json.dumps(value), key))
+        conn.execute("INSERT INTO cursorDiskKV VALUES ('bubbleId:test-thread-1:bubble-3', ?)",
+                     (json.dumps({'type': 1, 'content': 'Follow-up.'}),))
+        conn.execute("DELETE FROM cursorDiskKV WHERE key LIKE '%test-thread-2%'")
+        conn.execute("INSERT INTO cursorDiskKV VALUES ('bubbleId:orphan:b1', '{}')")
+        conn.commit()
+        conn.close()
+
+        second = sync(mock_db, mirror)
+        assert (second['changed_threads'], second['removed_threads']) == (2, 1)
+        # the new composer value and bubble of thread 1, the orphan bubble; the unchanged bubbles are skipped
+        assert (second['copied_rows'], second['deleted_rows']) == (3, 2)
+        assert chat_rows(mirror) == chat_rows(mock_db)
+        m = open_mirror(mirror)
+        assert thread_digests(m) == dict(m.execute('SELECT cid, digest FROM mirror_threads'))
+        m.close()
+
+        third = sync(mock_db, mirror)
+        assert (third['changed_threads'], third['copied_rows'], third['deleted_rows']) == (0, 0, 0)
+
+        # a bubble edited in place: found through the new lastUpdatedAt of its thread
+        conn = sqlite3.connect(mock_db)
+        value['lastUpdatedAt'] = 1
+        conn.execute('UPDATE cursorDiskKV SET value = ? WHERE key = ?', (json.dumps(value), key))
+        conn.execute("UPDATE cursorDiskKV SET value = ? WHERE key = 'bubbleId:test-thread-1:bubble-1'",
+                     (json.dumps({'type': 1, 'content': 'Edited.'}),))
+        conn.commit()
+        conn.close()
+        edited = sync(mock_db, mirror)
+        assert (edited['changed_threads'], edited['copied_rows']) == (1, 2)
+        assert chat_rows(mirror) == chat_rows(mock_db)
+        full = sync(mock_db, mirror, full=True)
+        assert full['initial'] and full['copied_rows'] == 5
+        assert chat_rows(mirror) == chat_rows(mock_db)
+
+    def test_date_filter_uses_the_created_index(self, mock_db, temp_dir):
+        mirror = os.path.join(temp_dir, 'mirror.vscdb')
+        sync(mock_db, mirror)
+        results = {}
+        for db in (mock_db, mirror):
+            conn = connect_db_readonly(db)
+            statements = []
+            conn.set_trace_callback(statements.append)
+            results[db] = [select_threads(conn, False, since_ms=0, until_ms=2**62), select_threads(conn, False, since_ms=2**62)]
+            plan = [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + statements[-1])]
+            conn.close()
+        assert results[mirror] == results[mock_db] and results[mirror][1] == []
+        assert any('cursorDiskKV_created' in d for d in plan), plan
@@ -0,0 +1,107 @@
+import json
+import os
+import sqlite3
+from unittest.mock import patch
+
+import pytest
+
+from chat_catalog import abs_folder, index_tree, open_catalog, threads_for_date
+from chat_pack import pack_month, read_thread, unpack_month
+from chat_reader import iter_threads
+from chat_verify import verify
+from export_cursor_history import connect_db_readonly
+from update_latest_chat_per_date import rebuild_date
+
+
+@pytest.fixture
+def flow(mock_db, temp_dir):
+    flow_root = os.path.join(temp_dir, 'Flow')
+    conn = connect_db_readonly(mock_db)
+    rebuild_date(conn, flow_root, '2025-01-15')
+    conn.close()
+    # a user's own note next to the chats must survive packing
+    with open(os.path.join(flow_root, '202501', '2025-01-15', 'notes.md'), 'w', encoding='utf-8') as f:
+        f.write('# notes\n')
+    return flow_root
+
+
+def rows_by_cid(root):
+    cat = open_catalog(root, 'flow')
+    rows = threads_for_date(cat, '2025-01-15')
+    cat.close()
+    return {r['cid']: r for r in rows}
+
+
+class TestMonthPacks:
+    """Test rolling Flow months into YYYYMM.zip."""
+
+    def test_pack_and_random_access(self, flow, mock_db):
+        """Test that a packed thread reads back identically without the folders."""
+        before = {}
+        for cid, row in rows_by_cid(flow).items():
+            with open(os.path.join(abs_folder(flow, row['folder']), 'chat.yaml'), 'r', encoding='utf-8') as f:
+                before[cid] = f.read()
+
+        assert pack_month(flow, '202501')['threads'] == 2
+        assert os.path.isfile(os.path.join(flow, '202501.zip'))
+        assert not os.path.exists(os.path.join(flow, '202501', '2025-01-15', 'chats'))
+        assert os.path.isfile(os.path.join(flow, '202501', '2025-01-15', 'notes.md'))
+        rows = rows_by_cid(flow)
+        assert {r['pack'] for r in rows.values()} == {'202501.zip'}
+        for cid, text in before.items():
+            assert read_thread(flow, cid) == text
+        threads = {t.cid: t for t in iter_threads(flow, 'flow')}
+        assert threads['test-thread-2'].header['title20'] == 'Another test message'
+        assert [m['role'] for m in threads['test-thread-1'].messages()] == ['user', 'assistant']
+        conn = connect_db_readonly(mock_db)
+        assert verify(conn, flow)['ok']
+        conn.close()
+
+        assert unpack_month(flow, '202501') == 2
+        assert not os.path.exists(os.path.join(flow, '202501.zip'))
+        assert all(r['pack'] is None for r in rows_by_cid(flow).values())
+
+    def test_rebuild_repacks_month(self, flow, mock_db):
+        """Test that rebuilding a date in a packed month unpacks and repacks it."""
+        pack_month(flow, '202501')
+        db = sqlite3.connect(mock_db)
+        db.execute("UPDATE cursorDiskKV SET value = ? WHERE key = 'bubbleId:test-thread-2:bubble-1'",
+                   (json.dumps({'type': 1, 'content': 'Edited message.'}),))
+        db.commit()
+        db.close()
+        conn = connect_db_readonly(mock_db)
+        assert rebuild_date(conn, flow, '2025-01-15')['created'] == 2
+        conn.close()
+        assert os.path.isfile(os.path.join(flow, '202501.zip'))
+        assert not os.path.exists(os.path.join(flow, '202501', '2025-01-15', 'chats'))
+        assert 'Edited message.' in read_thread(flow, 'test-thread-2')
+
+    def test_catalog_rebuild_reads_pack_index(self, flow):
+        """Test that a rebuilt catalog finds packed threads through the embedded index."""
+        pack_month(flow, '202501')
+        cat = open_catalog(flow, 'flow')
+        with cat:
+            cat.execute('DELETE FROM threads')
+        assert index_tree(cat, flow, 'flow') == 2
+        cat.close()
+        assert 'Hello! This is a test response' in read_thread(flow, 'test-thread-1')
+
+    def test_folder_without_chat_yaml_stays_loose(self, flow):
+        """Test that a thread folder missing its chat.yaml is reported and not packed."""
+        rows = rows_by_cid(flow)
+        os.remove(os.path.join(abs_folder(flow, rows['test-thread-2']['folder']), 'chat.yaml'))
+
+        result = pack_month(flow, '202501')
+        assert result['threads'] == 1
+        assert [(e['cid'], e['reason']) for e in result['missing']] == [('test-thread-2', 'chat.yaml not on disk')]
+        after = rows_by_cid(flow)
+        assert after['test-thread-1']['pack'] == '202501.zip' and after['test-thread-2']['pack'] is None
+        assert os.path.isdir(abs_folder(flow, rows['test-thread-2']['folder']))
+
+    def test_failed_pack_leaves_no_tmp(self, flow):
+        """Test that an error while writing the zip removes the partial file and keeps the folders."""
+        with patch('zipfile.ZipFile.writestr', side_effect=OSError('disk full')):
+            with pytest.raises(OSError):
+                pack_month(flow, '202501')
+        assert not [n for n in os.listdir(flow) if n.startswith('202501.zip')]
+        assert all(r['pack'] is None and os.path.isdir(abs_folder(flow, r['folder'])) for r in rows_by_cid(flow).values())
@@ -0,0 +1,85 @@
+import os
+from unittest.mock import patch
+
+import chat_inspect
+import export_cursor_history
+import update_latest_chat_per_date
+import update_latest_chats_for_dates
+import update_standalone_chat_per_date
+
+# Budgets for the synthetic DB in conftest.py (2 threads on 2025-01-15).
+# Raise them only together with a reason in the commit message.
+THREADS = 2
+BUDGETS = {
+    # name: (max statements, max full-table scans, max temp b-tree sorts)
+    'ensure_manifest': (1, 0, 0),
+    # --since/--until: still the composerData key range, filtered on createdAt
+    'ensure_manifest_dates': (1, 0, 0),
+    # one header prefetch, then one point-lookup chunk per thread
+    'export_batch': (1 + THREADS, 0, 0),
+    # the only sort left is ordering a date's threads by createdAt
+    'update_latest_main': (1 + THREADS, 0, 1),
+    'update_standalone_main': (1 + THREADS, 0, 1),
+    # two dates, only one of which has threads
+    'update_dates_main': (2 + THREADS, 0, 2),
+    # the profiler reads every row by design, but in a single pass
+    'inspect': (1, 1, 0),
+}
+
+
+def assert_budget(recorder, name):
+    max_statements, max_scans, max_sorts = BUDGETS[name]
+    assert recorder.statements, 'nothing was traced'
+    assert len(recorder.statements) <= max_statements, recorder.statements
+    assert len(recorder.full_scans()) <= max_scans, recorder.full_scans()
+    assert len(recorder.temp_sorts()) <= max_sorts, recorder.temp_sorts()
+
+
+class TestQueryBudgets:
+    """Guard against N+1 queries and full-table scans on state.vscdb."""
+
+    def test_ensure_manifest(self, query_recorder, mock_db, output_dir):
+        conn = query_recorder.attach(export_cursor_history.connect_db_readonly(mock_db))
+        export_cursor_history.ensure_manifest(os.path.join(output_dir, 'm.json'), conn, order_desc=True)
+        assert_budget(query_recorder, 'ensure_manifest')
+
+    def test_ensure_manifest_dates(self, query_recorder, mock_db, output_dir):
+        conn = query_recorder.attach(export_cursor_history.connect_db_readonly(mock_db))
+        filters = {'since_ms': 1736899200000, 'until_ms': 1736985600000}
+        export_cursor_history.ensure_manifest(os.path.join(output_dir, 'm.json'), conn, order_desc=True, filters=filters)
+        assert_budget(query_recorder, 'ensure_manifest_dates')
+
+    def test_export_batch(self, query_recorder, mock_db, output_dir):
+        manifest_path = os.path.join(output_dir, 'export_manifest.json')
+        conn = export_cursor_history.connect_db_readonly(mock_db)
+        export_cursor_history.ensure_manifest(manifest_path, conn, order_desc=True)
+        query_recorder.attach(conn)
+        done, _ = export_cursor_history.export_batch(conn, output_dir, manifest_path, 0, THREADS)
+        assert done == THREADS
+        assert_budget(query_recorder, 'export_batch')
+
+    def test_update_latest_main(self, query_recorder, mock_db, temp_dir):
+        query_recorder.patch(update_latest_chat_per_date)
+        argv = ['x', '--date', '2025-01-15', '--db', mock_db, '--flow', os.path.join(temp_dir, 'Flow')]
+        with patch('sys.argv', argv):
+            update_latest_chat_per_date.main()
+        assert_budget(query_recorder, 'update_latest_main')
+
+    def test_update_standalone_main(self, query_recorder, mock_db, temp_dir):
+        query_recorder.patch(update_standalone_chat_per_date)
+        argv = ['x', '--date', '2025-01-15', '--db', mock_db, '--out', os.path.join(temp_dir, 'out')]
+        with patch('sys.argv', argv):
+            update_standalone_chat_per_date.main()
+        assert_budget(query_recorder, 'update_standalone_main')
+
+    def test_update_dates_main(self, query_recorder, mock_db, temp_dir):
+        query_recorder.patch(update_latest_chats_for_dates)
+        argv = ['x', '--dates', '2025-01-15', '2025-01-16', '--db', mock_db, '--flow', os.path.join(temp_dir, 'Flow')]
+        with patch('sys.argv', argv):
+            update_latest_chats_for_dates.main()
+        assert_budget(query_recorder, 'update_dates_main')
+
+    def test_inspect(self, query_recorder, mock_db):
+        conn = query_recorder.attach(chat_inspect.connect_db_readonly(mock_db))
+        assert chat_inspect.inspect(conn)['db']['rows'] == 5
+        assert_budget(query_recorder, 'inspect')
@@ -0,0 +1,72 @@
+import os
+import random
+import yaml
+import pytest
+
+from chat_reader import iter_messages, iter_threads, load_chat, read_header
+from export_cursor_history import connect_db_readonly, ensure_manifest, export_batch, write_yaml
+
+
+def _random_text(rng):
+    alphabet = list("abc xyz 123 {}[]:#-|>\"'\\\t日本語 ") + ['\n', '\n\n', '  ', '    ']
+    s = ''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 80)))
+    return s.lstrip(' \t\n') or 'x'
+
+
+class TestReaderEquivalence:
+    """Test that the reader returns what PyYAML returns for exporter output."""
+
+    @pytest.mark.parametrize('use_mmap', [False, True])
+    def test_matches_pyyaml(self, temp_dir, use_mmap):
+        """Test random content (code, blank lines, unicode) against yaml.safe_load."""
+        rng = random.Random(1234)
+        for i in range(50):
+            grouped = [
+                {'role': rng.choice(['user', 'assistant', 'other']),
+                 'texts': [_random_text(rng) for _ in range(rng.randint(1, 3))]}
+                for _ in range(rng.randint(1, 4))
+            ]
+            folder = os.path.join(temp_dir, f'chat-{i}')
+            write_yaml(folder, f'cid-{i}', '2025-01-15_10-30-15', 'Title', grouped)
+            path = os.path.join(folder, 'chat.yaml')
+            with open(path, 'r', encoding='utf-8') as f:
+                try:
+                    expected = yaml.safe_load(f)
+                except yaml.YAMLError:
+                    continue
+            assert load_chat(path, use_mmap=use_mmap) == expected
+
+    def test_header_only(self, temp_dir):
+        """Test that read_header returns only the header fields."""
+        folder = os.path.join(temp_dir, 'chat')
+        write_yaml(folder, 'cid-1', '2025-01-15_10-30-15', 'Title', [{'role': 'user', 'texts': ['hi']}])
+        header = read_header(os.path.join(folder, 'chat.yaml'))
+        assert header == {'threadId': 'cid-1', 'created_at': '2025-01-15_10-30-15', 'title20': 'Title'}
+
+    def test_iter_messages_is_lazy(self, temp_dir):
+        """Test that messages can be consumed one at a time."""
+        folder = os.path.join(temp_dir, 'chat')
+        grouped = [{'role': 'user', 'texts': ['q1']}, {'role': 'assistant', 'texts': ['a1', 'a2']}]
+        write_yaml(folder, 'cid-1', '2025-01-15_10-30-15', 'Title', grouped)
+        it = iter_messages(os.path.join(folder, 'chat.yaml'))
+        assert next(it) == {'role': 'user', 'content': 'q1'}
+        assert next(it) == {'role': 'assistant', 'content': 'a1\n\na2'}
+        assert next(it, None) is None
+
+
+class TestIterThreads:
+    """Test iterating an exported archive."""
+
+    def test_iter_threads(self, mock_db, output_dir):
+        """Test listing threads from the catalog and loading them lazily."""
+        manifest_path = os.path.join(output_dir, 'export_manifest.json')
+        conn = connect_db_readonly(mock_db)
+        ensure_manifest(manifest_path, conn, order_desc=True)
+        export_batch(conn, output_dir, manifest_path, 0, 2)
+        conn.close()
+
+        threads = list(iter_threads(output_dir, date='2025-01-15'))
+        assert [t.cid for t in threads] == ['test-thread-1', 'test-thread-2']
+        assert threads[0].header['threadId'] == 'test-thread-1'
+        with open(threads[0].path, 'r', encoding='utf-8') as f:
+            assert threads[0].load() == yaml.safe_load(f)
@@ -0,0 +1,100 @@
+import asyncio
+import json
+import os
+import sqlite3
+
+from chat_catalog import find_thread, open_catalog
+from chat_serve import ArchiveSource, ChatService, DBSource, LRUCache
+
+
+async def get(service, *paths, unix=None):
+    """Send the GETs over one keep-alive connection; [(status, body)]."""
+    server = await service.start(port=0, unix=unix)
+    if unix:
+        reader, writer = await asyncio.open_unix_connection(unix)
+    else:
+        reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+    out = []
+    for path in paths:
+        writer.write(f'GET {path} HTTP/1.1\r\nHost: x\r\n\r\n'.encode())
+        status = int((await reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await reader.readline()
+            if line == b'\r\n':
+                break
+            if line.lower().startswith(b'content-length:'):
+                length = int(line.split(b':')[1])
+        out.append((status, json.loads(await reader.readexactly(length))))
+    writer.close()
+    server.close()
+    await server.wait_closed()
+    return out
+
+
+class TestServe:
+    """Test the local query service."""
+
+    def test_archive_routes_and_cache(self, exported):
+        """Test listing, lookup by prefix, search and that repeats are served from the cache."""
+        service = ChatService(ArchiveSource(exported, None, LRUCache(8)))
+        listing, first, again, search, missing, metrics = asyncio.run(get(
+            service, '/threads?date=2025-01-15', '/threads/test-thr', '/threads/test-thread-2',
+            '/search?q=another&date=2025-01-15', '/threads/nope', '/metrics',
+        ))
+        assert [r['cid'] for r in listing[1]] == ['test-thread-1', 'test-thread-2']
+        assert first[1]['threadId'] == 'test-thread-2' and first[1]['messages'][0]['content'] == 'Another test message.'
+        assert again == first
+        assert [r['cid'] for r in search[1]] == ['test-thread-2']
+        assert missing[0] == 404
+        stats = metrics[1]
+        assert stats['cache']['hits'] == 2 and stats['cache']['misses'] == 2  # thread-1 is read by the search
+        assert stats['routes']['thread']['count'] == 3
+
+    def test_archive_invalidated_by_mtime(self, exported):
+        """Test a rewritten chat.yaml is decoded again."""
+        source = ArchiveSource(exported, None, LRUCache(8))
+        assert source.thread('test-thread-1')['messages'][0]['role'] == 'user'
+        cat = open_catalog(exported)
+        folder = find_thread(cat, 'test-thread-1')[0]['folder']
+        cat.close()
+        p = os.path.join(exported, folder, 'chat.yaml')
+        with open(p, 'r', encoding='utf-8') as f:
+            text = f.read()
+        with open(p, 'w', encoding='utf-8') as f:
+            f.write(text.replace('from user', 'from the user'))
+        os.utime(p, ns=(1, 1))
+        assert 'from the user' in source.thread('test-thread-1')['messages'][0]['content']
+        assert source.cache.stats()['misses'] == 2
+
+    def test_db_source_data_version(self, mock_db):
+        """Test DB threads are revalidated only after a commit, and reloaded when their watermark moved."""
+        source = DBSource(mock_db, LRUCache(8))
+        assert source.thread('test-thread-1')['title20'] == 'Hello, this is a tes'
+        source.thread('test-thread-1')
+        assert source.cache.stats()['hits'] == 1
+
+        conn = sqlite3.connect(mock_db)
+        value = json.loads(conn.execute("SELECT value FROM cursorDiskKV WHERE key = 'composerData:test-thread-1'").fetchone()[0])
+        value['fullConversationHeadersOnly'].append({'bubbleId': 'bubble-3', 'type': 1})
+        conn.execute("UPDATE cursorDiskKV SET value = ? WHERE key = 'composerData:test-thread-1'", (json.dumps(value),))
+        conn.execute("INSERT INTO cursorDiskKV VALUES ('bubbleId:test-thread-1:bubble-3', ?)",
+                     (json.dumps({'type': 1, 'content': 'One more question.'}),))
+        conn.commit()
+        conn.close()
+        messages = source.thread('test-thread-1')['messages']
+        assert messages[-1] == {'role': 'user', 'content': 'One more question.'}
+        source.thread('test-thread-1')
+        assert source.cache.stats()['hits'] == 2 and source.cache.stats()['misses'] == 2
+
+    def test_unix_socket_and_errors(self, mock_db, temp_dir):
+        """Test serving the DB on a Unix socket, bad requests and the LRU bound."""
+        service = ChatService(DBSource(mock_db, LRUCache(1)))
+        sock = os.path.join(temp_dir, 's')
+        responses = asyncio.run(get(
+            service, '/threads', '/threads/test-thread-1', '/threads/test-thread-2',
+            '/search?q=hello', '/threads?date=2025-13-01', '/metrics', unix=sock,
+        ))
+        assert [r['cid'] for r in responses[0][1]] == ['test-thread-2', 'test-thread-1']
+        assert [r[0] for r in responses[1:5]] == [200, 200, 400, 400]
+        assert responses[5][1]['cache'] == {'size': 1, 'max': 1, 'hits': 0, 'misses': 2, 'evictions': 1}
@@ -0,0 +1,89 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+SRC = os.path.join(os.path.dirname(__file__), '..', 'src')
+
+# Cold-start budget per cursor_history.py subcommand, measured with
+# `python -X importtime` (cumulative time of the subcommand module).
+# Typical runs take 35-60 ms (typing and chat_catalog dominate); the limit
+# leaves room for slow CI machines.
+IMPORT_BUDGET_MS = 150
+
+# Modules a subcommand must not pull in at start-up.
+ALWAYS_LAZY = {'yaml', 'near_dup', 'chat_reader', 'mmap', 'chat_pack', 'zipfile'}
+FORBIDDEN = {
+    'export': ALWAYS_LAZY | {'subprocess', 'shutil', 'lzma'},
+    'update-date': ALWAYS_LAZY | {'export_cursor_history', 'progress', 'durable_io', 'redaction', 'governor'},
+    'update-dates': ALWAYS_LAZY | {'export_cursor_history', 'progress', 'durable_io', 'redaction', 'governor'},
+    'update-standalone': ALWAYS_LAZY | {'export_cursor_history', 'progress', 'durable_io', 'redaction', 'governor'},
+    'organize': ALWAYS_LAZY | {'export_cursor_history', 'progress', 'durable_io'},
+}
+MODULES = {
+    'export': 'export_cursor_history',
+    'update-date': 'update_latest_chat_per_date',
+    'update-dates': 'update_latest_chats_for_dates',
+    'update-standalone': 'update_standalone_chat_per_date',
+    'organize': 'move_and_organize_chats',
+}
+
+
+def import_profile(command):
+    """{module: cumulative microseconds} for `cursor_history.py <command> --help`."""
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', 'cursor_history.py', command, '--help'],
+        cwd=SRC, capture_output=True, text=True, timeout=60,
+    )
+    assert proc.returncode == 0, proc.stderr
+    profile = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        profile[name.strip()] = int(cumulative)
+    return profile
+
+
+class TestStartup:
+    """Guard the start-up cost of hook-invoked subcommands."""
+
+    @pytest.mark.parametrize('command', sorted(MODULES))
+    def test_import_budget(self, command):
+        import_profile(command)  # warm the bytecode cache
+        profile = import_profile(command)
+        assert MODULES[command] in profile
+        # -X importtime lists a module after its imports; what follows the subcommand
+        # module is loaded by running it (argparse imports shutil to format --help)
+        names = list(profile)
+        loaded = set(names[:names.index(MODULES[command]) + 1])
+        assert not FORBIDDEN[command] & loaded, sorted(FORBIDDEN[command] & loaded)
+        assert profile[MODULES[command]] / 1000 <= IMPORT_BUDGET_MS, sorted(profile.items(), key=lambda kv: -kv[1])[:15]
+
+    def test_dispatcher_help_imports_no_subcommand(self):
+        """Test that listing the commands imports none of them."""
+        proc = subprocess.run(
+            [sys.executable, '-X', 'importtime', 'cursor_history.py', '--help'],
+            cwd=SRC, capture_output=True, text=True, timeout=60,
+        )
+        assert proc.returncode == 0
+        assert 'update-dates' in proc.stdout
+        assert not set(MODULES.values()) & {l.split('|')[-1].strip() for l in proc.stderr.splitlines()}
+
+
+class TestDispatcher:
+    """Test that subcommands run the underlying scripts."""
+
+    def test_update_standalone_via_dispatcher(self, mock_db, temp_dir, capsys):
+        from cursor_history import main
+        out_root = os.path.join(temp_dir, 'out')
+        main(['update-standalone', '--date', '2025-01-15', '--db', mock_db, '--out', out_root])
+        assert "'created': 2" in capsys.readouterr().out
+
+    def test_unknown_command(self, capsys):
+        from cursor_history import main
+        with pytest.raises(SystemExit) as exc:
+            main(['nope'])
+        assert exc.value.code == 2
+        assert 'unknown command' in capsys.readouterr().err
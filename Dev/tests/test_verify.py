@@ -0,0 +1,169 @@
+import json
+import os
+import shutil
+import sqlite3
+from unittest.mock import patch
+
+import pytest
+
+import chat_verify
+from chat_catalog import abs_folder, open_catalog, threads_for_date
+from chat_feed import read_changes
+from chat_verify import repair, verify
+from export_cursor_history import connect_db_readonly
+from update_latest_chat_per_date import rebuild_date as flow_rebuild
+
+
+def folders(root):
+    cat = open_catalog(root)
+    rows = {r['cid']: abs_folder(root, r['folder']) for r in threads_for_date(cat, '2025-01-15')}
+    cat.close()
+    return rows
+
+
+def damage(mock_db, root):
+    """Break the archive in one way per problem kind."""
+    rows = folders(root)
+    # test-thread-1 grows a message in the DB -> stale
+    conn = sqlite3.connect(mock_db)
+    value = json.loads(conn.execute("SELECT value FROM cursorDiskKV WHERE key = 'composerData:test-thread-1'").fetchone()[0])
+    value['fullConversationHeadersOnly'].append({'bubbleId': 'bubble-3', 'type': 1})
+    conn.execute("UPDATE cursorDiskKV SET value = ? WHERE key = 'composerData:test-thread-1'", (json.dumps(value),))
+    conn.execute("INSERT INTO cursorDiskKV VALUES ('bubbleId:test-thread-1:bubble-3', ?)",
+                 (json.dumps({'type': 1, 'content': 'One more question.'}),))
+    conn.commit()
+    conn.close()
+    # test-thread-2 is overwritten with same-size garbage -> corrupted
+    p = os.path.join(rows['test-thread-2'], 'chat.yaml')
+    size = os.path.getsize(p)
+    with open(p, 'wb') as f:
+        f.write(b'x' * size)
+    os.utime(p, ns=(0, 0))
+    # a folder nobody knows about -> orphaned
+    stray = os.path.join(root, '2024-12-31_23-59-59_stray_deadbeef')
+    os.makedirs(stray)
+    with open(os.path.join(stray, 'chat.yaml'), 'w', encoding='utf-8') as f:
+        f.write('---\nthreadId: "deadbeef-0000"\n')
+    return rows
+
+
+class TestVerify:
+    """Test archive verification against the source DB."""
+
+    def test_clean_archive_hashes_nothing(self, mock_db, exported):
+        """Test that an intact archive is ok without reading any chat.yaml."""
+        conn = connect_db_readonly(mock_db)
+        report = verify(conn, exported)
+        conn.close()
+        assert report['ok']
+        assert report['folders'] == 2 and report['hashed'] == 0
+
+    def test_reports_each_problem_kind(self, mock_db, exported):
+        """Test missing, stale, orphaned and corrupted detection."""
+        rows = damage(mock_db, exported)
+        conn = connect_db_readonly(mock_db)
+        report = verify(conn, exported)
+        conn.close()
+        assert [e['cid'] for e in report['stale']] == ['test-thread-1']
+        assert [e['cid'] for e in report['corrupted']] == ['test-thread-2']
+        assert [e['cid'] for e in report['orphaned']] == ['deadbeef-0000']
+        assert report['missing'] == [] and report['hashed'] == 1 and not report['ok']
+
+        shutil.rmtree(rows['test-thread-1'])
+        conn = connect_db_readonly(mock_db)
+        report = verify(conn, exported)
+        conn.close()
+        assert [(e['cid'], e['reason']) for e in report['missing']] == [('test-thread-1', 'chat.yaml not on disk')]
+
+    def test_touched_files_are_rehashed_once(self, mock_db, exported):
+        """Test that an mtime change alone costs one hash and is then remembered."""
+        p = os.path.join(folders(exported)['test-thread-1'], 'chat.yaml')
+        os.utime(p, ns=(0, 0))
+        conn = connect_db_readonly(mock_db)
+        first = verify(conn, exported)
+        second = verify(conn, exported)
+        conn.close()
+        assert first['ok'] and first['hashed'] == 1
+        assert second['ok'] and second['hashed'] == 0
+
+    def test_legacy_rows_compare_content(self, mock_db, exported):
+        """Test rows without a watermark are checked against a render from the DB."""
+        cat = open_catalog(exported)
+        with cat:
+            cat.execute('UPDATE threads SET watermark = NULL')
+        cat.close()
+        conn = connect_db_readonly(mock_db)
+        assert verify(conn, exported)['ok']
+        damage(mock_db, exported)
+        report = verify(conn, exported)
+        conn.close()
+        assert [(e['cid'], e['reason']) for e in report['stale']] == [('test-thread-1', 'content differs from DB')]
+
+    def test_repair_reexports_only_damaged(self, mock_db, exported):
+        """Test that --repair rewrites stale and corrupted threads and keeps orphans."""
+        damage(mock_db, exported)
+        _, offset = read_changes(exported)
+        conn = connect_db_readonly(mock_db)
+        result = repair(conn, exported, verify(conn, exported))
+        report = verify(conn, exported)
+        conn.close()
+        assert result == {'threads': 2, 'reexported': 2, 'skipped': 0}
+        assert report['missing'] == report['stale'] == report['corrupted'] == []
+        assert [e['cid'] for e in report['orphaned']] == ['deadbeef-0000']
+        with open(os.path.join(folders(exported)['test-thread-1'], 'chat.yaml'), 'r', encoding='utf-8') as f:
+            assert 'One more question.' in f.read()
+        # the stale thread changed, the corrupted one is back to what was exported
+        changes, _ = read_changes(exported, offset)
+        assert [(c['op'], c['cid']) for c in changes] == [('updated', 'test-thread-1')]
+
+    def test_untitled_threads_are_decoded_once(self, mock_db, exported):
+        """Test that a never-exported untitled thread is not rendered again until it changes."""
+        conn = sqlite3.connect(mock_db)
+        conn.execute("INSERT INTO cursorDiskKV VALUES ('composerData:empty-thread', ?)",
+                     (json.dumps({'createdAt': 1736899200000, 'fullConversationHeadersOnly': []}),))
+        conn.commit()
+        conn.close()
+        conn = connect_db_readonly(mock_db)
+        with patch('chat_verify.expected_digest', wraps=chat_verify.expected_digest) as render:
+            assert verify(conn, exported)['ok']
+            assert verify(conn, exported)['ok']
+        conn.close()
+        assert [c.args[1] for c in render.call_args_list] == ['empty-thread']
+
+        conn = sqlite3.connect(mock_db)
+        conn.execute("UPDATE cursorDiskKV SET value = ? WHERE key = 'composerData:empty-thread'",
+                     (json.dumps({'createdAt': 1736899200000, 'fullConversationHeadersOnly': [{'bubbleId': 'b'}]}),))
+        conn.execute("INSERT INTO cursorDiskKV VALUES ('bubbleId:empty-thread:b', ?)",
+                     (json.dumps({'type': 1, 'content': 'Now with a title.'}),))
+        conn.commit()
+        conn.close()
+        conn = connect_db_readonly(mock_db)
+        report = verify(conn, exported)
+        conn.close()
+        assert [e['cid'] for e in report['missing']] == ['empty-thread']
+
+    def test_flow_tree(self, mock_db, temp_dir):
+        """Test verifying and repairing a Flow tree by date."""
+        flow_root = os.path.join(temp_dir, 'Flow')
+        conn = connect_db_readonly(mock_db)
+        flow_rebuild(conn, flow_root, '2025-01-15')
+        assert verify(conn, flow_root)['ok']
+        shutil.rmtree(folders(flow_root)['test-thread-2'])
+        report = verify(conn, flow_root)
+        assert [e['cid'] for e in report['missing']] == ['test-thread-2']
+        assert repair(conn, flow_root, report) == {'threads': 1, 'dates': ['2025-01-15']}
+        assert verify(conn, flow_root)['ok']
+        conn.close()
+
+    def test_main_exit_code(self, mock_db, exported, capsys):
+        """Test that damage sets exit status 1 and --repair clears it."""
+        damage(mock_db, exported)
+        from chat_verify import main
+        for argv, code in [([], 1), (['--repair'], 0)]:
+            with patch('sys.argv', ['chat_verify.py', '--db', mock_db, '--root', exported] + argv):
+                with pytest.raises(SystemExit) as exc:
+                    main()
+            assert exc.value.code == code
+            report = json.loads(capsys.readouterr().out)
+        assert report['repair']['reexported'] == 2
+        assert report['remaining'] == {'missing': 0, 'stale': 0, 'orphaned': 1, 'corrupted': 0}